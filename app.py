@@ -1,28 +1,218 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Blueprint, Flask, Response, current_app, g, render_template, jsonify, request, send_file
+from flask.json.provider import DefaultJSONProvider
 import character_generation_rules as chargen
+import bulk_generation
+import character_archive
+import character_ids
+import character_import
+import character_schema
+import character_storage
+import character_upgrades
+import dice_report
+import event_stream
+import history_serializer
+import idempotency
+import leaderboards
+import rate_limiting
+import skill_index
+import state_backend
+from production_config import get_config
 import json
 import os
 import re
 import argparse
-import csv
+import base64
+import copy
+import functools
+import gc
+import gzip
+import shutil
+import tempfile
+import threading
+import time
 
-app = Flask(__name__)
+# All routes live on this blueprint; create_app() registers it on a new Flask app
+api = Blueprint('api', __name__)
 
-# Parse command line arguments
-parser = argparse.ArgumentParser(description='Classic Traveller Character Generator')
-parser.add_argument('--seed', type=int, default=77, help='Random seed for character generation (default: 77)')
-args = parser.parse_args()
+# Upper limit on characters generated by a single bulk request
+BULK_GENERATE_MAX_COUNT = 100000
 
-# Global seed for this run
-GLOBAL_SEED = args.seed
+# app.extensions key holding an app's AppServices
+EXTENSION_NAME = "traveller"
 
-# Temporary storage for the current character (in a real app, this would be persistent)
-current_character = None
+# The current character is per request (g.current_character, loaded from state_store)
+# so concurrent requests in a threaded worker never share one record.
+# Per-character locks serialize load -> rules -> save within this process; across
+# processes the version check in state_store.set() catches concurrent writers.
+# The locks are striped: a fixed set picked by a hash of the character key, so
+# memory does not grow with every character created. Characters that share a
+# stripe only wait for each other.
+CHARACTER_LOCK_STRIPES = 256
+character_locks = tuple(threading.Lock() for _ in range(CHARACTER_LOCK_STRIPES))
 
-def get_character_json_path(name):
+class AppServices:
+    """The settings and services one app's routes use, kept on app.extensions[EXTENSION_NAME]"""
+
+    def __init__(self, config, event_broker, job_manager, rate_limiter, state_store, idempotency_store,
+                 id_allocator, archive_manifest, history_encoder, static_payloads):
+        self.config = config
+        self.event_broker = event_broker
+        self.job_manager = job_manager
+        self.rate_limiter = rate_limiter
+        self.state_store = state_store
+        self.idempotency_store = idempotency_store
+        self.id_allocator = id_allocator
+        self.archive_manifest = archive_manifest
+        self.history_encoder = history_encoder
+        # Pre-serialized JSON for responses that never change (built once, before workers fork)
+        self.static_payloads = static_payloads
+
+def app_services(app=None):
+    """The services of an app (default: the app handling the current request)"""
+    return (app or current_app).extensions[EXTENSION_NAME]
+
+def create_app(app_config=None, seed=None):
+    """
+    Create the Flask app and the services its routes use
+
+    Everything every worker needs (static response bodies, the archive manifest) is
+    built here, so a preloading WSGI server (e.g. gunicorn --preload "app:create_app()")
+    does the work once and forked workers share it copy-on-write. The services belong
+    to the returned app (see app_services), so several apps can live in one process.
+
+    Args:
+        app_config: production_config settings (defaults to get_config())
+        seed: Global seed to force (e.g. from --seed); if None the seed already in the
+            shared state store is kept, or app_config.DEFAULT_SEED for a new store
+
+    Returns:
+        The configured Flask app
+    """
+    started = time.perf_counter()
+    config = app_config or get_config()
+    if config.CHARACTER_STORAGE_FORMAT not in character_storage.FORMAT_EXTENSIONS:
+        raise ValueError(f"CHARACTER_STORAGE_FORMAT must be one of {', '.join(character_storage.FORMAT_EXTENSIONS)}")
+    if config.CHARACTER_LAYOUT not in character_storage.LAYOUTS:
+        raise ValueError(f"CHARACTER_LAYOUT must be one of {', '.join(character_storage.LAYOUTS)}")
+
+    # Server-Sent Events broker for job progress and career events
+    event_broker = event_stream.EventBroker()
+
+    # Background bulk generation jobs (results are written under the data directory)
+    job_manager = bulk_generation.GenerationJobManager(
+        config.DATA_DIR,
+        max_concurrent_jobs=config.MAX_CONCURRENT_JOBS,
+        max_workers=config.JOB_WORKERS,
+        retention_seconds=config.JOB_RETENTION_SECONDS,
+        on_update=lambda job: event_broker.publish(f"job:{job['id']}", "progress", job)
+    )
+
+    # Token-bucket rate limits for /api/* (bucket state lives where RATELIMIT_STORAGE_URL points)
+    rate_limiter = rate_limiting.RateLimiter(rate_limiting.create_backend(config.RATELIMIT_STORAGE_URL),
+                                             rate_limiting.parse_limits(config.RATELIMIT_LIMITS))
+
+    # Current character and seed are shared by all worker processes through this store;
+    # each request reads them from it
+    state_store = state_backend.create_state_store(config.STATE_STORAGE_URL)
+    if seed is None:
+        state_store.set_default("global_seed", config.DEFAULT_SEED)
+    else:
+        state_store.set("global_seed", seed)
+
+
+    # Stored responses for retried requests that carry an Idempotency-Key, shared by every worker
+    idempotency_store = idempotency.IdempotencyStore(state_store, config.IDEMPOTENCY_TTL_SECONDS,
+                                                     config.IDEMPOTENCY_CLAIM_SECONDS)
+
+    # Manifest of archived characters, loaded now so forked workers share it
+    archive_manifest = character_archive.ArchiveManifest(
+        'characters', cache=character_storage.CharacterCache(config.CHARACTER_CACHE_MAX_BYTES))
+    if not archive_manifest.is_current() and os.path.isdir('characters'):
+        archive_manifest.rebuild(max_workers=config.JOB_WORKERS)
+    archive_manifest.refresh()
+
+    # Unique character IDs and seeds from a counter reserved in batches in the shared store.
+    # A new or reset store (e.g. memory://) would restart the counter below the archived IDs.
+    id_allocator = character_ids.CharacterIdAllocator(state_store, batch_size=config.ID_BATCH_SIZE)
+    id_allocator.reserve_through(archive_manifest.max_character_id())
+
+    app = Flask(__name__)
+    app.config.from_object(config)
+    app.json = CharacterJSONProvider(app)
+    app.extensions[EXTENSION_NAME] = AppServices(
+        config, event_broker, job_manager, rate_limiter, state_store, idempotency_store, id_allocator,
+        archive_manifest,
+        # Re-encodes only history entries appended since a character was last encoded
+        history_serializer.HistorySerializer(),
+        build_static_payloads())
+    app.register_blueprint(api)
+
+    # Keep the garbage collector from touching (and so copying) the preloaded objects
+    # in forked workers
+    gc.freeze()
+
+    app.logger.setLevel(config.LOG_LEVEL)
+    app.config['STARTUP_SECONDS'] = time.perf_counter() - started
+    app.logger.info("Startup completed in %.1f ms", app.config['STARTUP_SECONDS'] * 1000)
+    return app
+
+class CharacterJSONProvider(DefaultJSONProvider):
+    """
+    JSON responses whose "character" is encoded by the history serializer, so only
+    history entries added since the last response or save are encoded
+    """
+
+    def dumps(self, obj, **kwargs):
+        character = obj.get("character") if isinstance(obj, dict) else None
+        services = self._app.extensions.get(EXTENSION_NAME)
+        if not isinstance(character, dict) or services is None:
+            return super().dumps(obj, **kwargs)
+        rest = super().dumps({key: value for key, value in obj.items() if key != "character"}, **kwargs)
+        character_text = services.history_encoder.dumps(character_key(character), character)
+        return rest[:rest.rindex("}")].rstrip() + ("," if len(obj) > 1 else "") + '"character":' + character_text + "}"
+
+def build_static_payloads():
+    """Serialize the bodies of responses that do not depend on the request or character"""
+    payloads = {
+        "ui_config": {
+            "success": True,
+            "config": {
+                "characteristic_quality": chargen.get_characteristic_quality_thresholds(),
+                "defaults": chargen.get_game_defaults()
+            }
+        },
+        "enlistment_bonus_requirements": {
+            "success": True,
+            "bonus_requirements": chargen.get_enlistment_bonus_requirements()
+        }
+    }
+    return {name: json.dumps(payload, sort_keys=True) for name, payload in payloads.items()}
+
+def static_json_response(name):
+    return Response(app_services().static_payloads[name], mimetype='application/json')
+
+def character_file_key(character_record):
+    """File name stem for a character: its unique ID, or its sanitized name for records saved before IDs"""
+    character_id = character_record.get("character_id")
+    if character_id:
+        return character_id
     # Sanitize name for filename (remove unsafe characters)
-    safe_name = re.sub(r'[^a-zA-Z0-9_-]', '_', name)
-    return f'characters/{safe_name}.json'
+    return re.sub(r'[^a-zA-Z0-9_-]', '_', character_record.get("name", ""))
+
+def get_character_json_path(character_record):
+    """
+    Archive path for a character, e.g. characters/ab/cd/<id>.json.gz.
+    Format and directory layout follow CHARACTER_STORAGE_FORMAT and CHARACTER_LAYOUT.
+    """
+    config = app_services().config
+    return character_storage.character_file_path('characters', character_file_key(character_record),
+                                                 config.CHARACTER_STORAGE_FORMAT, config.CHARACTER_LAYOUT)
+
+def character_key(character_record):
+    """Identity used for locks, idempotency keys and event channels ('' for no character)"""
+    if not character_record:
+        return ""
+    return character_record.get("character_id") or character_record.get("name", "")
 
 def add_calculated_fields(character_record):
     """Add calculated fields to character record for API responses"""
@@ -43,125 +233,306 @@ def add_calculated_fields(character_record):
             print(f"DEBUG: Set career status to active, term {character_record['current_term']}")  # Debug line
     return character_record
 
+def load_current_character():
+    """Read the current character and its version from the shared store, upgrading a record saved by older code"""
+    g.current_character, g.state_version = app_services().state_store.get_with_version("current_character")
+    try:
+        if character_upgrades.needs_upgrade(g.current_character):
+            character_schema.check_record(character_upgrades.upgrade(g.current_character))
+    except character_schema.RecordValidationError as e:
+        # An unusable record must not break every request; creating a character replaces it
+        print(f"WARNING: Ignoring the stored current character: {e}")
+        g.current_character = None
+    # Events in the stored record were published by whichever worker saved them
+    history = (g.current_character or {}).get("career_history")
+    g.published_events = (character_channel(g.current_character), len(history) if type(history) is list else 0)
+
+def store_current_character():
+    """
+    Publish the current character to the other worker processes, bumping its version
+
+    Returns:
+        The character encoded as compact JSON (None if there is no character)
+
+    Raises:
+        state_backend.VersionConflict: If another request saved the character since
+            this request loaded it
+    """
+    text = None
+    if g.current_character is not None:
+        g.current_character["version"] = g.current_character.get("version", 0) + 1
+        text = app_services().history_encoder.dumps(character_key(g.current_character), g.current_character)
+    try:
+        g.state_version = app_services().state_store.set("current_character", g.current_character,
+                                          expected_version=g.state_version, text=text)
+    except state_backend.VersionConflict:
+        g.version_conflict = True
+        raise
+    return text
+
 def save_character_to_file():
-    global current_character
-    if current_character is not None and "name" in current_character:
-        # Ensure characters directory exists
-        os.makedirs('characters', exist_ok=True)
-        path = get_character_json_path(current_character["name"])
-        with open(path, 'w') as f:
-            json.dump(current_character, f, indent=2)
-
-def load_character_from_file(name):
-    global current_character
-    path = get_character_json_path(name)
-    if os.path.exists(path):
-        with open(path, 'r') as f:
-            current_character = json.load(f)
-    else:
-        current_character = None
+    text = store_current_character()
+    if g.current_character is not None and "name" in g.current_character:
+        services = app_services()
+        path = character_storage.store_character('characters', character_file_key(g.current_character),
+                                                 g.current_character, services.config.CHARACTER_STORAGE_FORMAT,
+                                                 services.config.CHARACTER_LAYOUT, text)
+        services.archive_manifest.record(g.current_character, path)
+        publish_new_career_events(g.current_character)
+
+def character_channel(character_record):
+    return f"character:{character_key(character_record)}"
+
+def publish_new_career_events(character_record):
+    """
+    Push career_history events appended since the last save to this process's SSE subscribers
+
+    The events already published are those in the record as this request loaded it
+    from the shared store, so no worker keeps a count per character; all the events
+    of a character that was not the stored one (a new character) are new. Streams
+    read the events back from the shared store, so this only makes them look at once.
+    """
+    channel = character_channel(character_record)
+    history = character_record.get("career_history", [])
+    published_channel, published = g.get("published_events", ("", 0))
+    start = published if channel == published_channel else 0
+    for index in range(start, len(history)):
+        app_services().event_broker.publish(channel, "career_event", {"index": index, "event": history[index]})
+    g.published_events = (channel, len(history))
+
+def load_character_from_file(character_id):
+    """Make an archived character current; a malformed file raises character_schema.RecordValidationError here"""
+    archive_manifest = app_services().archive_manifest
+    character = archive_manifest.load(character_id)
+    if character is None:
+        # Not indexed yet (e.g. copied in by hand): look in both layouts
+        path = character_storage.resolve_character_path('characters', character_id)
+        character = archive_manifest.cache.get(path) if path else None
+    # Cached records are shared between requests; the current character gets modified
+    g.current_character = copy.deepcopy(character)
+    store_current_character()
 
 # Helper function to get RNG with global seed
 def get_rng():
-    return chargen.set_seed(GLOBAL_SEED)
+    return chargen.set_seed(g.global_seed)
+
+def new_character_record():
+    """Create a fresh named character record with a unique ID and its own reproducible seed"""
+    services = app_services()
+    while True:
+        character_id, seed = services.id_allocator.allocate(g.global_seed)
+        # Never overwrite an archived character, even if the counter was moved back
+        if (services.archive_manifest.get(character_id) is None
+                and character_storage.resolve_character_path('characters', character_id) is None):
+            return chargen.create_named_character(seed, character_id)
+        current_app.logger.warning("Character ID %s is already archived; skipping it", character_id)
+        services.id_allocator.reserve_through(services.archive_manifest.max_character_id())
+
+@api.before_request
+def enforce_rate_limit():
+    """Reject /api/* requests once the client or route group runs out of tokens"""
+    services = app_services()
+    if not services.config.RATELIMIT_ENABLED or not request.path.startswith('/api/'):
+        return None
+    rule = request.url_rule.rule if request.url_rule else request.path
+    group = services.rate_limiter.group_for(request.method, rule)
+    result = services.rate_limiter.check(request.remote_addr or 'unknown', group)
+    if not result.allowed:
+        retry_after = max(1, int(result.retry_after + 0.999))
+        response = jsonify({"success": False, "error": f"Rate limit exceeded for {group} requests",
+                            "retry_after": retry_after})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
+    return None
+
+@api.before_request
+def load_shared_state():
+    """Load this request's character and the global seed from the shared state store"""
+    load_current_character()
+    g.version_conflict = False
+    services = app_services()
+    g.global_seed = services.state_store.get("global_seed", services.config.DEFAULT_SEED)
+
+@api.after_request
+def add_character_etag(response):
+    """Expose the character version as an ETag so clients can send it back in If-Match"""
+    character = g.get("current_character")
+    if character and "version" in character and "ETag" not in response.headers:
+        response.headers['ETag'] = f'"{character["version"]}"'
+    return response
+
+def get_character_lock(key):
+    return character_locks[hash(key) % CHARACTER_LOCK_STRIPES]
+
+def if_match_satisfied(character):
+    """Check the If-Match header (a character version, optionally quoted) against the character"""
+    if_match = request.headers.get('If-Match')
+    if not if_match or if_match.strip() == '*':
+        return True
+    expected = [tag.strip().removeprefix('W/').strip('"') for tag in if_match.split(',')]
+    return character is not None and str(character.get("version", 0)) in expected
+
+def version_conflict_response(message):
+    version = (g.current_character or {}).get("version")
+    return jsonify({"success": False, "error": message, "current_version": version}), 409
+
+def character_transaction(view):
+    """
+    Run a mutating route as one load -> rules -> save critical section
+
+    Requests for the same character are serialized by a per-character lock; the
+    character is reloaded under the lock so the route starts from the latest save.
+    A stale If-Match version, or a save that loses a race against another worker
+    process, is answered with 409 Conflict. A repeated Idempotency-Key replays the
+    first response before any of that is checked.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        def run_view():
+            if not if_match_satisfied(g.current_character):
+                return version_conflict_response("Character version does not match If-Match")
+            try:
+                response = view(*args, **kwargs)
+            except state_backend.VersionConflict:
+                g.version_conflict = True
+            if g.version_conflict:
+                # The route may have caught the conflict itself; the save never happened
+                return version_conflict_response("Character was changed by another request; reload and retry")
+            return response
+
+        with get_character_lock(character_key(g.current_character)):
+            load_current_character()
+            return run_idempotently(run_view, character_scoped=True)
+    return wrapper
+
+def run_idempotently(view, character_scoped=False):
+    """
+    Run a route once per Idempotency-Key, replaying the stored response on retries
+
+    Args:
+        view: Zero-argument callable producing the route's response
+        character_scoped: Key the stored response by the current character as well as
+            the header (character routes); otherwise keys are global to the route
+
+    Returns:
+        The route's response, the stored response (with Idempotent-Replayed: true),
+        or 409 Conflict while another request with the same key is still running
+    """
+    key = request.headers.get('Idempotency-Key')
+    if not key:
+        return view()
+    if len(key) > idempotency.MAX_KEY_LENGTH:
+        return jsonify({"success": False, "error": "Idempotency-Key is too long"}), 400
+
+    scope = character_key(g.current_character) if character_scoped else request.path
+    fingerprint = idempotency.request_fingerprint(request.method, request.path, request.get_data())
+    entry = app_services().idempotency_store.claim((scope, key), fingerprint)
+    if entry is not None:
+        if entry["fingerprint"] != fingerprint:
+            return jsonify({"success": False,
+                            "error": "Idempotency-Key was already used for a different request"}), 422
+        if entry.get("pending"):
+            return jsonify({"success": False,
+                            "error": "A request with this Idempotency-Key is still running; retry later"}), 409
+        response = Response(base64.b64decode(entry["body"]), status=entry["status"], mimetype=entry["mimetype"])
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+
+    stored = False
+    try:
+        response = current_app.make_response(view())
+        if idempotency.should_store(response.status_code) and not g.get("version_conflict"):
+            entry = {"fingerprint": fingerprint, "status": response.status_code, "mimetype": response.mimetype,
+                     "body": base64.b64encode(response.get_data()).decode("ascii")}
+            app_services().idempotency_store.complete((scope, key), entry)
+            stored = True
+            if character_scoped:
+                # Creating or archiving changes the character; a retry will look it up under the new one
+                new_scope = character_key(g.current_character)
+                if new_scope != scope:
+                    app_services().idempotency_store.complete((new_scope, key), entry)
+    finally:
+        if not stored:
+            app_services().idempotency_store.release((scope, key))
+    return response
+
+def idempotent(view):
+    """Accept an Idempotency-Key on a mutating route that is not a character transaction"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != 'POST':
+            return view(*args, **kwargs)
+        return run_idempotently(lambda: view(*args, **kwargs))
+    return wrapper
 
 # NOTE: Frontend business logic functions removed per state-control-rules.md
 # Frontend now uses rdy_for_* flags directly from backend responses
 
-@app.route('/')
+@api.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/api/create_character', methods=['POST'])
+@api.route('/api/create_character', methods=['POST'])
+@character_transaction
 def api_create_character():
-    global current_character
     
     # Only create new character if no current character exists
-    if current_character is not None:
+    if g.current_character is not None:
         return jsonify({
             "success": False, 
             "error": "Character already exists. Archive current character first.",
-            "current_character_name": current_character.get("name", "Unknown")
+            "current_character_name": g.current_character.get("name", "Unknown")
         }), 400
     
-    # Create completely fresh character with unique seed for each character
-    import time
-    import random
-    
-    # Generate a unique seed for this character based on time
-    unique_seed = GLOBAL_SEED + int(time.time() * 1000) % 1000000
-    
-    # Use unique seed for both name generation and character generation
-    temp_rng = random.Random(unique_seed)
-    
-    current_character = chargen.create_character_record()
-    current_character["name"] = chargen.generate_character_name(temp_rng)
-    current_character["upp"] = "______"  # Reset UPP for new character
-    current_character["seed"] = unique_seed  # Store the unique seed used for this character
-    
-    # Set up RNG with unique seed for character generation
-    rng = chargen.set_seed(unique_seed)
-    chargen.save_random_state(current_character, rng)  # Initialize RNG state with unique seed
+    g.current_character = new_character_record()
     save_character_to_file()
-    print(f"DEBUG: Created new character: {current_character['name']} with seed: {unique_seed}")
+    print(f"DEBUG: Created new character: {g.current_character['name']} with seed: {g.current_character['seed']}")
     return jsonify({
         "success": True,
-        "name": current_character["name"],
-        "age": current_character["age"],
-        "terms_served": current_character["terms_served"],
-        "upp": current_character["upp"]
+        "name": g.current_character["name"],
+        "age": g.current_character["age"],
+        "terms_served": g.current_character["terms_served"],
+        "upp": g.current_character["upp"]
     })
 
-@app.route('/api/generate_characteristic', methods=['POST'])
+@api.route('/api/generate_characteristic', methods=['POST'])
+@character_transaction
 def api_generate_characteristic():
-    global current_character
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
     data = request.get_json()
     characteristic = data.get('characteristic')
     if not characteristic:
         return jsonify({"success": False, "error": "Characteristic not specified"}), 400
-    char_to_upp_index = {
-        'strength': 0,
-        'dexterity': 1,
-        'endurance': 2,
-        'intelligence': 3,
-        'education': 4,
-        'social': 5
-    }
-    if characteristic not in char_to_upp_index:
+    if characteristic not in chargen.UPP_ORDER:
         return jsonify({"success": False, "error": "Invalid characteristic"}), 400
-    rng = chargen.get_random_generator(current_character)
+    rng = chargen.get_random_generator(g.current_character)
     value = chargen.generate_characteristic(rng, characteristic)
-    chargen.save_random_state(current_character, rng)
-    current_character["characteristics"][characteristic] = value
-    hex_char = str(value) if value < 10 else chr(65 + value - 10)
-    upp_list = list(current_character["upp"])
-    upp_list[char_to_upp_index[characteristic]] = hex_char
-    current_character["upp"] = ''.join(upp_list)
+    chargen.save_random_state(g.current_character, rng)
+    hex_char = chargen.set_characteristic(g.current_character, characteristic, value)
     save_character_to_file()
     return jsonify({
         "success": True,
         "characteristic": characteristic,
         "value": value,
         "hex": hex_char,
-        "upp": current_character["upp"]
+        "upp": g.current_character["upp"]
     })
 
-@app.route('/api/enlist', methods=['POST'])
+@api.route('/api/enlist', methods=['POST'])
+@character_transaction
 def api_enlist():
-    global current_character
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
     data = request.get_json()
     service = data.get('service')
     if not service:
         return jsonify({"success": False, "error": "Service not specified"}), 400
-    rng = chargen.get_random_generator(current_character)
-    current_character = chargen.attempt_enlistment(rng, current_character, service)
-    chargen.save_random_state(current_character, rng)
+    rng = chargen.get_random_generator(g.current_character)
+    g.current_character = chargen.attempt_enlistment(rng, g.current_character, service)
+    chargen.save_random_state(g.current_character, rng)
     save_character_to_file()
-    enlistment_result = current_character["career_history"][-1]
+    enlistment_result = g.current_character["career_history"][-1]
     response_data = {
         "success": True,
         "enlistment_result": {
@@ -172,29 +543,29 @@ def api_enlist():
             "modifier": enlistment_result["modifier"],
             "modifier_details": enlistment_result["modifier_details"]
         },
-        "character": add_calculated_fields(current_character.copy())
+        "character": add_calculated_fields(g.current_character.copy())
     }
     return jsonify(response_data)
 
-@app.route('/api/survival', methods=['POST'])
+@api.route('/api/survival', methods=['POST'])
+@character_transaction
 def api_survival():
-    global current_character
-    print(f"DEBUG: Survival API called. Current character exists: {current_character is not None}")
-    if current_character:
-        print(f"DEBUG: Character name: {current_character.get('name', 'Unknown')}")
-        print(f"DEBUG: Character has career_history: {'career_history' in current_character}")
-        if 'career_history' in current_character:
-            print(f"DEBUG: Career history length: {len(current_character['career_history'])}")
+    print(f"DEBUG: Survival API called. Current character exists: {g.current_character is not None}")
+    if g.current_character:
+        print(f"DEBUG: Character name: {g.current_character.get('name', 'Unknown')}")
+        print(f"DEBUG: Character has career_history: {'career_history' in g.current_character}")
+        if 'career_history' in g.current_character:
+            print(f"DEBUG: Career history length: {len(g.current_character['career_history'])}")
     
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
     
     try:
-        rng = chargen.get_random_generator(current_character)
-        current_character = chargen.check_survival(rng, current_character)
-        chargen.save_random_state(current_character, rng)
+        rng = chargen.get_random_generator(g.current_character)
+        g.current_character = chargen.check_survival(rng, g.current_character)
+        chargen.save_random_state(g.current_character, rng)
         save_character_to_file()
-        survival_result = current_character["career_history"][-1]
+        survival_result = g.current_character["career_history"][-1]
     except Exception as e:
         print(f"DEBUG: Error in survival check: {str(e)}")
         return jsonify({"success": False, "error": f"Survival check failed: {str(e)}"}), 400
@@ -207,20 +578,20 @@ def api_survival():
             "modifier": survival_result["modifier"],
             "modifier_details": survival_result["modifier_details"]
         },
-        "character": add_calculated_fields(current_character.copy())
+        "character": add_calculated_fields(g.current_character.copy())
     }
     return jsonify(response_data)
 
-@app.route('/api/commission', methods=['POST'])
+@api.route('/api/commission', methods=['POST'])
+@character_transaction
 def api_commission():
-    global current_character
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
-    rng = chargen.get_random_generator(current_character)
-    current_character = chargen.check_commission(rng, current_character)
-    chargen.save_random_state(current_character, rng)
+    rng = chargen.get_random_generator(g.current_character)
+    g.current_character = chargen.check_commission(rng, g.current_character)
+    chargen.save_random_state(g.current_character, rng)
     save_character_to_file()
-    commission_result = current_character["career_history"][-1]
+    commission_result = g.current_character["career_history"][-1]
     response_data = {
         "success": True,
         "commission_result": {
@@ -233,20 +604,20 @@ def api_commission():
             "rank": commission_result.get("rank"),
             "career": commission_result.get("career")
         },
-        "character": add_calculated_fields(current_character.copy())
+        "character": add_calculated_fields(g.current_character.copy())
     }
     return jsonify(response_data)
 
-@app.route('/api/promotion', methods=['POST'])
+@api.route('/api/promotion', methods=['POST'])
+@character_transaction
 def api_promotion():
-    global current_character
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
-    rng = chargen.get_random_generator(current_character)
-    current_character = chargen.check_promotion(rng, current_character)
-    chargen.save_random_state(current_character, rng)
+    rng = chargen.get_random_generator(g.current_character)
+    g.current_character = chargen.check_promotion(rng, g.current_character)
+    chargen.save_random_state(g.current_character, rng)
     save_character_to_file()
-    promotion_result = current_character["career_history"][-1]
+    promotion_result = g.current_character["career_history"][-1]
     response_data = {
         "success": True,
         "promotion_result": {
@@ -259,89 +630,88 @@ def api_promotion():
             "rank": promotion_result.get("rank"),
             "career": promotion_result.get("career")
         },
-        "character": add_calculated_fields(current_character.copy())
+        "character": add_calculated_fields(g.current_character.copy())
     }
     return jsonify(response_data)
 
-@app.route('/api/resolve_skill', methods=['POST'])
+@api.route('/api/resolve_skill', methods=['POST'])
+@character_transaction
 def api_resolve_skill():
-    global current_character
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
     data = request.get_json() or {}
     table_choice = data.get('table_choice')
-    rng = chargen.get_random_generator(current_character)
+    rng = chargen.get_random_generator(g.current_character)
     try:
-        current_character = chargen.resolve_skill(rng, current_character, table_choice)
-        chargen.save_random_state(current_character, rng)
+        g.current_character = chargen.resolve_skill(rng, g.current_character, table_choice)
+        chargen.save_random_state(g.current_character, rng)
         save_character_to_file()
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 400
     skill_event = None
-    for event in reversed(current_character.get("career_history", [])):
+    for event in reversed(g.current_character.get("career_history", [])):
         if event.get("event_type") == "skill_resolution":
             skill_event = event
             break
     
-    available_options = chargen.get_available_reenlistment_options(current_character)
+    available_options = chargen.get_available_reenlistment_options(g.current_character)
     
     return jsonify({
         "success": True,
         "skill_event": skill_event,
-        "character": add_calculated_fields(current_character.copy()),
+        "character": add_calculated_fields(g.current_character.copy()),
         "available_options": available_options
     })
 
-@app.route('/api/available_skill_tables', methods=['GET'])
+@api.route('/api/available_skill_tables', methods=['GET'])
 def api_available_skill_tables():
-    global current_character
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
-    available_tables = chargen.get_available_skill_tables(current_character)
+    available_tables = chargen.get_available_skill_tables(g.current_character)
     return jsonify({"success": True, "available_tables": available_tables})
 
-@app.route('/api/ageing', methods=['POST'])
+@api.route('/api/ageing', methods=['POST'])
+@character_transaction
 def api_ageing():
-    global current_character
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
-    rng = chargen.get_random_generator(current_character)
-    current_character = chargen.check_ageing(rng, current_character)
-    chargen.save_random_state(current_character, rng)
+    rng = chargen.get_random_generator(g.current_character)
+    g.current_character = chargen.check_ageing(rng, g.current_character)
+    chargen.save_random_state(g.current_character, rng)
     save_character_to_file()
-    ageing_events = [e for e in current_character.get('career_history', []) if e.get('event_type') == 'ageing_check']
+    ageing_events = [e for e in g.current_character.get('career_history', []) if e.get('event_type') == 'ageing_check']
     latest_ageing = ageing_events[-1] if ageing_events else {}
-    available_options = chargen.get_available_reenlistment_options(current_character)
+    available_options = chargen.get_available_reenlistment_options(g.current_character)
     
     return jsonify({
         "success": True,
-        "age": current_character.get("age"),
+        "age": g.current_character.get("age"),
         "ageing_report": latest_ageing,
-        "character": add_calculated_fields(current_character.copy()),
+        "character": add_calculated_fields(g.current_character.copy()),
         "available_options": available_options
     })
 
-@app.route('/api/reenlist', methods=['POST'])
+@api.route('/api/reenlist', methods=['POST'])
+@character_transaction
 def api_reenlist():
-    global current_character
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
     data = request.get_json() or {}
     preference = data.get('preference', 'reenlist')
-    rng = chargen.get_random_generator(current_character)
+    rng = chargen.get_random_generator(g.current_character)
     try:
-        current_character = chargen.attempt_reenlistment(rng, current_character, preference)
-        chargen.save_random_state(current_character, rng)
+        g.current_character = chargen.attempt_reenlistment(rng, g.current_character, preference)
+        chargen.save_random_state(g.current_character, rng)
         # Get the last reenlistment event for feedback
         reenlistment_result = None
-        for event in reversed(current_character.get("career_history", [])):
+        for event in reversed(g.current_character.get("career_history", [])):
             if event.get("event_type") == "reenlistment_attempt":
                 reenlistment_result = event
                 break
         save_character_to_file()
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 400
-    available_options = chargen.get_available_reenlistment_options(current_character)
+    available_options = chargen.get_available_reenlistment_options(g.current_character)
     route = "continue"
     if reenlistment_result is not None:
         outcome = reenlistment_result.get("outcome")
@@ -351,22 +721,239 @@ def api_reenlist():
     return jsonify({
         "success": True,
         "reenlistment_result": reenlistment_result,
-        "character": add_calculated_fields(current_character.copy()),
+        "character": add_calculated_fields(g.current_character.copy()),
         "available_options": available_options,
         "new_term": reenlistment_result and reenlistment_result.get("continue_career", False),
-        "term_number": current_character.get("terms_served", 0) + 1,  # Current term being played
+        "term_number": g.current_character.get("terms_served", 0) + 1,  # Current term being played
         "route": route
     })
 
-@app.route('/api/muster_out_info', methods=['GET'])
+@api.route('/api/autoplay', methods=['POST'])
+@character_transaction
+def api_autoplay():
+    """
+    Run the rules server-side from a declarative policy.
+    Plays one term (scope "term") or the whole career (scope "career") with a single save.
+    A new character is created first if none is in progress.
+    """
+    data = request.get_json() or {}
+    scope = data.get('scope', 'career')
+    if scope not in ['term', 'career']:
+        return jsonify({"success": False, "error": "Scope must be 'term' or 'career'"}), 400
+    
+    character = g.current_character if g.current_character is not None else new_character_record()
+    events_before = len(character.get("career_history", []))
+    rng = chargen.get_random_generator(character)
+    try:
+        if scope == 'term':
+            character = chargen.autoplay_term(rng, character, data.get('policy'))
+        else:
+            character = chargen.autoplay_career(rng, character, data.get('policy'))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    chargen.save_random_state(character, rng)
+    g.current_character = character
+    save_character_to_file()
+    
+    career_complete = bool(g.current_character.get("mustering_out_benefits"))
+    return jsonify({
+        "success": True,
+        "scope": scope,
+        "events": g.current_character["career_history"][events_before:],
+        "character": add_calculated_fields(g.current_character.copy()),
+        "mustering_out": g.current_character.get("mustering_out_benefits", {}),
+        "career_complete": career_complete
+    })
+
+@api.route('/api/bulk_generate', methods=['POST'])
+def api_bulk_generate():
+    """
+    Generate complete characters server-side and stream them back as NDJSON.
+    Each character is written as soon as it is finished, so memory stays flat for large counts.
+    Body: count, seed (default: global seed), fields (optional projection), policy (autoplay policy).
+    """
+    data = request.get_json() or {}
+    try:
+        count = int(data.get('count', 1))
+        seed = int(data.get('seed', g.global_seed))
+    except (ValueError, TypeError):
+        return jsonify({"success": False, "error": "Count and seed must be numbers"}), 400
+    if not 1 <= count <= BULK_GENERATE_MAX_COUNT:
+        return jsonify({"success": False, "error": f"Count must be between 1 and {BULK_GENERATE_MAX_COUNT}"}), 400
+    
+    fields = data.get('fields')
+    if fields is not None and (not isinstance(fields, list) or not all(isinstance(f, str) for f in fields)):
+        return jsonify({"success": False, "error": "Fields must be a list of field names"}), 400
+    try:
+        policy = chargen.normalize_autoplay_policy(data.get('policy'))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    def generate():
+        for line in bulk_generation.iter_character_lines(seed, 0, count, policy, fields):
+            yield line + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@api.route('/api/jobs', methods=['GET', 'POST'])
+@idempotent
+def api_jobs():
+    """
+    POST: Submit a background generation job (count, seed, policy, format, fields).
+    GET: List jobs started by this server process.
+    """
+    if request.method == 'GET':
+        return jsonify({"success": True, "jobs": app_services().job_manager.list_jobs()})
+    try:
+        job = app_services().job_manager.submit(request.get_json() or {}, default_seed=g.global_seed)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "job": job}), 202
+
+@api.route('/api/jobs/<job_id>', methods=['GET'])
+def api_job_status(job_id):
+    job = app_services().job_manager.get_status(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    return jsonify({"success": True, "job": job})
+
+@api.route('/api/jobs/<job_id>/result', methods=['GET'])
+def api_job_result(job_id):
+    job = app_services().job_manager.get_status(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    if job["status"] != "completed":
+        return jsonify({"success": False, "error": f"Job is {job['status']}", "job": job}), 409
+    output_format = job["spec"]["format"]
+    return send_file(os.path.abspath(job["result_path"]),
+                     mimetype=bulk_generation.JOB_FORMATS[output_format]["mimetype"],
+                     as_attachment=True,
+                     download_name=f"characters_{job_id}.{bulk_generation.JOB_FORMATS[output_format]['extension']}")
+
+@api.route('/api/jobs/<job_id>/events', methods=['GET'])
+def api_job_events(job_id):
+    """
+    Server-Sent Events stream of job progress (completed count, throughput, ETA).
+    The stream ends once the job completes, fails or is cancelled. Progress of a
+    job running in another worker process is read from its status file.
+    """
+    services = app_services()
+    event_broker = services.event_broker
+    subscription = event_broker.subscribe(f"job:{job_id}")
+    job = services.job_manager.get_status(job_id)
+    if job is None:
+        event_broker.unsubscribe(subscription)
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    
+    def is_finished(event):
+        return event["data"]["status"] in bulk_generation.GenerationJobManager.FINAL_STATUSES
+    
+    job_manager = services.job_manager
+    last_sent = [(job["status"], job["completed"])]
+    def poll():
+        # The job may run in another worker process: its status file is read then
+        current = job_manager.get_status(job_id)
+        if current is None:
+            # Expired (deleted) since: nothing more will happen
+            subscription.close()
+            return []
+        if (current["status"], current["completed"]) == last_sent[0]:
+            return []
+        last_sent[0] = (current["status"], current["completed"])
+        return [("progress", current)]
+    
+    stream = event_stream.stream_events(event_broker, subscription, [("progress", job)], is_finished, poll)
+    return Response(stream, mimetype='text/event-stream', headers={"Cache-Control": "no-cache"})
+
+@api.route('/api/character_events', methods=['GET'])
+def api_character_events():
+    """
+    Server-Sent Events stream of career_history events for the current character.
+    Send ?since=<index> to replay events from that index first (default: only new events).
+    New events are read back from the shared state store, so saves by any worker are pushed.
+    """
+    if not g.current_character:
+        return jsonify({"success": False, "error": "No character created yet"}), 400
+    
+    services = app_services()
+    event_broker = services.event_broker
+    subscription = event_broker.subscribe(character_channel(g.current_character))
+    history = g.current_character.get("career_history", [])
+    try:
+        since = int(request.args.get('since', len(history)))
+    except ValueError:
+        since = len(history)
+    # Replay at most one queue's worth of history; events carry their index so clients can de-duplicate
+    replay_start = max(since, len(history) - event_broker.queue_size, 0)
+    initial_events = [("career_event", {"index": index, "event": history[index]})
+                      for index in range(replay_start, len(history))]
+    
+    key = character_key(g.current_character)
+    state_store, archive_manifest = services.state_store, services.archive_manifest
+    next_index = [len(history)]
+    def poll():
+        # Any worker may have saved the character since: read it back from the shared store
+        character = state_store.get("current_character")
+        if character_key(character) != key:
+            # No longer current (archived): its last save is in the archive
+            try:
+                character = archive_manifest.load(key) if character_ids.is_character_id(key) else None
+            except character_schema.RecordValidationError:
+                character = None
+        events = (character or {}).get("career_history")
+        if type(events) is not list:
+            return []
+        start, next_index[0] = next_index[0], max(next_index[0], len(events))
+        return [("career_event", {"index": index, "event": events[index]}) for index in range(start, len(events))]
+    
+    stream = event_stream.stream_events(event_broker, subscription, initial_events, poll=poll)
+    return Response(stream, mimetype='text/event-stream', headers={"Cache-Control": "no-cache"})
+
+@api.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@idempotent
+def api_job_cancel(job_id):
+    job = app_services().job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    return jsonify({"success": True, "job": job})
+
+@api.route('/api/batch_actions', methods=['POST'])
+@character_transaction
+def api_batch_actions():
+    """
+    Apply a sequence of actions (e.g. ["survival", "skill:service", "ageing", "reenlist:reenlist"])
+    atomically with one RNG restore and one save. If any step is not allowed by the
+    rdy_for_* flags the whole batch is rolled back.
+    """
+    if not g.current_character:
+        return jsonify({"success": False, "error": "No character created yet"}), 400
+    data = request.get_json() or {}
+    steps = data.get('steps')
+    
+    rng = chargen.get_random_generator(g.current_character)
+    try:
+        character, results = chargen.run_action_pipeline(rng, g.current_character, steps)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e), "rolled_back": True}), 400
+    chargen.save_random_state(character, rng)
+    g.current_character = character
+    save_character_to_file()
+    
+    return jsonify({
+        "success": True,
+        "results": results,
+        "character": add_calculated_fields(g.current_character.copy()),
+        "available_actions": chargen.get_available_actions(g.current_character)
+    })
+
+@api.route('/api/muster_out_info', methods=['GET'])
 def api_muster_out_info():
-    global current_character
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
     
     # Calculate total rolls available
-    terms_served = current_character.get('terms_served', 0)
-    rank = current_character.get('rank', 0)
+    terms_served = g.current_character.get('terms_served', 0)
+    rank = g.current_character.get('rank', 0)
     
     total_rolls = int(terms_served)
     if 1 <= rank <= 2:
@@ -387,43 +974,44 @@ def api_muster_out_info():
         "rank": rank
     })
 
-@app.route('/api/muster_out', methods=['POST'])
+@api.route('/api/muster_out', methods=['POST'])
+@character_transaction
 def api_muster_out():
-    global current_character
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
     data = request.get_json() or {}
     cash_rolls = int(data.get('cash_rolls', 0))
-    rng = chargen.get_random_generator(current_character)
+    rng = chargen.get_random_generator(g.current_character)
     try:
-        current_character = chargen.perform_mustering_out(rng, current_character, cash_rolls)
-        chargen.save_random_state(current_character, rng)
+        g.current_character = chargen.perform_mustering_out(rng, g.current_character, cash_rolls)
+        chargen.save_random_state(g.current_character, rng)
         save_character_to_file()
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 400
     return jsonify({
         "success": True,
-        "character": add_calculated_fields(current_character.copy()),
-        "mustering_out": current_character.get("mustering_out_benefits", {}),
+        "character": add_calculated_fields(g.current_character.copy()),
+        "mustering_out": g.current_character.get("mustering_out_benefits", {}),
         "career_complete": True  # Signal to frontend that career is finished (but not auto-archived)
     })
 
-@app.route('/api/archive_character', methods=['POST'])
+@api.route('/api/archive_character', methods=['POST'])
+@character_transaction
 def api_archive_character():
-    global current_character
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character to archive"}), 400
     
-    if not current_character.get("name"):
+    if not g.current_character.get("name"):
         return jsonify({"success": False, "error": "Character has no name to archive"}), 400
     
     try:
-        character_name = current_character.get("name")
+        character_name = g.current_character.get("name")
         save_character_to_file()  # Save current character to archive
         print(f"DEBUG: Manually archived character: {character_name}")
         
         # Clear current character state after successful archive (Option B behavior)
-        current_character = None
+        g.current_character = None
+        store_current_character()
         
         return jsonify({
             "success": True,
@@ -433,63 +1021,184 @@ def api_archive_character():
     except Exception as e:
         return jsonify({"success": False, "error": f"Archive failed: {str(e)}"}), 500
 
-@app.route('/api/get_available_actions', methods=['GET'])
+@api.route('/api/archive', methods=['GET'])
+def api_archive_list():
+    """
+    List archived characters from the manifest, filtered and paginated.
+    Filters: career, status, name (substring), min_/max_ terms, rank, age, cash.
+    Pagination: limit (default 50) and after (next_cursor from the previous page).
+    """
+    try:
+        filters = character_archive.parse_filters(request.args)
+        limit, after = character_archive.parse_page(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    page = app_services().archive_manifest.query(filters, limit, after)
+    return jsonify({"success": True, **page})
+
+@api.route('/api/archive/skills', methods=['GET'])
+def api_archive_skill_search():
+    """
+    Find archived characters by skill using the inverted skill index.
+    q: "Pilot-2 AND Navigation OR Ship's Boat-1" (Skill-N means level N or better).
+    Accepts the same filters and pagination as /api/archive. Without q, lists the
+    indexed skills and the levels held.
+    """
+    if not request.args.get('q'):
+        return jsonify({"success": True, "skills": app_services().archive_manifest.skill_index.skills()})
+    try:
+        skills = skill_index.parse_skill_query(request.args['q'])
+        filters = character_archive.parse_filters(request.args)
+        limit, after = character_archive.parse_page(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    page = app_services().archive_manifest.query(filters, limit, after, skills=skills)
+    return jsonify({"success": True, **page})
+
+@api.route('/api/archive/dice_rolls', methods=['GET'])
+def api_archive_dice_rolls():
+    """
+    Stream the dice roll log of archived characters as one CSV file, one row per roll
+    with the character's ID first. Accepts the filters of /api/archive and q of
+    /api/archive/skills (default: the whole archive). Rows are formatted in a process
+    pool and written in character ID order as they are ready.
+    """
+    try:
+        filters = character_archive.parse_filters(request.args)
+        skills = skill_index.parse_skill_query(request.args['q']) if request.args.get('q') else None
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    locations = app_services().archive_manifest.locations(filters, skills)
+    report = dice_report.iter_archive_report(locations, max_workers=app_services().config.JOB_WORKERS)
+    return Response(report, mimetype='text/csv',
+                    headers={"Content-Disposition": 'attachment; filename="dice_rolls.csv"'})
+
+@api.route('/api/leaderboards', methods=['GET'])
+def api_leaderboards():
+    """
+    Top finished characters from the incrementally maintained leaderboards.
+    metric: cash, rank, terms or skills (default: all four); career: one service
+    (default: all services); limit: entries per board (default 10).
+    """
+    metrics = [request.args['metric']] if request.args.get('metric') else leaderboards.METRIC_NAMES
+    if any(metric not in leaderboards.METRICS for metric in metrics):
+        return jsonify({"success": False, "error": f"metric must be one of {', '.join(leaderboards.METRIC_NAMES)}"}), 400
+    career = None
+    if request.args.get('career'):
+        services = {service.lower(): service for service in chargen.get_available_services()}
+        career = services.get(request.args['career'].lower())
+        if career is None:
+            return jsonify({"success": False, "error": f"Unknown service: {request.args['career']}"}), 400
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= leaderboards.DEFAULT_SIZE:
+        return jsonify({"success": False, "error": f"limit must be between 1 and {leaderboards.DEFAULT_SIZE}"}), 400
+    return jsonify({
+        "success": True,
+        "career": career,
+        "leaderboards": {metric: app_services().archive_manifest.leaderboard(metric, career, limit) for metric in metrics}
+    })
+
+@api.route('/api/metrics', methods=['GET'])
+def api_metrics():
+    """Per-worker counters: archived character cache hits/misses and size"""
+    services = app_services()
+    return jsonify({
+        "success": True,
+        "pid": os.getpid(),
+        "character_cache": services.archive_manifest.cache.stats(),
+        "history_serializer": services.history_encoder.stats()
+    })
+
+@api.route('/api/archive/<character_id>', methods=['GET'])
+def api_archive_character_detail(character_id):
+    """Get one archived character: its manifest row and the full saved record"""
+    archive_manifest = app_services().archive_manifest
+    row = archive_manifest.get(character_id)
+    if row is None:
+        return jsonify({"success": False, "error": "Archived character not found"}), 404
+    try:
+        character = archive_manifest.load(character_id)
+    except character_schema.RecordValidationError as e:
+        return jsonify({"success": False, "error": str(e),
+                        "errors": [{"path": path, "message": message} for path, message in e.errors]}), 422
+    if character is None:
+        return jsonify({"success": False, "error": "Archived character file is missing or unreadable"}), 404
+    return jsonify({"success": True, "summary": row, "character": character})
+
+@api.route('/api/archive/rebuild', methods=['POST'])
+@idempotent
+def api_archive_rebuild():
+    """Rebuild the archive manifest from the character files (in parallel)"""
+    services = app_services()
+    count = services.archive_manifest.rebuild(max_workers=services.config.JOB_WORKERS)
+    return jsonify({"success": True, "characters": count})
+
+@api.route('/api/import', methods=['POST'])
+def api_import():
+    """
+    Bulk import characters into the archive; the request body is the file itself.
+    format: ndjson (default; gzip it with Content-Encoding: gzip), binary (length-
+    prefixed character_binary records) or bundle. ids: keep (default) each record's
+    character_id, or assign new ones. Records are validated in a process pool and
+    stored in bundles of many characters; rejected records are reported, not imported.
+    Not idempotent: an Idempotency-Key would mean holding the whole upload in memory.
+    """
+    fmt = request.args.get('format', 'ndjson')
+    ids = request.args.get('ids', 'keep')
+    if fmt not in character_import.SOURCE_FORMATS:
+        return jsonify({"success": False, "error": f"format must be one of {', '.join(character_import.SOURCE_FORMATS)}"}), 400
+    if ids not in character_import.ID_POLICIES:
+        return jsonify({"success": False, "error": f"ids must be one of {', '.join(character_import.ID_POLICIES)}"}), 400
+    services = app_services()
+    importer = character_import.CharacterImporter(services.archive_manifest, services.id_allocator, ids=ids,
+                                                  max_workers=services.config.JOB_WORKERS)
+    stream = request.stream
+    if request.headers.get('Content-Encoding') == 'gzip':
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    if fmt != 'bundle':
+        stats = importer.import_stream(stream, fmt)
+    else:
+        # A bundle is read from its index at the end, so the upload is spooled to disk first
+        spool_dir = os.path.join(services.config.DATA_DIR, 'imports')
+        os.makedirs(spool_dir, exist_ok=True)
+        handle, path = tempfile.mkstemp(suffix=character_storage.BUNDLE_EXTENSION, dir=spool_dir)
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                shutil.copyfileobj(stream, f)
+            stats = importer.import_file(path, fmt)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        finally:
+            os.remove(path)
+    return jsonify({"success": True, **stats})
+
+@api.route('/api/get_available_actions', methods=['GET'])
 def api_get_available_actions():
     """
     Backend-driven UI: Returns list of actions available to the current character.
     Frontend displays buttons based solely on this response.
     """
-    global current_character
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
     
-    available_actions = []
-    
-    # Check characteristics generation phase
-    if current_character.get('upp') == '______':
-        available_actions = ['generate_characteristics']
-    
-    # Check enlistment phase
-    elif not current_character.get('career'):
-        available_actions = ['enlist']
-    
-    # Check service phase actions based on readiness flags
-    else:
-        if current_character.get('rdy_for_survival_check', False):
-            available_actions.append('survival')
-        
-        if current_character.get('rdy_for_commission_check', False):
-            available_actions.append('commission')
-        
-        if current_character.get('rdy_for_promotion_check', False):
-            available_actions.append('promotion')
-        
-        if current_character.get('skill_roll_eligibility', 0) > 0:
-            available_actions.append('skills')
-        
-        if current_character.get('rdy_for_ageing_check', False):
-            available_actions.append('ageing')
-        
-        if current_character.get('rdy_for_reenlistment', False):
-            available_actions.append('reenlistment')
-        
-        if current_character.get('rdy_for_muster_out', False):
-            available_actions.append('muster_out')
+    available_actions = chargen.get_available_actions(g.current_character)
     
     return jsonify({
         "success": True,
         "available_actions": available_actions,
-        "character": add_calculated_fields(current_character.copy())
+        "character": add_calculated_fields(g.current_character.copy())
     })
 
-@app.route('/api/get_rank_title', methods=['POST'])
+@api.route('/api/get_rank_title', methods=['POST'])
 def api_get_rank_title():
-    global current_character
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
     
-    service = current_character.get('career', '')
-    rank = current_character.get('rank', 0)
+    service = g.current_character.get('career', '')
+    rank = g.current_character.get('rank', 0)
     
     rank_title = chargen.get_rank_title(service, rank)
     
@@ -500,7 +1209,7 @@ def api_get_rank_title():
         "rank": rank
     })
 
-@app.route('/api/calculate_probability', methods=['POST'])
+@api.route('/api/calculate_probability', methods=['POST'])
 def api_calculate_probability():
     data = request.get_json() or {}
     target = data.get('target')
@@ -521,7 +1230,7 @@ def api_calculate_probability():
     except (ValueError, TypeError):
         return jsonify({"success": False, "error": "Invalid target or modifiers"}), 400
 
-@app.route('/api/career_survival', methods=['POST'])
+@api.route('/api/career_survival', methods=['POST'])
 def api_career_survival():
     data = request.get_json() or {}
     service = data.get('service')
@@ -548,17 +1257,16 @@ def api_career_survival():
     except (ValueError, TypeError):
         return jsonify({"success": False, "error": "Invalid parameters"}), 400
 
-@app.route('/api/reenlistment_options', methods=['GET'])
+@api.route('/api/reenlistment_options', methods=['GET'])
 def api_reenlistment_options():
     """
     Get available reenlistment options for the current character
     """
-    global current_character
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
     
     try:
-        options = chargen.get_reenlistment_options(current_character)
+        options = chargen.get_reenlistment_options(g.current_character)
         return jsonify({
             "success": True,
             "options": options
@@ -566,29 +1274,21 @@ def api_reenlistment_options():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/api/enlistment_bonus_requirements', methods=['GET'])
+@api.route('/api/enlistment_bonus_requirements', methods=['GET'])
 def api_enlistment_bonus_requirements():
     """
     Get all enlistment bonus requirements for UI highlighting purposes.
     Returns ALL potential bonuses, not just those the character qualifies for.
     """
-    try:
-        bonus_requirements = chargen.get_enlistment_bonus_requirements()
-        return jsonify({
-            "success": True,
-            "bonus_requirements": bonus_requirements
-        })
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+    return static_json_response("enlistment_bonus_requirements")
 
-@app.route('/api/career_probabilities', methods=['GET'])
+@api.route('/api/career_probabilities', methods=['GET'])
 def api_career_probabilities():
     """
     Unified API for all career action probabilities
     Returns pre-calculated, pre-sorted, pre-formatted probabilities for all applicable career actions
     """
-    global current_character
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
     
     try:
@@ -602,13 +1302,13 @@ def api_career_probabilities():
         }
         
         # 1. ENLISTMENT PROBABILITIES (only if no career yet)
-        if not current_character.get("career") and current_character.get("characteristics"):
+        if not g.current_character.get("career") and g.current_character.get("characteristics"):
             services = ['Navy', 'Marines', 'Army', 'Scouts', 'Merchants', 'Others']
             enlistment_data = []
             
             for service in services:
                 try:
-                    target, modifiers, modifier_details = chargen.get_enlistment_requirements(service, current_character)
+                    target, modifiers, modifier_details = chargen.get_enlistment_requirements(service, g.current_character)
                     prob_data = chargen.calculate_success_probability(target, modifiers)
                     
                     enlistment_data.append({
@@ -631,13 +1331,13 @@ def api_career_probabilities():
             result["enlistment"] = sorted(enlistment_data, key=lambda x: x["raw_percentage"], reverse=True)
         
         # 2. SURVIVAL PROBABILITY (if character has career)
-        if current_character.get("career") and current_character.get("rdy_for_survival_check"):
+        if g.current_character.get("career") and g.current_character.get("rdy_for_survival_check"):
             try:
-                target, modifiers, modifier_details = chargen.get_survival_requirements(current_character)
+                target, modifiers, modifier_details = chargen.get_survival_requirements(g.current_character)
                 prob_data = chargen.calculate_success_probability(target, modifiers)
                 
                 result["survival"] = {
-                    "service": current_character["career"],
+                    "service": g.current_character["career"],
                     "percentage": f"{prob_data['percentage']:.0f}%",
                     "raw_percentage": prob_data["percentage"],
                     "target": target,
@@ -649,14 +1349,14 @@ def api_career_probabilities():
                 result["survival"] = {"applicable": False, "error": str(e)}
         
         # 3. COMMISSION PROBABILITY (if eligible)
-        if current_character.get("career") and current_character.get("rdy_for_commission_check"):
+        if g.current_character.get("career") and g.current_character.get("rdy_for_commission_check"):
             try:
-                target, modifiers, modifier_details = chargen.get_commission_requirements(current_character)
+                target, modifiers, modifier_details = chargen.get_commission_requirements(g.current_character)
                 if target is not None:  # Commission is possible
                     prob_data = chargen.calculate_success_probability(target, modifiers)
                     
                     result["commission"] = {
-                        "service": current_character["career"],
+                        "service": g.current_character["career"],
                         "percentage": f"{prob_data['percentage']:.0f}%",
                         "raw_percentage": prob_data["percentage"],
                         "target": target,
@@ -673,14 +1373,14 @@ def api_career_probabilities():
                 result["commission"] = {"applicable": False, "error": str(e)}
         
         # 4. PROMOTION PROBABILITY (if eligible)
-        if current_character.get("career") and current_character.get("rdy_for_promotion_check"):
+        if g.current_character.get("career") and g.current_character.get("rdy_for_promotion_check"):
             try:
-                target, modifiers, modifier_details = chargen.get_promotion_requirements(current_character)
+                target, modifiers, modifier_details = chargen.get_promotion_requirements(g.current_character)
                 if target is not None:  # Promotion is possible
                     prob_data = chargen.calculate_success_probability(target, modifiers)
                     
                     result["promotion"] = {
-                        "service": current_character["career"],
+                        "service": g.current_character["career"],
                         "percentage": f"{prob_data['percentage']:.0f}%",
                         "raw_percentage": prob_data["percentage"],
                         "target": target,
@@ -697,9 +1397,9 @@ def api_career_probabilities():
                 result["promotion"] = {"applicable": False, "error": str(e)}
         
         # 5. REENLISTMENT PROBABILITY (if eligible)
-        if current_character.get("career") and current_character.get("rdy_for_reenlistment"):
+        if g.current_character.get("career") and g.current_character.get("rdy_for_reenlistment"):
             try:
-                career = current_character.get("career")
+                career = g.current_character.get("career")
                 target = chargen.tables.REENLISTMENT_TARGETS[career]
                 modifiers = 0  # Classic Traveller has no reenlistment modifiers
                 prob_data = chargen.calculate_success_probability(target, modifiers)
@@ -722,7 +1422,7 @@ def api_career_probabilities():
         return jsonify({"success": False, "error": f"Career probabilities calculation failed: {str(e)}"}), 500
 
 # Keep the old endpoint for backward compatibility
-@app.route('/api/enlistment_probabilities', methods=['POST'])
+@api.route('/api/enlistment_probabilities', methods=['POST'])
 def api_enlistment_probabilities():
     """Legacy endpoint - redirects to new unified API"""
     response = api_career_probabilities()
@@ -747,24 +1447,21 @@ def api_enlistment_probabilities():
     
     return response
 
-@app.route('/api/dice_roll_report', methods=['POST'])
+@api.route('/api/dice_roll_report', methods=['POST'])
 def api_dice_roll_report():
-    global current_character
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
     
     try:
-        # Generate CSV file path
-        character_name = current_character.get('name', 'Unknown')
-        safe_name = re.sub(r'[^a-zA-Z0-9_-]', '_', character_name)
-        csv_filename = f'{safe_name}_dice_rolls.csv'
-        csv_path = f'characters/{csv_filename}'
+        # Generate CSV file path next to the character's archive file
+        csv_path = character_storage.strip_extension(get_character_json_path(g.current_character)) + '_dice_rolls.csv'
+        csv_filename = os.path.basename(csv_path)
         
-        # Ensure characters directory exists
-        os.makedirs('characters', exist_ok=True)
+        # Ensure the character's (shard) directory exists
+        os.makedirs(os.path.dirname(csv_path), exist_ok=True)
         
         # Generate and save CSV report
-        generate_dice_roll_csv(current_character, csv_path)
+        dice_report.write_report(g.current_character, csv_path)
         
         return jsonify({
             "success": True,
@@ -775,41 +1472,48 @@ def api_dice_roll_report():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/api/current_character', methods=['GET'])
+@api.route('/api/dice_roll_report', methods=['GET'])
+def api_dice_roll_report_download():
+    """Stream the current character's dice roll report as a CSV download (nothing is written to disk)"""
+    if not g.current_character:
+        return jsonify({"success": False, "error": "No character created yet"}), 400
+    filename = character_file_key(g.current_character) + character_storage.DICE_REPORT_SUFFIX
+    return Response(dice_report.iter_report(g.current_character), mimetype='text/csv',
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@api.route('/api/current_character', methods=['GET'])
 def api_current_character():
-    global current_character
-    print(f"DEBUG: Current character check - exists: {current_character is not None}")
-    if current_character:
-        print(f"DEBUG: Character name: {current_character.get('name', 'Unknown')}")
-        print(f"DEBUG: Terms served: {current_character.get('terms_served', 0)}")
-        print(f"DEBUG: Career history length: {len(current_character.get('career_history', []))}")
-        if current_character.get('career_history'):
-            print(f"DEBUG: Latest career entry: {current_character['career_history'][-1]}")
+    print(f"DEBUG: Current character check - exists: {g.current_character is not None}")
+    if g.current_character:
+        print(f"DEBUG: Character name: {g.current_character.get('name', 'Unknown')}")
+        print(f"DEBUG: Terms served: {g.current_character.get('terms_served', 0)}")
+        print(f"DEBUG: Career history length: {len(g.current_character.get('career_history', []))}")
+        if g.current_character.get('career_history'):
+            print(f"DEBUG: Latest career entry: {g.current_character['career_history'][-1]}")
     
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
     
     return jsonify({
         "success": True,
-        "character": add_calculated_fields(current_character.copy())
+        "character": add_calculated_fields(g.current_character.copy())
     })
 
-@app.route('/api/phase_info', methods=['GET'])
+@api.route('/api/phase_info', methods=['GET'])
 def api_phase_info():
     """
     Get current phase information for the character
     """
-    global current_character
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
     
     try:
-        term_num, phase_num, phase_name = chargen.get_current_phase_info(current_character)
-        current_phase = current_character.get("current_phase", "1.1")
-        phase_history = current_character.get("phase_history", [])
+        term_num, phase_num, phase_name = chargen.get_current_phase_info(g.current_character)
+        current_phase = g.current_character.get("current_phase", "1.1")
+        phase_history = g.current_character.get("phase_history", [])
         
         # Get service-specific phase information
-        service = current_character.get("career", "Unknown")
+        service = g.current_character.get("career", "Unknown")
         phase_sequence = chargen.get_phase_sequence_for_service(service) if service != "Unknown" else []
         
         return jsonify({
@@ -825,10 +1529,9 @@ def api_phase_info():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/api/action_probability', methods=['POST'])
+@api.route('/api/action_probability', methods=['POST'])
 def api_action_probability():
-    global current_character
-    if not current_character:
+    if not g.current_character:
         return jsonify({"success": False, "error": "No character created yet"}), 400
     
     data = request.get_json() or {}
@@ -839,27 +1542,27 @@ def api_action_probability():
     
     # DEBUG: Log character state
     print(f"[DEBUG] Action: {action_type}")
-    print(f"[DEBUG] Character commissioned: {current_character.get('commissioned')}")
-    print(f"[DEBUG] Character career: {current_character.get('career')}")
-    print(f"[DEBUG] Character rank: {current_character.get('rank')}")
+    print(f"[DEBUG] Character commissioned: {g.current_character.get('commissioned')}")
+    print(f"[DEBUG] Character career: {g.current_character.get('career')}")
+    print(f"[DEBUG] Character rank: {g.current_character.get('rank')}")
     
     try:
         if action_type == 'commission':
             # Use Python rules to get commission requirements
-            target, modifiers, modifier_details = chargen.get_commission_requirements(current_character)
+            target, modifiers, modifier_details = chargen.get_commission_requirements(g.current_character)
             # Debug commission eligibility
             print(f"[COMMISSION DEBUG] target={target}, details={modifier_details}")
-            print(f"[COMMISSION DEBUG] drafted={current_character.get('drafted')}, terms_served={current_character.get('terms_served')}")
-            print(f"[COMMISSION DEBUG] commissioned={current_character.get('commissioned')}, career={current_character.get('career')}")
+            print(f"[COMMISSION DEBUG] drafted={g.current_character.get('drafted')}, terms_served={g.current_character.get('terms_served')}")
+            print(f"[COMMISSION DEBUG] commissioned={g.current_character.get('commissioned')}, career={g.current_character.get('career')}")
         elif action_type == 'promotion':
             # Use Python rules to get promotion requirements  
-            target, modifiers, modifier_details = chargen.get_promotion_requirements(current_character)
+            target, modifiers, modifier_details = chargen.get_promotion_requirements(g.current_character)
         elif action_type == 'survival':
             # Use Python rules to get survival requirements
-            target, modifiers, modifier_details = chargen.get_survival_requirements(current_character)
+            target, modifiers, modifier_details = chargen.get_survival_requirements(g.current_character)
         elif action_type == 'reenlist':
             # Use Python rules to get reenlistment requirements
-            career = current_character.get('career')
+            career = g.current_character.get('career')
             if not career:
                 return jsonify({"success": False, "error": "Character has no career"}), 400
             target = chargen.tables.REENLISTMENT_TARGETS[career]
@@ -891,178 +1594,40 @@ def api_action_probability():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
-def generate_dice_roll_csv(character_record, csv_path):
-    """
-    Generate a CSV file containing all dice rolls made during character generation
-    """
-    career_history = character_record.get('career_history', [])
-    
-    # Track term-by-term progression
-    current_term = 0
-    roll_number = 0
-    
-    # Open CSV file for writing
-    with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = [
-            'Roll_Number',
-            'Character_Name', 
-            'Character_Seed',
-            'Term',
-            'Event_Type',
-            'Action_Description',
-            'Roll_Result',
-            'Target_Number',
-            'Modifier',
-            'Modifier_Details',
-            'Total_Roll',
-            'Success',
-            'Outcome',
-            'Career_At_Time'
-        ]
-        
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        # Write character summary row
-        writer.writerow({
-            'Roll_Number': 'SUMMARY',
-            'Character_Name': character_record.get('name', 'Unknown'),
-            'Character_Seed': character_record.get('seed', 77),
-            'Term': f"Final Age: {character_record.get('age', 18)}",
-            'Event_Type': f"Career: {character_record.get('career', 'Unknown')}",
-            'Action_Description': f"Terms Served: {character_record.get('terms_served', 0)}",
-            'Roll_Result': f"UPP: {character_record.get('upp', '______')}",
-            'Target_Number': '',
-            'Modifier': '',
-            'Modifier_Details': '',
-            'Total_Roll': '',
-            'Success': '',
-            'Outcome': '',
-            'Career_At_Time': ''
-        })
-        
-        for event in career_history:
-            event_type = event.get('event_type', '')
-            
-            # Track term progression
-            if event_type == 'enlistment_attempt':
-                current_term = 1
-            elif event_type == 'reenlistment_attempt' and event.get('continue_career', False):
-                current_term += 1
-            
-            # Process events that involve dice rolls
-            if 'roll' in event and event.get('roll') is not None:
-                roll_number += 1
-                roll_info = extract_roll_info_for_csv(event, current_term, character_record)
-                if roll_info:
-                    roll_info['Roll_Number'] = roll_number
-                    roll_info['Character_Name'] = character_record.get('name', 'Unknown')
-                    roll_info['Character_Seed'] = character_record.get('seed', 77)
-                    writer.writerow(roll_info)
-
-def extract_roll_info_for_csv(event, term_number, character_record):
-    """Extract dice roll information from a career history event for CSV format"""
-    event_type = event.get('event_type', '')
-    roll = event.get('roll')
-    target = event.get('target')
-    modifier = event.get('modifier', 0)
-    success = event.get('success', False)
-    
-    # Map event types to readable descriptions
-    event_descriptions = {
-        'enlistment_attempt': f"Enlistment ({event.get('service', 'Unknown')})",
-        'survival_check': f"Survival",
-        'commission_check': f"Commission",
-        'promotion_check': f"Promotion",
-        'reenlistment_attempt': f"Reenlistment",
-        'skill_resolution': f"Skill Roll",
-        'mustering_out_cash_roll': "Mustering Out (Cash)",
-        'mustering_out_benefit_roll': "Mustering Out (Benefit)",
-        'ageing_check_detail': f"Ageing Check ({event.get('stat', 'Unknown')})"
-    }
-    
-    description = event_descriptions.get(event_type, event_type.replace('_', ' ').title())
-    
-    # Build result description
-    if event_type == 'enlistment_attempt':
-        if success:
-            result = f"Enlisted in {event.get('assigned_service', 'Unknown')}"
-        else:
-            result = f"Drafted into {event.get('assigned_service', 'Unknown')}"
-    elif event_type == 'survival_check':
-        result = "Survived" if success else "Injured"
-    elif event_type == 'commission_check':
-        result = f"Commissioned (Rank {event.get('rank', 1)})" if success else "Commission denied"
-    elif event_type == 'promotion_check':
-        result = f"Promoted to Rank {event.get('rank', 0)}" if success else "Promotion denied"
-    elif event_type == 'reenlistment_attempt':
-        result = event.get('status_text', 'Unknown outcome')
-    elif event_type == 'skill_resolution':
-        result = f"Gained: {event.get('skill_gained', 'Unknown skill')}"
-    elif event_type == 'mustering_out_cash_roll':
-        result = f"Received Cr{event.get('amount', 0):,}"
-    elif event_type == 'mustering_out_benefit_roll':
-        result = f"Received: {event.get('benefit', 'Unknown benefit')}"
-    elif event_type == 'ageing_check_detail':
-        if event.get('loss', 0) > 0:
-            result = f"Lost {event.get('loss')} {event.get('stat', 'stat')} ({event.get('old_value')} → {event.get('new_value')})"
-        else:
-            result = f"No {event.get('stat', 'stat')} loss"
-    else:
-        result = event.get('outcome', 'Unknown outcome')
-    
-    # Format modifier details as a single string
-    modifier_details_str = '; '.join(event.get('modifier_details', []))
-    
-    return {
-        'Term': term_number if term_number > 0 else '',
-        'Event_Type': event_type,
-        'Action_Description': description,
-        'Roll_Result': roll,
-        'Target_Number': target if target is not None else '',
-        'Modifier': modifier,
-        'Modifier_Details': modifier_details_str,
-        'Total_Roll': roll + modifier if roll is not None and modifier is not None else '',
-        'Success': 'Yes' if success else 'No',
-        'Outcome': result,
-        'Career_At_Time': event.get('career', character_record.get('career', ''))
-    }
-
-@app.route('/api/set_seed', methods=['POST'])
+@api.route('/api/set_seed', methods=['POST'])
+@idempotent
 def api_set_seed():
-    global GLOBAL_SEED
     data = request.get_json()
     new_seed = data.get('seed')
     if new_seed is None:
         return jsonify({"success": False, "error": "Seed not provided"}), 400
     try:
-        GLOBAL_SEED = int(new_seed)
-        print(f"DEBUG: Seed changed to {GLOBAL_SEED}")
-        return jsonify({"success": True, "seed": GLOBAL_SEED})
+        g.global_seed = int(new_seed)
+        app_services().state_store.set("global_seed", g.global_seed)
+        print(f"DEBUG: Seed changed to {g.global_seed}")
+        return jsonify({"success": True, "seed": g.global_seed})
     except ValueError:
         return jsonify({"success": False, "error": "Seed must be a number"}), 400
 
-@app.route('/api/get_seed', methods=['GET'])
+@api.route('/api/get_seed', methods=['GET'])
 def api_get_seed():
-    global GLOBAL_SEED
-    return jsonify({"success": True, "seed": GLOBAL_SEED})
+    return jsonify({"success": True, "seed": g.global_seed})
 
-@app.route('/api/ui_config', methods=['GET'])
+@api.route('/api/ui_config', methods=['GET'])
 def api_ui_config():
     """
     Get UI configuration including characteristic quality thresholds
     """
-    try:
-        config = {
-            "characteristic_quality": chargen.get_characteristic_quality_thresholds(),
-            "defaults": chargen.get_game_defaults()
-        }
-        return jsonify({"success": True, "config": config})
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+    return static_json_response("ui_config")
 
-if __name__ == '__main__':
-    print(f"Classic Traveller Character Generator starting with seed: {GLOBAL_SEED}")
+def main():
+    parser = argparse.ArgumentParser(description='Classic Traveller Character Generator')
+    parser.add_argument('--seed', type=int, default=77, help='Random seed for character generation (default: 77)')
+    args = parser.parse_args()
+
+    # The command line seed wins over one left in the shared store by an earlier run
+    app = create_app(seed=args.seed)
+    print(f"Classic Traveller Character Generator starting with seed: {args.seed}")
     print("To use a different seed, run: python app.py --seed <number>")
     print("Example: python app.py --seed 42")
     print("Example: python app.py --seed 12345")
@@ -1070,3 +1635,6 @@ if __name__ == '__main__':
     print("-" * 50)
     # No character is loaded at startup, as we don't know the name
     app.run(host ="0.0.0.0", port=5000, debug=False)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Character Format Benchmark for Classic Traveller Character Generator
+
+Compares the compact binary format (character_binary) against compact JSON and
+gzip-compressed JSON for the same generated characters: bytes per character and
+encode/decode time, both for characters in play (with the random generator state)
+and for finished characters as bulk generation writes them (without it). It also
+measures what the process pool pays to pass one chunk of encoded characters from
+a worker to the parent (pickling the chunk there and back).
+
+Usage:
+    python benchmark_formats.py
+    python benchmark_formats.py --count 2000 --seed 7
+"""
+
+import argparse
+import json
+import pickle
+import time
+
+import bulk_generation
+import character_binary
+import character_generation_rules as chargen
+import character_storage
+
+FORMATS = {
+    "json": (lambda record: json.dumps(record, separators=(',', ':')).encode("utf-8"), json.loads),
+    "gzip": (lambda record: character_storage.encode_character(record, "gzip"), character_storage.decode_character),
+    "binary": (character_binary.encode, character_binary.decode)
+}
+
+def per_call_microseconds(function, items) -> tuple:
+    """Apply function to every item; returns (results, microseconds per item)"""
+    start = time.perf_counter()
+    results = [function(item) for item in items]
+    return results, (time.perf_counter() - start) / len(items) * 1e6
+
+def measure_formats(records: list) -> None:
+    print(f"{'Format':>8} {'Bytes':>8} {'Encode us':>10} {'Decode us':>10}")
+    for name, (encode, decode) in FORMATS.items():
+        encoded, encode_time = per_call_microseconds(encode, records)
+        decoded, decode_time = per_call_microseconds(decode, encoded)
+        size = sum(map(len, encoded)) / len(records)
+        print(f"{name:>8} {size:>8.0f} {encode_time:>10.0f} {decode_time:>10.0f}")
+        if name == "binary":
+            assert decoded == records, "binary round trip changed a record"
+
+def measure_transfer(records: list, chunk_size: int) -> None:
+    chunks = {
+        "json": [bulk_generation.encode_character(record) for record in records[:chunk_size]],
+        "binary": [character_binary.encode(record) for record in records[:chunk_size]]
+    }
+    print(f"{'Format':>8} {'Chunk bytes':>12} {'Pickle round trip ms':>21}")
+    for name, chunk in chunks.items():
+        start = time.perf_counter()
+        pickled = pickle.dumps(chunk)
+        pickle.loads(pickled)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{name:>8} {len(pickled):>12} {elapsed:>21.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Binary character format versus JSON')
+    parser.add_argument('--count', type=int, default=1000, help='Characters to generate')
+    parser.add_argument('--seed', type=int, default=45, help='Master seed')
+    options = parser.parse_args()
+
+    characters = [chargen.generate_complete_character(chargen.derive_seed(options.seed, index))
+                  for index in range(options.count)]
+    finished = [bulk_generation.project_character(character) for character in characters]
+
+    print(f"Characters: {options.count}")
+    print("\nIn play (with random generator state)")
+    measure_formats(characters)
+    print("\nFinished (as bulk generation writes them)")
+    measure_formats(finished)
+    print(f"\nProcess pool transfer of one {bulk_generation.JOB_CHUNK_SIZE}-character chunk")
+    measure_transfer(finished, bulk_generation.JOB_CHUNK_SIZE)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Worker Scaling Benchmark for Classic Traveller Character Generator
+
+Measures request throughput against the number of worker processes sharing one
+state store, the way a multi-worker WSGI server runs the app. Each worker imports
+the app and drives it through Flask's test client (no network), mostly reading the
+current character with an occasional seed write. Every worker also checks that it
+sees the character created by the parent process.
+
+Usage:
+    python benchmark_workers.py
+    python benchmark_workers.py --workers 1 2 4 8 --seconds 5
+    python benchmark_workers.py --storage-url redis://localhost:6379/0
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+# One write (seed change) per this many requests
+WRITE_EVERY = 10
+
+def create_app(storage_url: str, work_dir: str):
+    """Create the app configured for benchmarking (shared store, no rate limiting)"""
+    os.environ["STATE_STORAGE_URL"] = storage_url
+    os.environ["RATELIMIT_ENABLED"] = "false"
+    os.environ["DATA_DIR"] = os.path.join(work_dir, "data")
+    os.chdir(work_dir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app
+    return app.create_app()
+
+def run_worker(storage_url, work_dir, expected_name, start_event, seconds, results):
+    """Worker process: issue requests for the given time and report the count"""
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        client = create_app(storage_url, work_dir).test_client()
+        start_event.wait()
+        requests_done = 0
+        mismatches = 0
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            if requests_done % WRITE_EVERY == 0:
+                client.post('/api/set_seed', json={"seed": 77})
+            else:
+                character = client.get('/api/current_character').get_json().get("character") or {}
+                if character.get("name") != expected_name:
+                    mismatches += 1
+            requests_done += 1
+            # Discard debug output as we go so it does not pile up in memory
+            output.seek(0)
+            output.truncate()
+    results.put((requests_done, mismatches))
+
+def measure(storage_url: str, work_dir: str, expected_name: str, workers: int, seconds: float):
+    """Run the given number of workers in parallel; returns (requests/second, mismatches)"""
+    # Spawn (not fork) so every worker imports the app and opens its own store connection
+    context = multiprocessing.get_context("spawn")
+    start_event = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=run_worker,
+                                  args=(storage_url, work_dir, expected_name, start_event, seconds, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    # Give every worker time to import the app before the clock starts
+    time.sleep(2)
+    start_event.set()
+    counts = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    total_requests = sum(count for count, _ in counts)
+    return total_requests / seconds, sum(mismatches for _, mismatches in counts)
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput versus worker count with a shared state store')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help='Worker counts to measure')
+    parser.add_argument('--seconds', type=float, default=3.0, help='Measurement time per worker count')
+    parser.add_argument('--storage-url', help='STATE_STORAGE_URL to test (default: SQLite in a temporary directory)')
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        storage_url = options.storage_url or "sqlite:///" + os.path.join(work_dir, "state.db")
+        original_dir = os.getcwd()
+        with contextlib.redirect_stdout(io.StringIO()):
+            app = create_app(storage_url, work_dir)
+            character = app.test_client().post("/api/create_character").get_json()
+        os.chdir(original_dir)
+
+        print(f"State store: {storage_url}")
+        print(f"CPUs: {os.cpu_count()}  Requests: {100 - 100 // WRITE_EVERY}% reads, {100 // WRITE_EVERY}% writes")
+        print(f"{'Workers':>8} {'Requests/s':>12} {'Speedup':>8} {'Stale reads':>12}")
+        baseline = None
+        for workers in options.workers:
+            throughput, mismatches = measure(storage_url, work_dir, character["name"], workers, options.seconds)
+            baseline = baseline or throughput
+            print(f"{workers:>8} {throughput:>12.0f} {throughput / baseline:>7.2f}x {mismatches:>12}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Bulk Character Generation for Classic Traveller Character Generator
+
+This module generates many finished characters at once, either streamed line by line
+(for the NDJSON endpoint) or as background jobs that write their output to a file
+under the data directory.
+
+Background jobs run on a process pool. Each job is split into chunks of characters;
+chunks are generated in parallel but written to the result file in order, so the
+output of a job is identical to streaming the same count and seed. Workers send
+back each chunk already encoded in the job's format; in the binary format
+(character_binary, length-prefixed records) that is well under half the bytes of
+JSON to pass between processes, and the job writes the records as they arrive.
+
+Usage:
+    import bulk_generation
+
+    manager = bulk_generation.GenerationJobManager("data", max_concurrent_jobs=2)
+    job = manager.submit({"count": 10000, "seed": 42, "format": "ndjson"})
+    manager.get_status(job["id"])
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Iterator, List, Optional, Union
+
+import character_binary
+import character_generation_rules as chargen
+
+# Largest job accepted by the job queue
+JOB_MAX_COUNT = 10000000
+
+# Characters generated per process pool task
+JOB_CHUNK_SIZE = 500
+
+# Seconds a finished job, its status file and its result are kept after it ends
+JOB_RETENTION_SECONDS = 3600
+# Seconds between scans of the jobs directory for expired jobs of any process
+EXPIRY_SWEEP_SECONDS = 60
+
+JOB_FORMATS = {
+    "ndjson": {"extension": "ndjson", "mimetype": "application/x-ndjson"},
+    "json": {"extension": "json", "mimetype": "application/json"},
+    "binary": {"extension": "trvc", "mimetype": "application/octet-stream"}
+}
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# =============================================================================
+# CHARACTER GENERATION
+# =============================================================================
+
+def project_character(character_record: dict[str, Any], fields: Optional[List[str]] = None) -> dict[str, Any]:
+    """Keep only the requested top-level fields (everything but random_state if none given)"""
+    if not fields:
+        return {key: value for key, value in character_record.items() if key != "random_state"}
+    return {field: character_record.get(field) for field in fields}
+
+def encode_character(character_record: dict[str, Any], fields: Optional[List[str]] = None) -> str:
+    """Encode a (projected) character as one compact JSON line without the newline"""
+    return json.dumps(project_character(character_record, fields), separators=(',', ':'))
+
+def iter_character_lines(seed: int, start: int, stop: int, policy: Optional[dict[str, Any]] = None,
+                         fields: Optional[List[str]] = None) -> Iterator[str]:
+    """
+    Generate characters start..stop-1 for a master seed, yielding one JSON line each
+
+    Character i always uses derive_seed(seed, i), so any range can be generated
+    independently and in any process.
+    """
+    for index in range(start, stop):
+        character = chargen.generate_complete_character(chargen.derive_seed(seed, index), policy)
+        yield encode_character(character, fields)
+
+def generate_chunk(seed: int, start: int, stop: int, policy: Optional[dict[str, Any]] = None,
+                   fields: Optional[List[str]] = None, output_format: str = "ndjson") -> List[Union[str, bytes]]:
+    """Process pool task: generate one chunk of characters as JSON lines, or binary records"""
+    if output_format != "binary":
+        return list(iter_character_lines(seed, start, stop, policy, fields))
+    return [character_binary.encode(project_character(
+                chargen.generate_complete_character(chargen.derive_seed(seed, index), policy), fields))
+            for index in range(start, stop)]
+
+# =============================================================================
+# BACKGROUND JOBS
+# =============================================================================
+
+def normalize_job_spec(spec: Optional[dict[str, Any]], default_seed: int = 77) -> dict[str, Any]:
+    """
+    Validate a job spec and fill in defaults
+
+    Args:
+        spec: Job spec with count, seed, policy, format and fields
+        default_seed: Seed used when the spec does not give one
+
+    Returns:
+        Complete job spec
+
+    Raises:
+        ValueError: If any field is invalid
+    """
+    spec = spec or {}
+    try:
+        count = int(spec.get("count", 1))
+        seed = int(spec.get("seed", default_seed))
+    except (ValueError, TypeError):
+        raise ValueError("Count and seed must be numbers")
+    if not 1 <= count <= JOB_MAX_COUNT:
+        raise ValueError(f"Count must be between 1 and {JOB_MAX_COUNT}")
+
+    output_format = spec.get("format", "ndjson")
+    if output_format not in JOB_FORMATS:
+        raise ValueError(f"Format must be one of: {', '.join(JOB_FORMATS)}")
+
+    fields = spec.get("fields")
+    if fields is not None and (not isinstance(fields, list) or not all(isinstance(f, str) for f in fields)):
+        raise ValueError("Fields must be a list of field names")
+
+    return {
+        "count": count,
+        "seed": seed,
+        "policy": chargen.normalize_autoplay_policy(spec.get("policy")),
+        "format": output_format,
+        "fields": fields
+    }
+
+class GenerationJobManager:
+    """
+    Runs bulk generation jobs in the background on a shared process pool
+
+    At most max_concurrent_jobs run at once, each on a thread of a fixed pool; further
+    jobs wait in the "queued" state. Job status is also written to
+    <data_dir>/jobs/<id>.status.json after every chunk, and a cancel request is a
+    <id>.cancel marker file, so other server processes can read progress and cancel
+    jobs they did not start. A job that does not complete leaves no partial result
+    behind, and the marker is removed when the job ends. retention_seconds after a
+    job ends it is forgotten and its status file and result are deleted, whichever
+    process ran it.
+    """
+
+    FINAL_STATUSES = ("completed", "cancelled", "failed")
+
+    def __init__(self, data_dir: str, max_concurrent_jobs: int = 2, max_workers: Optional[int] = None,
+                 chunk_size: int = JOB_CHUNK_SIZE, executor_factory=None, on_update=None,
+                 retention_seconds: float = JOB_RETENTION_SECONDS):
+        self.jobs_dir = os.path.join(data_dir, "jobs")
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.retention_seconds = retention_seconds
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.chunk_size = chunk_size
+        # Tests can pass a stand-in (e.g. a thread pool) instead of a process pool
+        self._executor_factory = executor_factory or (lambda: ProcessPoolExecutor(max_workers=self.max_workers))
+        self._executor = None
+        # Called with a status snapshot (including throughput/ETA) after every change
+        self._on_update = on_update
+        self._jobs = {}
+        self._lock = threading.Lock()
+        # Queued jobs wait in this pool's queue; it starts its threads as jobs arrive
+        self._runner = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="generation-job")
+        self._next_sweep = 0
+
+    def _get_executor(self):
+        # Created on first use so importing the app never spawns worker processes
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._executor_factory()
+            return self._executor
+
+    def _path(self, job_id: str, suffix: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}{suffix}")
+
+    def result_path(self, job_id: str, output_format: str) -> str:
+        return self._path(job_id, "." + JOB_FORMATS[output_format]["extension"])
+
+    def submit(self, spec: Optional[dict[str, Any]], default_seed: int = 77) -> dict[str, Any]:
+        """
+        Queue a new generation job
+
+        Returns:
+            The job's initial status
+
+        Raises:
+            ValueError: If the job spec is invalid
+        """
+        spec = normalize_job_spec(spec, default_seed)
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+        self._expire_jobs()
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "spec": spec,
+            "total": spec["count"],
+            "completed": 0,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result_path": None,
+            "error": None
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+        self._write_status(job)
+
+        self._runner.submit(self._run_job, job_id)
+        return self.get_status(job_id)
+
+    def get_status(self, job_id: str) -> Optional[dict[str, Any]]:
+        """Get a job's status with throughput and ETA, or None if the job is unknown"""
+        if not JOB_ID_PATTERN.match(job_id or ""):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            job = dict(job) if job else None
+        if job is None:
+            # Job may belong to another server process
+            try:
+                with open(self._path(job_id, ".status.json"), 'r') as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                return None
+        return add_progress_fields(job)
+
+    def list_jobs(self) -> List[dict[str, Any]]:
+        """Get the status of every job started by this process, newest first"""
+        self._expire_jobs()
+        with self._lock:
+            job_ids = list(self._jobs)
+        statuses = [self.get_status(job_id) for job_id in job_ids]
+        return sorted(statuses, key=lambda job: job["created_at"], reverse=True)
+
+    def cancel(self, job_id: str) -> Optional[dict[str, Any]]:
+        """Request cancellation; the job stops after its current chunk"""
+        status = self.get_status(job_id)
+        if status is None:
+            return None
+        if status["status"] in ("queued", "running"):
+            with open(self._path(job_id, ".cancel"), 'w') as f:
+                f.write(str(time.time()))
+            with self._lock:
+                if job_id in self._jobs and self._jobs[job_id]["status"] == "queued":
+                    self._jobs[job_id]["status"] = "cancelling"
+        return self.get_status(job_id)
+
+    def _expire_jobs(self) -> None:
+        """Forget jobs that finished more than retention_seconds ago and delete their files"""
+        now = time.time()
+        cutoff = now - self.retention_seconds
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job["status"] in self.FINAL_STATUSES and job["finished_at"] is not None
+                       and job["finished_at"] <= cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+            sweep = now >= self._next_sweep
+            if sweep:
+                self._next_sweep = now + EXPIRY_SWEEP_SECONDS
+        if sweep:
+            # Jobs run by other (or since restarted) server processes expire too
+            expired += self._expired_on_disk(cutoff)
+        for job_id in expired:
+            self._remove_files(*[self._path(job_id, suffix) for suffix in self._job_file_suffixes()])
+
+    def _expired_on_disk(self, cutoff: float) -> List[str]:
+        expired = []
+        try:
+            names = os.listdir(self.jobs_dir)
+        except FileNotFoundError:
+            return expired
+        for name in names:
+            job_id = name[:-len(".status.json")]
+            if not name.endswith(".status.json") or not JOB_ID_PATTERN.match(job_id):
+                continue
+            try:
+                with open(os.path.join(self.jobs_dir, name), 'r') as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if job.get("status") in self.FINAL_STATUSES and job.get("finished_at") is not None and job["finished_at"] <= cutoff:
+                expired.append(job_id)
+        return expired
+
+    @staticmethod
+    def _job_file_suffixes() -> List[str]:
+        # The status file last: while it exists the job still looks current
+        return ["." + output_format["extension"] for output_format in JOB_FORMATS.values()] + [".status.json"]
+
+    def _remove_files(self, *paths: str) -> None:
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        return os.path.exists(self._path(job_id, ".cancel"))
+
+    def _update(self, job_id: str, **changes) -> dict[str, Any]:
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(changes)
+            snapshot = dict(job)
+        self._write_status(snapshot)
+        if self._on_update:
+            self._on_update(add_progress_fields(dict(snapshot)))
+        return snapshot
+
+    def _write_status(self, job: dict[str, Any]) -> None:
+        status_path = self._path(job["id"], ".status.json")
+        tmp_path = status_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, status_path)
+
+    def _run_job(self, job_id: str) -> None:
+        if self._cancel_requested(job_id):
+            self._remove_files(self._path(job_id, ".cancel"))
+            self._update(job_id, status="cancelled", finished_at=time.time())
+            return
+
+        job = self._update(job_id, status="running", started_at=time.time())
+        spec = job["spec"]
+        result_path = self.result_path(job_id, spec["format"])
+        part_path = result_path + ".part"
+        completed = 0
+        error = None
+        try:
+            completed = self._generate_to_file(job_id, spec, part_path)
+            if completed == spec["count"]:
+                os.replace(part_path, result_path)
+        except Exception as e:
+            error = str(e)
+        finally:
+            # Cleaned up before the final status is published: an unfinished result and the cancel marker
+            self._remove_files(part_path, self._path(job_id, ".cancel"))
+
+        if error is not None:
+            self._update(job_id, status="failed", error=error, finished_at=time.time())
+        elif completed < spec["count"]:
+            self._update(job_id, status="cancelled", finished_at=time.time())
+        else:
+            self._update(job_id, status="completed", result_path=result_path, finished_at=time.time())
+
+    def _generate_to_file(self, job_id: str, spec: dict[str, Any], path: str) -> int:
+        """Generate the job's characters into path in order; returns how many were written"""
+        executor = self._get_executor()
+        total = spec["count"]
+        json_array = spec["format"] == "json"
+        binary = spec["format"] == "binary"
+        pending = deque()
+        next_start = 0
+        completed = 0
+
+        with (open(path, 'wb') if binary else open(path, 'w', encoding='utf-8')) as out:
+            if json_array:
+                out.write("[\n")
+            while next_start < total or pending:
+                # Keep a bounded number of chunks in flight so memory stays flat
+                while next_start < total and len(pending) < self.max_workers * 2:
+                    stop = min(total, next_start + self.chunk_size)
+                    pending.append(executor.submit(generate_chunk, spec["seed"], next_start, stop,
+                                                   spec["policy"], spec["fields"], spec["format"]))
+                    next_start = stop
+
+                lines = pending.popleft().result()
+                if binary:
+                    for record in lines:
+                        character_binary.write_record(out, record)
+                elif json_array:
+                    out.write(",\n".join(lines) if completed == 0 else ",\n" + ",\n".join(lines))
+                else:
+                    out.write("\n".join(lines) + "\n")
+                completed += len(lines)
+                self._update(job_id, completed=completed)
+
+                # A cancel that arrives after the last chunk is too late: the result is finished
+                if completed < total and self._cancel_requested(job_id):
+                    for future in pending:
+                        future.cancel()
+                    return completed
+            if json_array:
+                out.write("\n]\n")
+        return completed
+
+def add_progress_fields(job: dict[str, Any]) -> dict[str, Any]:
+    """Add throughput (characters/second) and ETA (seconds) to a job status"""
+    throughput = None
+    eta = None
+    if job.get("started_at"):
+        elapsed = (job.get("finished_at") or time.time()) - job["started_at"]
+        if elapsed > 0 and job["completed"]:
+            throughput = round(job["completed"] / elapsed, 1)
+            if job["status"] == "running":
+                eta = round((job["total"] - job["completed"]) / throughput, 1)
+    job["throughput"] = throughput
+    job["eta_seconds"] = eta
+    return job
@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+"""
+Character Archive Manifest for Classic Traveller Character Generator
+
+Every saved character is a JSON file in the characters directory. Listing or
+searching them used to mean opening every file, so this module keeps a compact
+manifest next to them: one row per character with the fields the archive views
+need (ID, name, seed, career, rank, terms, age, UPP, cash, benefits, status,
+skills, mtime, and where the character is stored: path, plus offset and
+length for characters packed into a bundle by character_storage).
+
+The manifest file (manifest.ndjson) starts with a header line naming the fields,
+followed by one JSON array per row. Saves append a row; the last row for an ID
+wins. Each server process keeps the rows in memory and reads only the lines
+appended since its last look, so browsing the archive never touches the
+character files. When superseded rows outnumber live ones the file is compacted,
+and rebuild() re-creates it from the character files using a process pool.
+Rows also feed a skill_index.SkillIndex and leaderboards.Leaderboards, so skill
+queries and top-K lists never scan rows.
+
+Usage:
+    import character_archive
+
+    manifest = character_archive.ArchiveManifest("characters")
+    manifest.record(character_record, "characters/0000000001.json.gz")
+    page = manifest.query({"career": "Navy", "min_terms": 3}, limit=50)
+    page = manifest.query({}, skills=skill_index.parse_skill_query("Pilot-2 AND Navigation"))
+    manifest.leaderboard("cash", career="Navy", limit=10)
+
+    python character_archive.py rebuild [characters_dir]
+"""
+
+import bisect
+import json
+import os
+import sys
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends and compaction are not locked between processes
+    fcntl = None
+
+import character_ids
+import character_schema
+import character_storage
+import character_upgrades
+import leaderboards
+import skill_index
+
+MANIFEST_NAME = "manifest.ndjson"
+
+MANIFEST_FIELDS = ["id", "name", "seed", "career", "rank", "terms", "age", "upp",
+                   "cash", "benefits", "status", "skills", "mtime", "path",
+                   "offset", "length"]
+SKILLS_FIELD = MANIFEST_FIELDS.index("skills")
+LOCATION_FIELDS = tuple(MANIFEST_FIELDS.index(field) for field in ("path", "offset", "length"))
+
+# Default and largest page size for queries
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Query totals remembered until the rows next change
+MAX_CACHED_TOTALS = 256
+
+# Compact once the file holds this many rows more than there are characters
+COMPACT_MIN_SUPERSEDED = 1000
+
+# Bytes of appended rows read and applied at a time
+REFRESH_CHUNK_BYTES = 8 * 1024 * 1024
+# More new IDs than this are merged into the sorted ID list in one sort
+BULK_INSERT_MIN = 64
+
+# Query parameter -> (row field, comparison)
+RANGE_FILTERS = {
+    "min_terms": ("terms", "min"), "max_terms": ("terms", "max"),
+    "min_rank": ("rank", "min"), "max_rank": ("rank", "max"),
+    "min_age": ("age", "min"), "max_age": ("age", "max"),
+    "min_cash": ("cash", "min"), "max_cash": ("cash", "max")
+}
+TEXT_FILTERS = ("career", "status", "name")
+
+# =============================================================================
+# MANIFEST ROWS
+# =============================================================================
+
+def manifest_row(character_record: dict[str, Any], path: str, mtime: Optional[float] = None,
+                 offset: Optional[int] = None, length: Optional[int] = None) -> dict[str, Any]:
+    """Summarize a character record as a manifest row"""
+    benefits = character_record.get("mustering_out_benefits") or {}
+    character_id = character_record.get("character_id") or os.path.basename(character_storage.strip_extension(path))
+    return {
+        "id": character_id,
+        "name": character_record.get("name"),
+        "seed": character_record.get("seed"),
+        "career": character_record.get("career"),
+        "rank": character_record.get("rank") or 0,
+        "terms": character_record.get("terms_served", 0),
+        "age": character_record.get("age"),
+        "upp": character_record.get("upp"),
+        "cash": benefits.get("cash", 0),
+        "benefits": len(benefits.get("benefit_roll_details", [])),
+        "status": "complete" if benefits else "active",
+        "skills": dict(character_record.get("skills") or {}),
+        "mtime": round(os.path.getmtime(path) if mtime is None else mtime, 3),
+        "path": path,
+        "offset": offset,
+        "length": length
+    }
+
+def rows_for_files(paths: List[str]) -> List[dict[str, Any]]:
+    """Process pool task: read character files and return their manifest rows"""
+    rows = []
+    for path in paths:
+        try:
+            character_record = character_storage.read_character(path)
+        except (OSError, ValueError):
+            continue
+        if isinstance(character_record, dict) and character_record.get("name"):
+            rows.append(manifest_row(character_record, path))
+    return rows
+
+def rows_for_bundle(path: str) -> List[dict[str, Any]]:
+    """Process pool task: read every character in a bundle and return their manifest rows"""
+    try:
+        mtime = os.path.getmtime(path)
+        index = character_storage.read_bundle_index(path)
+        with open(path, 'rb') as f:
+            data = memoryview(f.read())
+    except (OSError, ValueError):
+        return []
+    rows = []
+    for character_id, (offset, length) in index.items():
+        try:
+            character_record = character_storage.decode_character(data[offset:offset + length])
+        except (ValueError, zlib.error):
+            continue
+        row = manifest_row(character_record, path, mtime, offset, length)
+        # Records saved before character IDs are keyed by the ID they were bundled under
+        row["id"] = character_id
+        rows.append(row)
+    return rows
+
+def rows_for_task(task: tuple) -> List[dict[str, Any]]:
+    """Process pool task: ("bundle", path) or ("files", paths)"""
+    kind, target = task
+    return rows_for_bundle(target) if kind == "bundle" else rows_for_files(target)
+
+def parse_filters(args: dict[str, Any]) -> dict[str, Any]:
+    """
+    Validate query filters (e.g. request.args) for ArchiveManifest.query
+
+    Raises:
+        ValueError: If a range filter is not a number
+    """
+    filters = {}
+    for name in TEXT_FILTERS:
+        if args.get(name):
+            filters[name] = str(args[name])
+    for name in RANGE_FILTERS:
+        if args.get(name) not in (None, ""):
+            try:
+                filters[name] = int(args[name])
+            except (ValueError, TypeError):
+                raise ValueError(f"{name} must be a whole number")
+    return filters
+
+def parse_page(args: dict[str, Any]) -> tuple:
+    """
+    Validate pagination parameters: returns (limit, after)
+
+    Raises:
+        ValueError: If limit is not a number between 1 and MAX_PAGE_SIZE
+    """
+    try:
+        limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+    except (ValueError, TypeError):
+        raise ValueError("limit must be a whole number")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit, args.get("after") or None
+
+# =============================================================================
+# MANIFEST
+# =============================================================================
+
+class ArchiveManifest:
+    """In-memory view of the manifest file, kept current by reading appended lines"""
+
+    def __init__(self, characters_dir: str = "characters",
+                 cache: Optional[character_storage.CharacterCache] = None):
+        self.characters_dir = characters_dir
+        self.cache = cache
+        self.path = os.path.join(characters_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._reset()
+
+    # Reading ---------------------------------------------------------------
+
+    def refresh(self) -> None:
+        """Pick up rows appended by this or other processes since the last read"""
+        with self._lock:
+            self._refresh_locked()
+
+    def _refresh_locked(self) -> None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._reset()
+            return
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != self._file_id or stat.st_size < self._offset:
+            # Compacted or rebuilt by someone: start over
+            self._reset()
+            self._file_id = file_id
+        if stat.st_size == self._offset:
+            return
+        with open(self.path, 'rb') as f:
+            while True:
+                f.seek(self._offset)
+                data = f.read(REFRESH_CHUNK_BYTES)
+                # Only consume complete lines; a concurrent append may be half written
+                end = data.rfind(b"\n") + 1
+                if not end:
+                    return
+                self._apply_lines(data[:end].splitlines())
+                self._offset += end
+                if len(data) < REFRESH_CHUNK_BYTES:
+                    return
+
+    def _reset(self) -> None:
+        self._rows = {}        # id -> row tuple in MANIFEST_FIELDS order
+        self._ids = []         # sorted ids, for keyset pagination
+        self._lines = 0        # rows in the file, including superseded ones
+        self._file_id = None   # (device, inode) of the file we have read
+        self._offset = 0       # bytes of the file already read
+        self._fields = None    # field names from the file's header line
+        self.skill_index = skill_index.SkillIndex()
+        self.leaderboards = leaderboards.Leaderboards()
+        self._totals = {}      # (filters, skill query) -> rows matching, while the rows are unchanged
+
+    def _apply_lines(self, lines) -> None:
+        rows = []
+        for line in lines:
+            if not line.strip():
+                continue
+            value = json.loads(line)
+            if isinstance(value, dict) and "fields" in value:
+                self._fields = value["fields"]
+                continue
+            row = dict(zip(self._fields or MANIFEST_FIELDS, value))
+            rows.append(tuple(row.get(field) for field in MANIFEST_FIELDS))
+            self._lines += 1
+        if rows:
+            self._put_many(rows)
+
+    def _put_many(self, rows: List[tuple]) -> None:
+        self._totals = {}
+        new_ids = []
+        for row in rows:
+            if row[0] not in self._rows:
+                new_ids.append(row[0])
+            self._rows[row[0]] = row
+        if len(new_ids) <= BULK_INSERT_MIN:
+            for character_id in new_ids:
+                bisect.insort(self._ids, character_id)
+        else:
+            # One merge instead of an insertion per row (sort is linear on two sorted runs)
+            new_ids.sort()
+            self._ids.extend(new_ids)
+            self._ids.sort()
+        self.skill_index.update_many((row[0], row[SKILLS_FIELD]) for row in rows)
+        for row in rows:
+            self.leaderboards.update(dict(zip(MANIFEST_FIELDS, row)))
+
+    def is_current(self) -> bool:
+        """False if the manifest is missing or was written with a different field list"""
+        with self._lock:
+            self._refresh_locked()
+            return self._fields == MANIFEST_FIELDS
+
+    def get(self, character_id: str) -> Optional[dict[str, Any]]:
+        """Get one character's manifest row"""
+        with self._lock:
+            self._refresh_locked()
+            row = self._rows.get(character_id)
+        return dict(zip(MANIFEST_FIELDS, row)) if row else None
+
+    def get_many(self, character_ids) -> dict[str, dict[str, Any]]:
+        """Manifest rows for those of the given IDs that are in the archive"""
+        with self._lock:
+            self._refresh_locked()
+            rows = [self._rows.get(character_id) for character_id in character_ids]
+        return {row[0]: dict(zip(MANIFEST_FIELDS, row)) for row in rows if row}
+
+    def load(self, character_id: str) -> Optional[dict[str, Any]]:
+        """
+        Read a character's full record from wherever the manifest says it is stored,
+        upgraded to the current schema version. With a cache the record is shared with other callers: copy it before modifying.
+
+        Raises:
+            character_schema.RecordValidationError: If the stored record does not match the schema
+        """
+        row = self.get(character_id)
+        if row is None:
+            return None
+        try:
+            if self.cache:
+                return self.cache.get(row["path"], row["offset"], row["length"])
+            return character_schema.check_record(character_upgrades.upgrade(
+                character_storage.read_character(row["path"], row["offset"], row["length"])))
+        except character_schema.RecordValidationError:
+            raise
+        except (OSError, ValueError):
+            return None
+
+    def max_character_id(self) -> int:
+        """Largest numeric character ID in the archive (0 if there is none)"""
+        with self._lock:
+            self._refresh_locked()
+            return max((int(character_id) for character_id in self._ids
+                        if character_ids.is_character_id(character_id)), default=0)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh_locked()
+            return len(self._rows)
+
+    def query(self, filters: Optional[dict[str, Any]] = None, limit: int = DEFAULT_PAGE_SIZE,
+              after: Optional[str] = None, skills: Optional[list] = None) -> dict[str, Any]:
+        """
+        Filter the archive and return one page, ordered by character ID
+
+        Args:
+            filters: Parsed filters (see parse_filters)
+            limit: Rows per page
+            after: Cursor from the previous page (the last ID it returned)
+            skills: Parsed skill query (see skill_index.parse_skill_query); only
+                characters it matches are considered
+
+        Returns:
+            Dictionary with characters (rows), next_cursor (None on the last page)
+            and total (rows matching the filters)
+        """
+        predicate = self._compile_filters(filters or {})
+        total_key = (tuple(sorted((filters or {}).items())), repr(skills))
+        page = []
+        has_more = False
+        with self._lock:
+            self._refresh_locked()
+            ids, rows = self._ids, self._rows
+            if skills is not None:
+                ids = self.skill_index.matching_ids(self.skill_index.match(skills))
+            # A page reads from the cursor until it has one row more than it returns
+            for index in range(bisect.bisect_right(ids, after) if after else 0, len(ids)):
+                row = rows[ids[index]]
+                if not predicate(row):
+                    continue
+                if len(page) == limit:
+                    has_more = True
+                    break
+                page.append(row)
+            # Counting every match is only needed once per query until the rows change
+            total = self._totals.get(total_key)
+            if total is None:
+                total = sum(1 for character_id in ids if predicate(rows[character_id]))
+                if len(self._totals) >= MAX_CACHED_TOTALS:
+                    self._totals.clear()
+                self._totals[total_key] = total
+        return {
+            "characters": [dict(zip(MANIFEST_FIELDS, row)) for row in page],
+            "next_cursor": page[-1][0] if has_more else None,
+            "total": total
+        }
+
+    def locations(self, filters: Optional[dict[str, Any]] = None,
+                  skills: Optional[list] = None) -> List[tuple]:
+        """
+        Where every character matching the filters (and skill query) is stored, in ID
+        order, for exports that read them all
+
+        Returns:
+            (id, path, offset, length) for each character
+        """
+        predicate = self._compile_filters(filters or {})
+        with self._lock:
+            self._refresh_locked()
+            ids, rows = self._ids, self._rows
+            if skills is not None:
+                ids = self.skill_index.matching_ids(self.skill_index.match(skills))
+            matching = [rows[character_id] for character_id in ids]
+        path, offset, length = LOCATION_FIELDS
+        return [(row[0], row[path], row[offset], row[length]) for row in matching if predicate(row)]
+
+    def leaderboard(self, metric: str, career: Optional[str] = None, limit: int = 10) -> List[dict[str, Any]]:
+        """
+        Top finished characters for a metric, overall or within one service
+
+        Returns:
+            Manifest rows, best first, each with the ranked value added as "value"
+
+        Raises:
+            ValueError: If metric is unknown
+        """
+        with self._lock:
+            self._refresh_locked()
+            entries = self.leaderboards.top(metric, career, limit)
+            rows = [(self._rows[character_id], value) for character_id, value in entries]
+        return [dict(zip(MANIFEST_FIELDS, row), value=value) for row, value in rows]
+
+    @staticmethod
+    def _compile_filters(filters: dict[str, Any]):
+        """Turn filters into one predicate over row tuples"""
+        checks = []
+        for name, value in filters.items():
+            if name in RANGE_FILTERS:
+                field, bound = RANGE_FILTERS[name]
+                index = MANIFEST_FIELDS.index(field)
+                if bound == "min":
+                    checks.append(lambda row, i=index, v=value: row[i] is not None and row[i] >= v)
+                else:
+                    checks.append(lambda row, i=index, v=value: row[i] is not None and row[i] <= v)
+            elif name == "name":
+                index = MANIFEST_FIELDS.index("name")
+                needle = value.lower()
+                checks.append(lambda row, i=index, v=needle: v in (row[i] or "").lower())
+            elif name in TEXT_FILTERS:
+                index = MANIFEST_FIELDS.index(name)
+                expected = value.lower()
+                checks.append(lambda row, i=index, v=expected: (row[i] or "").lower() == v)
+        return lambda row: all(check(row) for check in checks)
+
+    # Writing ---------------------------------------------------------------
+
+    def record(self, character_record: dict[str, Any], path: str) -> dict[str, Any]:
+        """Add or replace a character's row after its file was written"""
+        row = manifest_row(character_record, path)
+        self.record_rows([row])
+        return row
+
+    def record_rows(self, rows: List[dict[str, Any]]) -> None:
+        """Add or replace many rows with a single append (bulk import writes a batch at a time)"""
+        lines = "".join(json.dumps([row[field] for field in MANIFEST_FIELDS], separators=(',', ':')) + "\n"
+                        for row in rows)
+        with self._lock:
+            self._append(lines)
+            self._refresh_locked()
+            if self._lines - len(self._rows) >= max(COMPACT_MIN_SUPERSEDED, len(self._rows)):
+                self._compact_locked()
+
+    def _header(self) -> str:
+        return json.dumps({"fields": MANIFEST_FIELDS}) + "\n"
+
+    def _append(self, line: str) -> None:
+        os.makedirs(self.characters_dir, exist_ok=True)
+        while True:
+            with open(self.path, 'a') as f:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    # The file may have been compacted (replaced) while we waited for the lock
+                    try:
+                        if os.fstat(f.fileno()).st_ino != os.stat(self.path).st_ino:
+                            continue
+                    except FileNotFoundError:
+                        continue
+                if f.tell() == 0:
+                    f.write(self._header())
+                f.write(line)
+                return
+
+    def _write_rows(self, rows) -> None:
+        """Atomically replace the manifest file with the given rows"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self._header())
+            for row in rows:
+                f.write(json.dumps(list(row), separators=(',', ':')) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _compact_locked(self) -> None:
+        if fcntl is None:
+            self._write_rows(self._rows[character_id] for character_id in self._ids)
+            return
+        with open(self.path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            # Read anything appended since the last refresh before rewriting
+            self._refresh_locked()
+            self._write_rows(self._rows[character_id] for character_id in self._ids)
+        self._reset()
+        self._refresh_locked()
+
+    def rebuild(self, max_workers: Optional[int] = None, chunk_size: int = 500) -> int:
+        """
+        Re-create the manifest from the character files and bundles using a process pool
+
+        Returns:
+            Number of characters in the new manifest
+        """
+        # Rows appended while the files are being read are newer than the files we read
+        try:
+            stat = os.stat(self.path)
+            start_file_id, start_offset = (stat.st_dev, stat.st_ino), stat.st_size
+        except FileNotFoundError:
+            start_file_id, start_offset = None, 0
+
+        # Bundles first, oldest first, then single files: a character saved after it
+        # was bundled has its newer copy in its own file
+        bundles, paths = character_storage.list_archive(self.characters_dir)
+        tasks = [("bundle", path) for path in bundles]
+        tasks += [("files", paths[start:start + chunk_size]) for start in range(0, len(paths), chunk_size)]
+        rows = {}
+        if tasks:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                for chunk_rows in executor.map(rows_for_task, tasks):
+                    for row in chunk_rows:
+                        rows[row["id"]] = tuple(row[field] for field in MANIFEST_FIELDS)
+
+        os.makedirs(self.characters_dir, exist_ok=True)
+        with self._lock, open(self.path, 'a+b') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            stat = os.fstat(f.fileno())
+            if (stat.st_dev, stat.st_ino) == start_file_id:
+                f.seek(start_offset)
+                newer = ArchiveManifest(self.characters_dir)
+                newer._fields = MANIFEST_FIELDS
+                newer._apply_lines(f.read().splitlines())
+                rows.update(newer._rows)
+            self._write_rows(rows[character_id] for character_id in sorted(rows))
+            self._reset()
+            self._refresh_locked()
+        return len(rows)
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Usage: python character_archive.py rebuild [characters_dir]")
+        sys.exit(1)
+    manifest = ArchiveManifest(sys.argv[2] if len(sys.argv) > 2 else "characters")
+    count = manifest.rebuild()
+    print(f"Rebuilt {manifest.path} with {count} characters")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Compact Binary Character Format for Classic Traveller Character Generator
+
+JSON repeats every key and event type in every record and spells out each of the
+625 words of the random generator state in decimal. This module encodes a
+character record in a versioned binary form built with struct and array:
+
+    header | string table | event table | record
+
+    header       = MAGIC, version (uint8), string count, event count,
+                   event table length in bytes (uint32 each)
+    string table = every distinct string (keys, event types, skill names,
+                   outcomes...), each as a varint length and UTF-8 bytes;
+                   values refer to strings by index, so each is stored once
+    event table  = the career_history events, one tagged value each
+    record       = the record itself as a tagged value; career_history is an
+                   EVENTS marker in its place, so key order is kept
+
+A tagged value is one tag byte followed by its payload: integers as varints,
+floats as 8-byte doubles, lists and dicts as a varint count and their items.
+Lists and tuples of at least ARRAY_MIN_LENGTH integers that fit in 32 bits (the
+generator state) are stored as a packed little-endian uint32 array. Decoding
+returns a record equal to the one encoded, tuples included, and rejects corrupt
+data, including values nested more than MAX_DEPTH lists or dicts deep, with
+ValueError.
+
+Records can also be written as a stream, each prefixed with its length, which is
+how background generation jobs in binary format store their result.
+
+Usage:
+    import character_binary
+
+    data = character_binary.encode(character_record)
+    character_binary.decode(data) == character_record        # True
+    character_binary.read_events(data)                       # career_history only
+
+    with open("characters.trvc", "wb") as f:
+        character_binary.write_record(f, data)
+    with open("characters.trvc", "rb") as f:
+        characters = [character_binary.decode(d) for d in character_binary.iter_records(f)]
+"""
+
+import struct
+import sys
+from array import array
+from typing import Any, BinaryIO, Iterator, List
+
+MAGIC = b"TRVC"
+VERSION = 1
+
+# MAGIC, version, string count, event count, event table length in bytes
+HEADER = struct.Struct("<4sBIII")
+# Length prefix of each record in a stream
+RECORD_LENGTH = struct.Struct("<I")
+FLOAT = struct.Struct("<d")
+
+# The append-only list stored in the event table
+EVENTS_FIELD = "career_history"
+
+# Integer lists at least this long are packed as uint32 arrays when every item fits
+ARRAY_MIN_LENGTH = 16
+UINT32_MAX = 0xFFFFFFFF
+UINT32_TYPECODE = next(code for code in "ILH" if array(code).itemsize == 4)
+
+# Deepest nesting of lists and dicts decoded (records nest a few levels; crafted
+# data nested deeper would otherwise exhaust the interpreter's recursion limit)
+MAX_DEPTH = 64
+
+# Value tags
+(TAG_NONE, TAG_FALSE, TAG_TRUE, TAG_INT, TAG_NEG_INT, TAG_FLOAT, TAG_STRING,
+ TAG_LIST, TAG_TUPLE, TAG_DICT, TAG_UINT32_LIST, TAG_UINT32_TUPLE, TAG_EVENTS) = range(13)
+
+def _write_uint(out: bytearray, value: int) -> None:
+    """Append a non-negative integer as a little-endian base-128 varint"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _pack_uint32(values) -> bytes:
+    packed = array(UINT32_TYPECODE, values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+# =============================================================================
+# ENCODING
+# =============================================================================
+
+class _Encoder:
+    """Encodes values into a buffer, interning strings into a shared table"""
+
+    def __init__(self):
+        self.strings = {}
+
+    def string_index(self, value: str) -> int:
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.strings)
+        return index
+
+    def value(self, out: bytearray, value: Any) -> None:
+        value_type = type(value)
+        if value_type is str:
+            out.append(TAG_STRING)
+            _write_uint(out, self.string_index(value))
+        elif value_type is int:
+            if value >= 0:
+                out.append(TAG_INT)
+                _write_uint(out, value)
+            else:
+                out.append(TAG_NEG_INT)
+                _write_uint(out, -1 - value)
+        elif value_type is dict:
+            out.append(TAG_DICT)
+            _write_uint(out, len(value))
+            strings = self.strings
+            for key, item in value.items():
+                if type(key) is not str:
+                    raise TypeError(f"Keys must be str, not {type(key).__name__}")
+                index = strings.get(key)
+                if index is None:
+                    index = strings[key] = len(strings)
+                # Interned strings and small integers (most values) are written inline
+                item_type = type(item)
+                if index < 0x80 and item_type is int and 0 <= item < 0x80:
+                    out += bytes((index, TAG_INT, item))
+                elif index < 0x80 and item_type is str and strings.get(item, 0x80) < 0x80:
+                    out += bytes((index, TAG_STRING, strings[item]))
+                else:
+                    _write_uint(out, index)
+                    self.value(out, item)
+        elif value_type is bool:
+            out.append(TAG_TRUE if value else TAG_FALSE)
+        elif value is None:
+            out.append(TAG_NONE)
+        elif value_type is list or value_type is tuple:
+            is_tuple = value_type is tuple
+            if len(value) >= ARRAY_MIN_LENGTH and all(type(item) is int and 0 <= item <= UINT32_MAX for item in value):
+                out.append(TAG_UINT32_TUPLE if is_tuple else TAG_UINT32_LIST)
+                _write_uint(out, len(value))
+                out += _pack_uint32(value)
+            else:
+                out.append(TAG_TUPLE if is_tuple else TAG_LIST)
+                _write_uint(out, len(value))
+                for item in value:
+                    self.value(out, item)
+        elif value_type is float:
+            out.append(TAG_FLOAT)
+            out += FLOAT.pack(value)
+        else:
+            raise TypeError(f"Object of type {value_type.__name__} is not supported")
+
+def encode(character_record: dict[str, Any]) -> bytes:
+    """
+    Encode a character record in the binary format
+
+    Raises:
+        TypeError: If the record holds a value JSON could not hold either
+    """
+    if type(character_record) is not dict:
+        raise TypeError("A character record must be a dict")
+    encoder = _Encoder()
+    events = character_record.get(EVENTS_FIELD)
+    if type(events) is not list:
+        events = None
+    event_table = bytearray()
+    for event in events or ():
+        encoder.value(event_table, event)
+
+    body = bytearray()
+    body.append(TAG_DICT)
+    _write_uint(body, len(character_record))
+    for key, value in character_record.items():
+        if type(key) is not str:
+            raise TypeError(f"Keys must be str, not {type(key).__name__}")
+        _write_uint(body, encoder.string_index(key))
+        if key == EVENTS_FIELD and events is not None:
+            body.append(TAG_EVENTS)
+        else:
+            encoder.value(body, value)
+
+    table = bytearray()
+    for string in encoder.strings:
+        encoded = string.encode("utf-8")
+        _write_uint(table, len(encoded))
+        table += encoded
+    header = HEADER.pack(MAGIC, VERSION, len(encoder.strings), len(events or ()), len(event_table))
+    return b"".join((header, table, event_table, body))
+
+# =============================================================================
+# DECODING
+# =============================================================================
+
+def _read_uint(data: bytes, pos: int) -> tuple:
+    """Read a varint at pos; returns (value, next position)"""
+    byte = data[pos]
+    pos += 1
+    value = byte & 0x7F
+    shift = 7
+    while byte & 0x80:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+    return value, pos
+
+def _read_value(data: bytes, pos: int, strings: List[str], events, depth: int = 0) -> tuple:
+    """Read the tagged value at pos, nested depth containers deep; returns (value, next position)"""
+    tag = data[pos]
+    pos += 1
+    if tag == TAG_DICT or tag == TAG_LIST or tag == TAG_TUPLE:
+        if depth >= MAX_DEPTH:
+            raise ValueError(f"Values nested more than {MAX_DEPTH} deep at byte {pos - 1}")
+        count = data[pos]
+        if count < 0x80:
+            pos += 1
+        else:
+            count, pos = _read_uint(data, pos)
+        is_dict = tag == TAG_DICT
+        items = {} if is_dict else []
+        for _ in range(count):
+            if is_dict:
+                index = data[pos]
+                if index < 0x80:
+                    pos += 1
+                else:
+                    index, pos = _read_uint(data, pos)
+                key = strings[index]
+            # Single-byte strings, small integers and booleans (most values) are read inline
+            item_tag = data[pos]
+            if (item_tag == TAG_STRING or item_tag == TAG_INT) and data[pos + 1] < 0x80:
+                item = strings[data[pos + 1]] if item_tag == TAG_STRING else data[pos + 1]
+                pos += 2
+            elif item_tag == TAG_TRUE or item_tag == TAG_FALSE:
+                item = item_tag == TAG_TRUE
+                pos += 1
+            else:
+                item, pos = _read_value(data, pos, strings, events, depth + 1)
+            if is_dict:
+                items[key] = item
+            else:
+                items.append(item)
+        return (tuple(items) if tag == TAG_TUPLE else items), pos
+    if tag == TAG_STRING:
+        index, pos = _read_uint(data, pos)
+        return strings[index], pos
+    if tag == TAG_INT:
+        return _read_uint(data, pos)
+    if tag == TAG_TRUE or tag == TAG_FALSE:
+        return tag == TAG_TRUE, pos
+    if tag == TAG_NONE:
+        return None, pos
+    if tag == TAG_NEG_INT:
+        value, pos = _read_uint(data, pos)
+        return -1 - value, pos
+    if tag == TAG_UINT32_LIST or tag == TAG_UINT32_TUPLE:
+        count, pos = _read_uint(data, pos)
+        end = pos + count * 4
+        if end > len(data):
+            raise ValueError("Array runs past the end of the data")
+        packed = array(UINT32_TYPECODE)
+        packed.frombytes(data[pos:end])
+        if sys.byteorder == "big":
+            packed.byteswap()
+        return (tuple(packed) if tag == TAG_UINT32_TUPLE else packed.tolist()), end
+    if tag == TAG_FLOAT:
+        return FLOAT.unpack_from(data, pos)[0], pos + FLOAT.size
+    if tag == TAG_EVENTS and events is not None:
+        return events, pos
+    raise ValueError(f"Unknown value tag {tag} at byte {pos - 1}")
+
+def _read_events(data: bytes) -> tuple:
+    """Read the header, string table and event table; returns (strings, events, next position)"""
+    if len(data) < HEADER.size:
+        raise ValueError("Data is too short for a binary character")
+    magic, version, string_count, event_count, event_bytes = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a binary character")
+    if version != VERSION:
+        raise ValueError(f"Unsupported binary character version {version}")
+
+    pos = HEADER.size
+    strings = []
+    for _ in range(string_count):
+        length, pos = _read_uint(data, pos)
+        if pos + length > len(data):
+            raise ValueError("String table runs past the end of the data")
+        strings.append(data[pos:pos + length].decode("utf-8"))
+        pos += length
+
+    event_end = pos + event_bytes
+    events = []
+    for _ in range(event_count):
+        event, pos = _read_value(data, pos, strings, None)
+        events.append(event)
+    if pos != event_end:
+        raise ValueError("Event table length does not match its events")
+    return strings, events, pos
+
+def read_events(data: bytes) -> List[dict[str, Any]]:
+    """
+    Decode only the event table (career_history) of a binary character
+
+    Raises:
+        ValueError: If the data is not a valid binary character
+    """
+    try:
+        return _read_events(bytes(data))[1]
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"Truncated or corrupt binary character: {e}")
+
+def decode(data: bytes) -> dict[str, Any]:
+    """
+    Decode a binary character back into the record that was encoded
+
+    Raises:
+        ValueError: If the data is not a valid binary character
+    """
+    data = bytes(data)
+    try:
+        strings, events, pos = _read_events(data)
+        record, pos = _read_value(data, pos, strings, events)
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"Truncated or corrupt binary character: {e}")
+    if type(record) is not dict or pos != len(data):
+        raise ValueError("Binary character has trailing or malformed data")
+    return record
+
+def is_binary(data: bytes) -> bool:
+    """Whether data starts like a binary character"""
+    return data[:len(MAGIC)] == MAGIC
+
+# =============================================================================
+# RECORD STREAMS
+# =============================================================================
+
+def write_record(out: BinaryIO, data: bytes) -> None:
+    """Append one encoded record to a stream, prefixed with its length"""
+    out.write(RECORD_LENGTH.pack(len(data)))
+    out.write(data)
+
+def iter_records(stream: BinaryIO) -> Iterator[bytes]:
+    """
+    Yield each encoded record from a length-prefixed stream
+
+    Raises:
+        ValueError: If the stream ends partway through a record
+    """
+    while True:
+        prefix = stream.read(RECORD_LENGTH.size)
+        if not prefix:
+            return
+        if len(prefix) < RECORD_LENGTH.size:
+            raise ValueError("Truncated record length")
+        (length,) = RECORD_LENGTH.unpack(prefix)
+        data = stream.read(length)
+        if len(data) < length:
+            raise ValueError("Truncated record")
+        yield data
@@ -33,6 +33,8 @@ Usage:
 __version__ = "0.2.0"
 __author__ = "System Two Digital"
 
+import copy
+import hashlib
 import random
 from typing import Any, List, Tuple, Optional
 import character_generation_tables as tables
@@ -64,8 +66,12 @@ def get_random_generator(character_record: dict[str, Any]) -> random.Random:
     
     # Restore previous state if available
     if character_record.get("random_state"):
+        state = character_record["random_state"]
+        if isinstance(state, list):
+            # JSON turns the state tuples into lists (saved files, shared state store)
+            state = (state[0], tuple(state[1]), state[2])
         try:
-            random_generator.setstate(character_record["random_state"])
+            random_generator.setstate(state)
         except (ValueError, TypeError):
             # If state is corrupted, start fresh from seed
             random_generator = random.Random(seed)
@@ -104,11 +110,15 @@ def generate_character_name(random_generator: random.Random) -> str:
     
     return f"{first_name} {last_name}"
 
+# Version of the character record layout; character_upgrades brings older records up to it
+SCHEMA_VERSION = 2
+
 def create_character_record() -> dict[str, Any]:
     """
     Create an empty data structure to hold character generation data
     """
     return {
+        "schema_version": SCHEMA_VERSION,
         "name": "",
         "age": 18,
         "terms_served": 0,  # 0 = in first term, 1 = in second term, etc.
@@ -131,6 +141,37 @@ def create_character_record() -> dict[str, Any]:
         "rdy_for_reenlistment": False
     }
 
+def create_named_character(seed: int, character_id: Optional[str] = None) -> dict[str, Any]:
+    """
+    Create a new character record with a generated name and RNG state for the seed
+
+    Args:
+        seed: The character's own seed
+        character_id: Unique ID for the character (names are not unique)
+
+    Returns:
+        Character record ready for characteristics generation
+    """
+    # Use the seed for both name generation and character generation
+    character_record = create_character_record()
+    if character_id is not None:
+        character_record["character_id"] = character_id
+    character_record["name"] = generate_character_name(random.Random(seed))
+    character_record["upp"] = "______"
+    character_record["seed"] = seed
+    save_random_state(character_record, set_seed(seed))
+    return character_record
+
+def derive_seed(master_seed: int, index: int) -> int:
+    """
+    Derive a reproducible per-character seed from a master seed and an index
+
+    Neighbouring indexes give unrelated seeds, and the same (master_seed, index)
+    always gives the same seed in any process.
+    """
+    digest = hashlib.blake2b(f"{master_seed}:{index}".encode(), digest_size=6).digest()
+    return int.from_bytes(digest, "big")
+
 # =============================================================================
 # CHARACTER ARC PROGRESSION SYSTEM
 # =============================================================================
@@ -385,9 +426,34 @@ def generate_characteristic(random_generator: random.Random, characteristic: str
     
     # Restore the original state
     random_generator.setstate(original_state)
-    
+
     return value
 
+# Position of each characteristic in the UPP string
+UPP_ORDER = ['strength', 'dexterity', 'endurance', 'intelligence', 'education', 'social']
+
+def set_characteristic(character_record: dict[str, Any], characteristic: str, value: int) -> str:
+    """
+    Store a characteristic value and update the matching UPP digit
+
+    Args:
+        character_record: The character's record
+        characteristic: The characteristic to set ('strength', 'dexterity', etc.)
+        value: The characteristic value
+
+    Returns:
+        The hex digit written into the UPP string
+    """
+    if characteristic not in UPP_ORDER:
+        raise ValueError(f"Invalid characteristic: {characteristic}")
+
+    character_record.setdefault("characteristics", {})[characteristic] = value
+    hex_char = str(value) if value < 10 else chr(65 + value - 10)
+    upp_list = list(character_record.get("upp") or "______")
+    upp_list[UPP_ORDER.index(characteristic)] = hex_char
+    character_record["upp"] = ''.join(upp_list)
+    return hex_char
+
 def get_enlistment_target(service: str) -> int:
     """
     Get the target number needed for enlistment in a specific service
@@ -642,8 +708,10 @@ def check_survival(random_generator: random.Random, character_record: dict[str,
             if target is not None:
                 character_record["rdy_for_commission_check"] = True
         elif character_record.get("commissioned", False):
-            # Already commissioned, check promotion eligibility
-            character_record["rdy_for_promotion_check"] = True
+            # Already commissioned, check actual promotion eligibility (max rank)
+            target, modifiers, modifier_details = get_promotion_requirements(character_record)
+            if target is not None:
+                character_record["rdy_for_promotion_check"] = True
             
     else:
         outcome = "injured" 
@@ -1108,6 +1176,9 @@ def get_promotion_requirements(character_record: dict[str, Any]) -> tuple[int, i
     
     return target, modifier, modifier_details
 
+# Preferences a character can state at reenlistment
+REENLIST_PREFERENCES = ['reenlist', 'discharge', 'retire']
+
 def attempt_reenlistment(random_generator: random.Random, character_record: dict[str, Any], preference: str = 'reenlist') -> dict[str, Any]:
     """
     Attempt to reenlist a character for another term of service
@@ -1134,6 +1205,9 @@ def attempt_reenlistment(random_generator: random.Random, character_record: dict
     age = character_record["age"]
     current_term_number = get_current_term_number(character_record)
     
+    if preference not in REENLIST_PREFERENCES:
+        raise ValueError(f"Invalid reenlistment preference: {preference}")
+
     # Validate retirement eligibility (requires being in 5th term or later)
     if preference == "retire" and current_term_number < 5:
         raise ValueError(f"Character cannot retire before 5th term. Currently in term {current_term_number}.")
@@ -1167,18 +1241,8 @@ def attempt_reenlistment(random_generator: random.Random, character_record: dict
             outcome = "discharged"
             status_text = "discharged (max terms reached)"
             continue_career = False
-
-        # Add outcome information to the result
-        reenlistment_result["outcome"] = outcome
-        reenlistment_result["status_text"] = status_text
-        reenlistment_result["continue_career"] = continue_career
-
-        # Add the reenlistment attempt to the character's career history
-        character_record["career_history"].append(reenlistment_result)
-        return character_record
-    
     # Determine outcome based on preference and roll
-    if roll == 12:
+    elif roll == 12:
         # Roll of 12 is always mandatory retention
         outcome = "retained"
         status_text = "retained (mandatory)"
@@ -2028,12 +2092,6 @@ def calculate_success_probability(target, modifiers=0):
     Returns:
         dict: Contains percentage and simple description
     """
-    # 2D6 probability table - number of ways to roll each sum
-    roll_counts = {
-        2: 1, 3: 2, 4: 3, 5: 4, 6: 5, 7: 6,
-        8: 5, 9: 4, 10: 3, 11: 2, 12: 1
-    }
-    
     # Calculate effective target (what we need to roll on dice)
     effective_target = target - modifiers
     
@@ -2043,12 +2101,35 @@ def calculate_success_probability(target, modifiers=0):
     elif effective_target > 12:
         return {"percentage": 0, "description": "Impossible"}
     
-    # Count successful outcomes
-    successful = sum(count for roll, count in roll_counts.items() if roll >= effective_target)
-    percentage = round((successful / 36) * 100)
+    percentage = SUCCESS_PERCENTAGES[effective_target]
     
     return {"percentage": percentage, "description": f"{percentage}%"}
 
+# 2D6 probability table - number of ways to roll each sum
+ROLL_COUNTS_2D6 = {
+    2: 1, 3: 2, 4: 3, 5: 4, 6: 5, 7: 6,
+    8: 5, 9: 4, 10: 3, 11: 2, 12: 1
+}
+
+def precompile_rules() -> None:
+    """
+    Build derived rule tables
+    
+    Run at import, so the tables exist before any request; the app factory runs it
+    again before workers fork. Each table is built aside and assigned whole, so a
+    thread reading it never sees a partly built table.
+    """
+    global SUCCESS_PERCENTAGES
+    success_percentages = {}
+    for effective_target in range(3, 13):
+        successful = sum(count for roll, count in ROLL_COUNTS_2D6.items() if roll >= effective_target)
+        success_percentages[effective_target] = round((successful / 36) * 100)
+    SUCCESS_PERCENTAGES = success_percentages
+
+# Effective 2D6 target -> success percentage
+SUCCESS_PERCENTAGES = {}
+precompile_rules()
+
 def career_survival(service: str, characteristics: dict[str, int], num_terms: int) -> dict[str, Any]:
     """
     Calculate probability of completing a full career (survival + re-enlistment).
@@ -2215,6 +2296,407 @@ def get_characteristic_quality_class(value: int) -> str:
     else:
         return "char-bad"
 
+# =============================================================================
+# AUTOPLAY (POLICY-DRIVEN GENERATION)
+# =============================================================================
+
+SKILL_TABLE_NAMES = ['personal', 'service', 'advanced', 'education']
+
+DEFAULT_AUTOPLAY_POLICY = {
+    "service": None,  # Preferred service; None picks the best enlistment odds
+    "skill_tables": ['service', 'advanced', 'education', 'personal'],  # First available table is used
+    "reenlist_until_term": None,  # Leave after completing this term
+    "reenlist_until_age": None,  # Leave once the character reaches this age
+    "retire_when_eligible": False,  # Retire as soon as retirement is allowed (5th term+)
+    "cash_rolls": None  # Mustering out cash rolls; None uses the maximum allowed
+}
+
+# Safety limits so autoplay can never loop forever on an unexpected state
+AUTOPLAY_MAX_TERMS = 20
+AUTOPLAY_MAX_STEPS_PER_TERM = 50
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def normalize_autoplay_policy(policy: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+    """
+    Validate an autoplay policy and fill in defaults for missing fields
+
+    Args:
+        policy: Partial policy dictionary (see DEFAULT_AUTOPLAY_POLICY)
+
+    Returns:
+        Complete policy dictionary
+
+    Raises:
+        ValueError: If the policy has unknown fields or invalid values
+    """
+    policy = policy or {}
+    if not isinstance(policy, dict):
+        raise ValueError("Autoplay policy must be an object")
+
+    unknown = sorted(set(policy) - set(DEFAULT_AUTOPLAY_POLICY))
+    if unknown:
+        raise ValueError(f"Unknown autoplay policy fields: {', '.join(unknown)}")
+
+    normalized = dict(DEFAULT_AUTOPLAY_POLICY)
+    normalized.update({key: value for key, value in policy.items() if value is not None})
+
+    service = normalized["service"]
+    if service is not None and service not in get_available_services():
+        raise ValueError(f"Invalid service: {service}")
+
+    skill_tables = normalized["skill_tables"]
+    if not isinstance(skill_tables, list) or not skill_tables:
+        raise ValueError("skill_tables must be a non-empty list")
+    for table_name in skill_tables:
+        if table_name not in SKILL_TABLE_NAMES:
+            raise ValueError(f"Invalid skill table: {table_name}")
+
+    until_term = normalized["reenlist_until_term"]
+    if until_term is not None and (not _is_int(until_term) or until_term < 1):
+        raise ValueError("reenlist_until_term must be an integer of at least 1")
+
+    until_age = normalized["reenlist_until_age"]
+    if until_age is not None and (not _is_int(until_age) or until_age < 18):
+        raise ValueError("reenlist_until_age must be an integer of at least 18")
+
+    if not isinstance(normalized["retire_when_eligible"], bool):
+        raise ValueError("retire_when_eligible must be true or false")
+
+    cash_rolls = normalized["cash_rolls"]
+    if cash_rolls is not None and (not _is_int(cash_rolls) or not 0 <= cash_rolls <= 3):
+        raise ValueError("cash_rolls must be an integer from 0 to 3")
+
+    return normalized
+
+def choose_autoplay_service(character_record: dict[str, Any], policy: dict[str, Any]) -> str:
+    """
+    Pick the service to attempt enlistment in
+
+    Uses the policy's preferred service, otherwise the service with the best
+    enlistment probability for the character's characteristics.
+    """
+    if policy["service"]:
+        return policy["service"]
+
+    def enlistment_percentage(service):
+        target, modifier, _ = get_enlistment_requirements(service, character_record)
+        return calculate_success_probability(target, modifier)["percentage"]
+
+    return max(get_available_services(), key=enlistment_percentage)
+
+def choose_autoplay_skill_table(character_record: dict[str, Any], policy: dict[str, Any]) -> str:
+    """
+    Pick the first skill table from the policy's preference order that is available
+    """
+    available_tables = get_available_skill_tables(character_record)
+    for table_name in policy["skill_tables"]:
+        if available_tables.get(table_name):
+            return table_name
+    # Every character can use the service table
+    return 'service'
+
+def choose_autoplay_reenlistment(character_record: dict[str, Any], policy: dict[str, Any]) -> str:
+    """
+    Pick the reenlistment preference ('reenlist', 'discharge' or 'retire') for the current term
+    """
+    current_term = get_current_term_number(character_record)
+    can_retire = current_term >= 5
+
+    if can_retire and policy["retire_when_eligible"]:
+        return "retire"
+
+    leave = False
+    if policy["reenlist_until_term"] is not None and current_term >= policy["reenlist_until_term"]:
+        leave = True
+    if policy["reenlist_until_age"] is not None and character_record.get("age", 18) >= policy["reenlist_until_age"]:
+        leave = True
+
+    if not leave:
+        return "reenlist"
+    return "retire" if can_retire else "discharge"
+
+def autoplay_term(random_generator: random.Random, character_record: dict[str, Any],
+                  policy: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+    """
+    Play the character through the rest of the current term following a policy
+
+    Missing characteristics are generated and the character enlists first if needed.
+    Phases are resolved in the order the readiness flags allow. If the career ends
+    during the term, the character is mustered out using the policy's cash rolls.
+
+    Args:
+        random_generator: An instance of random.Random with the user's seed
+        character_record: The character's record
+        policy: Autoplay policy (see DEFAULT_AUTOPLAY_POLICY)
+
+    Returns:
+        Updated character record
+
+    Raises:
+        ValueError: If the policy is invalid or the career is already complete
+    """
+    policy = normalize_autoplay_policy(policy)
+
+    if character_record.get("mustering_out_benefits"):
+        raise ValueError("Character has already completed their career")
+
+    # Phase 0: characteristics and enlistment
+    for characteristic in UPP_ORDER:
+        if characteristic not in character_record.get("characteristics", {}):
+            value = generate_characteristic(random_generator, characteristic)
+            set_characteristic(character_record, characteristic, value)
+
+    if not character_record.get("career"):
+        service = choose_autoplay_service(character_record, policy)
+        character_record = attempt_enlistment(random_generator, character_record, service)
+
+    # Phases 1-6: follow the readiness flags until the term is over
+    for _ in range(AUTOPLAY_MAX_STEPS_PER_TERM):
+        if character_record.get("rdy_for_survival_check"):
+            character_record = check_survival(random_generator, character_record)
+        elif character_record.get("rdy_for_commission_check"):
+            character_record = check_commission(random_generator, character_record)
+        elif character_record.get("rdy_for_promotion_check"):
+            character_record = check_promotion(random_generator, character_record)
+        elif character_record.get("skill_roll_eligibility", 0) > 0:
+            table_choice = choose_autoplay_skill_table(character_record, policy)
+            character_record = resolve_skill(random_generator, character_record, table_choice)
+        elif character_record.get("rdy_for_ageing_check"):
+            character_record = check_ageing(random_generator, character_record)
+        elif character_record.get("rdy_for_reenlistment"):
+            preference = choose_autoplay_reenlistment(character_record, policy)
+            character_record = attempt_reenlistment(random_generator, character_record, preference)
+            break
+        else:
+            break
+    else:
+        raise RuntimeError("Autoplay did not finish the term - readiness flags never cleared")
+
+    # Phase 7: mustering out once the career has ended
+    if character_record.get("rdy_for_muster_out"):
+        character_record = perform_mustering_out(random_generator, character_record, policy["cash_rolls"])
+
+    return character_record
+
+def autoplay_career(random_generator: random.Random, character_record: dict[str, Any],
+                    policy: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+    """
+    Play the character through a complete career, including mustering out
+
+    Args:
+        random_generator: An instance of random.Random with the user's seed
+        character_record: The character's record
+        policy: Autoplay policy (see DEFAULT_AUTOPLAY_POLICY)
+
+    Returns:
+        Updated character record with mustering out results
+    """
+    policy = normalize_autoplay_policy(policy)
+
+    for _ in range(AUTOPLAY_MAX_TERMS):
+        character_record = autoplay_term(random_generator, character_record, policy)
+        if character_record.get("mustering_out_benefits"):
+            break
+
+    return character_record
+
+def generate_complete_character(seed: int, policy: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+    """
+    Generate a finished character (characteristics through mustering out) from a seed
+
+    Args:
+        seed: The character's own seed
+        policy: Autoplay policy (see DEFAULT_AUTOPLAY_POLICY)
+
+    Returns:
+        Completed character record
+    """
+    character_record = create_named_character(seed)
+    random_generator = get_random_generator(character_record)
+    character_record = autoplay_career(random_generator, character_record, policy)
+    save_random_state(character_record, random_generator)
+    return character_record
+
+# =============================================================================
+# ACTION PIPELINE (BATCHED ACTIONS)
+# =============================================================================
+
+# Pipeline step verb -> action name that must be available (see get_available_actions)
+ACTION_STEP_REQUIREMENTS = {
+    "characteristic": "generate_characteristics",
+    "enlist": "enlist",
+    "survival": "survival",
+    "commission": "commission",
+    "promotion": "promotion",
+    "skill": "skills",
+    "ageing": "ageing",
+    "reenlist": "reenlistment",
+    "muster_out": "muster_out"
+}
+
+# Step verbs that need an argument after the colon (e.g. "skill:service")
+ACTION_STEPS_WITH_ARGUMENT = ["characteristic", "enlist", "skill"]
+
+def get_available_actions(character_record: dict[str, Any]) -> List[str]:
+    """
+    Get the actions available to a character based on its readiness flags
+
+    Args:
+        character_record: The character's record
+
+    Returns:
+        List of action names ('survival', 'skills', 'muster_out', etc.)
+    """
+    # Check characteristics generation phase
+    characteristics = character_record.get("characteristics", {})
+    if any(characteristic not in characteristics for characteristic in UPP_ORDER):
+        return ["generate_characteristics"]
+
+    # Check enlistment phase
+    if not character_record.get("career"):
+        return ["enlist"]
+
+    # Check service phase actions based on readiness flags
+    available_actions = []
+    if character_record.get("rdy_for_survival_check", False):
+        available_actions.append("survival")
+    if character_record.get("rdy_for_commission_check", False):
+        available_actions.append("commission")
+    if character_record.get("rdy_for_promotion_check", False):
+        available_actions.append("promotion")
+    if character_record.get("skill_roll_eligibility", 0) > 0:
+        available_actions.append("skills")
+    if character_record.get("rdy_for_ageing_check", False):
+        available_actions.append("ageing")
+    if character_record.get("rdy_for_reenlistment", False):
+        available_actions.append("reenlistment")
+    if character_record.get("rdy_for_muster_out", False):
+        available_actions.append("muster_out")
+    return available_actions
+
+def parse_action_step(step: str) -> Tuple[str, Optional[str]]:
+    """
+    Parse a pipeline step such as "survival", "skill:education" or "reenlist:retire"
+
+    Args:
+        step: The step string
+
+    Returns:
+        Tuple of (action verb, argument or None)
+
+    Raises:
+        ValueError: If the step is malformed or the verb is unknown
+    """
+    if not isinstance(step, str) or not step:
+        raise ValueError("Each step must be a non-empty string")
+
+    action, _, argument = step.partition(":")
+    if action not in ACTION_STEP_REQUIREMENTS:
+        raise ValueError(f"Unknown action '{action}'")
+    if action in ACTION_STEPS_WITH_ARGUMENT and not argument:
+        raise ValueError(f"Action '{action}' requires an argument (e.g. '{action}:...')")
+    if action == "muster_out" and argument and not argument.isdigit():
+        raise ValueError("muster_out argument must be the number of cash rolls")
+    # Arguments are checked here so a bad one fails the batch before any dice are rolled
+    if action == "characteristic" and argument not in UPP_ORDER:
+        raise ValueError(f"Invalid characteristic: {argument}")
+    if action == "enlist" and argument not in get_available_services():
+        raise ValueError(f"Invalid service: {argument}")
+    if action == "skill" and argument not in SKILL_TABLE_NAMES:
+        raise ValueError(f"Invalid skill table: {argument}")
+    if action == "reenlist" and argument and argument not in REENLIST_PREFERENCES:
+        raise ValueError(f"Invalid reenlistment preference: {argument}")
+    return action, argument or None
+
+def apply_action_step(random_generator: random.Random, character_record: dict[str, Any], step: str) -> dict[str, Any]:
+    """
+    Apply one pipeline step to the character after checking it is currently allowed
+
+    Args:
+        random_generator: An instance of random.Random with the user's seed
+        character_record: The character's record
+        step: The step string (see parse_action_step)
+
+    Returns:
+        Updated character record
+
+    Raises:
+        ValueError: If the step is malformed, not available, or rejected by the rules
+    """
+    action, argument = parse_action_step(step)
+
+    available_actions = get_available_actions(character_record)
+    if ACTION_STEP_REQUIREMENTS[action] not in available_actions:
+        raise ValueError(f"Action not available now (available actions: {', '.join(available_actions) or 'none'})")
+
+    if action == "characteristic":
+        value = generate_characteristic(random_generator, argument)
+        set_characteristic(character_record, argument, value)
+    elif action == "enlist":
+        character_record = attempt_enlistment(random_generator, character_record, argument)
+    elif action == "survival":
+        character_record = check_survival(random_generator, character_record)
+    elif action == "commission":
+        character_record = check_commission(random_generator, character_record)
+    elif action == "promotion":
+        character_record = check_promotion(random_generator, character_record)
+    elif action == "skill":
+        character_record = resolve_skill(random_generator, character_record, argument)
+    elif action == "ageing":
+        character_record = check_ageing(random_generator, character_record)
+    elif action == "reenlist":
+        character_record = attempt_reenlistment(random_generator, character_record, argument or "reenlist")
+    elif action == "muster_out":
+        cash_rolls = int(argument) if argument else None
+        character_record = perform_mustering_out(random_generator, character_record, cash_rolls)
+
+    return character_record
+
+def run_action_pipeline(random_generator: random.Random, character_record: dict[str, Any],
+                        steps: List[str]) -> Tuple[dict[str, Any], List[dict[str, Any]]]:
+    """
+    Apply a sequence of steps atomically
+
+    All steps are parsed before any dice are rolled. The steps are then applied to a
+    copy of the record, so the caller's record is untouched if any step fails.
+
+    Args:
+        random_generator: An instance of random.Random with the user's seed
+        character_record: The character's record (not modified)
+        steps: List of step strings (see parse_action_step)
+
+    Returns:
+        Tuple of (updated copy of the record, list of per-step results)
+
+    Raises:
+        ValueError: If any step is malformed, not available, or rejected by the rules
+    """
+    if not isinstance(steps, list) or not steps:
+        raise ValueError("Steps must be a non-empty list")
+
+    for index, step in enumerate(steps):
+        try:
+            parse_action_step(step)
+        except ValueError as e:
+            raise ValueError(f"Step {index + 1} ({step}): {e}") from e
+
+    working_record = copy.deepcopy(character_record)
+    results = []
+    for index, step in enumerate(steps):
+        events_before = len(working_record.get("career_history", []))
+        try:
+            working_record = apply_action_step(random_generator, working_record, step)
+        except ValueError as e:
+            raise ValueError(f"Step {index + 1} ({step}): {e}") from e
+        results.append({
+            "step": step,
+            "events": working_record.get("career_history", [])[events_before:]
+        })
+
+    return working_record, results
+
 if __name__ == "__main__":
     """
     Module guard - this code only runs when the module is executed directly
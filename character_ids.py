@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Character ID and Seed Allocation for Classic Traveller Character Generator
+
+Generated names are not unique (two characters can easily share one), so every
+new character gets a unique ID from a monotonic counter and a reproducible seed
+derived from the master seed and that counter.
+
+The counter lives in the shared state store but is reserved in batches: a worker
+claims the next batch_size numbers with one compare-and-set and then hands them
+out from memory. Numbers in a claimed batch are never issued twice, even if the
+worker dies (at worst the rest of its batch is skipped), so creations never
+collide and never wait on storage except once per batch.
+
+Usage:
+    import character_ids
+
+    allocator = character_ids.CharacterIdAllocator(state_store, batch_size=1000)
+    character_id, seed = allocator.allocate(master_seed=77)
+"""
+
+import os
+import re
+import threading
+
+import character_generation_rules as chargen
+import state_backend
+
+# Store key holding the next unreserved counter value
+COUNTER_KEY = "character_id_counter"
+
+# Numbers reserved per trip to the state store
+DEFAULT_BATCH_SIZE = 1000
+
+CHARACTER_ID_PATTERN = re.compile(r'^[0-9]{10,}$')
+
+def format_character_id(number: int) -> str:
+    """Character IDs are the counter value, zero-padded so they sort in creation order"""
+    return f"{number:010d}"
+
+def is_character_id(value: str) -> bool:
+    return bool(CHARACTER_ID_PATTERN.match(value or ""))
+
+class CharacterIdAllocator:
+    """Issues unique character IDs and per-character seeds from a batched shared counter"""
+
+    def __init__(self, store, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.store = store
+        self.batch_size = batch_size
+        self._next = 0
+        self._limit = 0
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _reserve_batch(self) -> None:
+        # Compare-and-set loop: another worker may claim a batch between our read and write
+        while True:
+            start, version = self.store.get_with_version(COUNTER_KEY, 1)
+            try:
+                self.store.set(COUNTER_KEY, start + self.batch_size, expected_version=version)
+            except state_backend.VersionConflict:
+                continue
+            self._next, self._limit = start, start + self.batch_size
+            return
+
+    def allocate_number(self) -> int:
+        """Next unique counter value"""
+        with self._lock:
+            if self._pid != os.getpid():
+                # A forked worker must not hand out the rest of its parent's batch
+                self._next = self._limit = 0
+                self._pid = os.getpid()
+            if self._next >= self._limit:
+                self._reserve_batch()
+            number = self._next
+            self._next += 1
+            return number
+
+    def allocate(self, master_seed: int) -> tuple:
+        """
+        Allocate a new character identity
+
+        Args:
+            master_seed: The run's global seed
+
+        Returns:
+            (character_id, seed): the unique ID and the character's reproducible seed
+        """
+        number = self.allocate_number()
+        return format_character_id(number), chargen.derive_seed(master_seed, number)
+
+    def reserve_through(self, number: int) -> None:
+        """
+        Make sure the shared counter never issues number or anything below it again.
+        Used after importing characters that kept IDs issued elsewhere.
+        """
+        while True:
+            start, version = self.store.get_with_version(COUNTER_KEY, 1)
+            if start > number:
+                return
+            try:
+                self.store.set(COUNTER_KEY, number + 1, expected_version=version)
+            except state_backend.VersionConflict:
+                continue
+            return
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Bulk Character Import for Classic Traveller Character Generator
+
+Characters generated elsewhere (a bulk generation job, another server's archive)
+used to reach the archive one save at a time: a file, a manifest append and a
+skill index update per character. This module imports a whole stream of them:
+
+    NDJSON   one JSON character per line (.ndjson/.jsonl, optionally .gz), as
+             bulk generation and /api/bulk_generate write them
+    binary   length-prefixed character_binary records (.trvc), as binary
+             generation jobs write them
+    bundle   a character_storage bundle (.bundle) from another archive
+
+The parent process only splits the stream into chunks of raw records. A process
+pool decodes each chunk, upgrades records saved by older code (character_upgrades),
+validates every record against character_schema, re-encodes it for storage and
+summarizes it as a manifest row; a bounded number of chunks is in flight at
+once, so memory stays flat however large the input.
+Prepared records are appended, in input order, to a new bundle. Every batch_size
+records the bundle is closed (written to a temporary file and renamed, so it
+appears whole or not at all) and its rows are added to the manifest, and through
+it to the skill index and leaderboards, with a single append. A run stopped part
+way keeps every batch committed before it; an uncommitted bundle is discarded.
+
+Records keep their character_id (ids=keep, the default; records without a valid
+one are rejected) or are given new IDs from the shared counter (ids=new). A kept
+ID replaces the archived character with that ID. Rejected records are counted
+and the first MAX_REPORTED_ERRORS are reported with the problem found.
+
+Usage:
+    import character_import
+
+    importer = character_import.CharacterImporter(manifest, id_allocator, ids="new")
+    stats = importer.import_file("characters.ndjson")   # imported, rejected, errors...
+
+    python character_import.py characters.ndjson.gz [characters_dir] --ids new --workers 8
+"""
+
+import argparse
+import gzip
+import json
+import os
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, BinaryIO, Iterator, List, Optional
+
+import character_archive
+import character_binary
+import character_ids
+import character_schema
+import character_storage
+import character_upgrades
+
+SOURCE_FORMATS = ("ndjson", "binary", "bundle")
+ID_POLICIES = ("keep", "new")
+
+# File extension (after any .gz) -> source format
+SOURCE_EXTENSIONS = {
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".trvc": "binary",
+    character_storage.BUNDLE_EXTENSION: "bundle"
+}
+
+# Characters per bundle, and per manifest append
+DEFAULT_BATCH_SIZE = 10000
+# Records per process pool task
+CHUNK_SIZE = 1000
+# Rejected records reported individually (all are counted)
+MAX_REPORTED_ERRORS = 100
+
+# =============================================================================
+# SOURCES
+# =============================================================================
+
+def source_format(path: str) -> Optional[str]:
+    """Source format of an import file from its extension (None if not recognised)"""
+    name = path[:-3] if path.endswith(".gz") else path
+    for extension, fmt in SOURCE_EXTENSIONS.items():
+        if name.endswith(extension):
+            return fmt
+    return None
+
+def iter_ndjson(stream: BinaryIO) -> Iterator[tuple]:
+    """(label, raw record, fallback ID) for each non-blank line"""
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            yield f"line {number}", line, None
+
+def iter_binary(stream: BinaryIO) -> Iterator[tuple]:
+    """(label, raw record, fallback ID) for each length-prefixed binary record"""
+    for number, data in enumerate(character_binary.iter_records(stream), 1):
+        yield f"record {number}", data, None
+
+def iter_bundle(path: str) -> Iterator[tuple]:
+    """(label, raw record, fallback ID) for each character in a bundle, in file order"""
+    index = character_storage.read_bundle_index(path)
+    with open(path, 'rb') as f:
+        for character_id, (offset, length) in sorted(index.items(), key=lambda item: item[1][0]):
+            f.seek(offset)
+            # Records bundled before character IDs are known by the ID they were bundled under
+            yield character_id, f.read(length), character_id
+
+# =============================================================================
+# PREPARATION (process pool)
+# =============================================================================
+
+def prepare_record(data: bytes, fallback_id: Optional[str], new_id: Optional[str]) -> tuple:
+    """
+    Decode, upgrade, validate and encode one raw record
+
+    Returns:
+        (character_id, encoded record, header fields, manifest row)
+
+    Raises:
+        ValueError: If the record cannot be imported (the message says why)
+    """
+    try:
+        character_record = character_storage.decode_character(data)
+    except (ValueError, zlib.error, RecursionError) as e:
+        raise ValueError(f"Not a character record: {e}")
+    character_upgrades.upgrade(character_record)
+    problems = character_schema.validate(character_record)
+    if problems:
+        raise character_schema.RecordValidationError(problems)
+    if new_id is not None:
+        character_id = new_id
+    else:
+        character_id = character_record.get("character_id") or fallback_id
+        if not character_ids.is_character_id(character_id):
+            raise ValueError("No valid character_id (import with ids=new to assign new IDs)")
+    character_record["character_id"] = character_id
+    if character_record.get("mustering_out_benefits"):
+        character_record = {key: value for key, value in character_record.items()
+                            if key not in character_storage.BUNDLE_DROPPED_FIELDS}
+    return (character_id, character_storage.encode_character(character_record, "gzip"),
+            character_storage.header_fields(character_record),
+            character_archive.manifest_row(character_record, "", 0))
+
+def prepare_chunk(items: List[tuple], new_ids: Optional[List[str]] = None) -> tuple:
+    """
+    Process pool task: decode, upgrade, validate and encode a chunk of raw records
+
+    Args:
+        items: (label, raw record, fallback ID) tuples
+        new_ids: IDs to give the records, one per item (None to keep their own)
+
+    Returns:
+        (prepared, errors): (character_id, encoded record, header fields, manifest
+        row) for each valid record, and (label, message) for each rejected one
+    """
+    prepared, errors = [], []
+    for position, (label, data, fallback_id) in enumerate(items):
+        try:
+            prepared.append(prepare_record(data, fallback_id, None if new_ids is None else new_ids[position]))
+        except ValueError as e:
+            errors.append((label, str(e)))
+        except Exception as e:
+            # Whatever a record does, it is rejected on its own, never failing the chunk
+            errors.append((label, f"Cannot import record: {type(e).__name__}: {e}"))
+    return prepared, errors
+
+# =============================================================================
+# IMPORTER
+# =============================================================================
+
+class CharacterImporter:
+    """Imports streams of characters into an archive in validated, bundled batches"""
+
+    def __init__(self, manifest: character_archive.ArchiveManifest,
+                 id_allocator: Optional[character_ids.CharacterIdAllocator] = None,
+                 ids: str = "keep", batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_workers: Optional[int] = None, executor_factory=ProcessPoolExecutor):
+        """
+        Args:
+            manifest: Archive to import into (bundles go to its characters directory)
+            id_allocator: Shared ID counter; needed for ids="new", and advanced past
+                kept IDs so new characters never reuse them
+            ids: "keep" each record's character_id or assign "new" ones
+            batch_size: Characters per bundle and manifest append
+            max_workers: Process pool size (default: one per CPU)
+            executor_factory: Executor class taking max_workers
+
+        Raises:
+            ValueError: If ids is not one of ID_POLICIES, or is "new" without an allocator
+        """
+        if ids not in ID_POLICIES:
+            raise ValueError(f"ids must be one of {', '.join(ID_POLICIES)}")
+        if ids == "new" and id_allocator is None:
+            raise ValueError("Assigning new IDs needs an ID allocator")
+        self.manifest = manifest
+        self.id_allocator = id_allocator
+        self.ids = ids
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.executor_factory = executor_factory
+        self._writer = None
+        self._rows = []
+
+    def import_file(self, path: str, fmt: Optional[str] = None) -> dict[str, Any]:
+        """
+        Import every character in a file (format from its extension unless given)
+
+        Raises:
+            ValueError: If the format is unknown
+        """
+        fmt = fmt or source_format(path)
+        if fmt not in SOURCE_FORMATS:
+            raise ValueError(f"Cannot tell the import format of {path}; use one of {', '.join(SOURCE_FORMATS)}")
+        if fmt == "bundle":
+            return self.import_items(iter_bundle(path))
+        with (gzip.open(path, 'rb') if path.endswith(".gz") else open(path, 'rb')) as stream:
+            return self.import_stream(stream, fmt)
+
+    def import_stream(self, stream: BinaryIO, fmt: str = "ndjson") -> dict[str, Any]:
+        """
+        Import every character in an NDJSON or binary stream (bundles need a file)
+
+        Raises:
+            ValueError: If the format is not ndjson or binary
+        """
+        if fmt == "ndjson":
+            return self.import_items(iter_ndjson(stream))
+        if fmt == "binary":
+            return self.import_items(iter_binary(stream))
+        raise ValueError("Only ndjson and binary streams can be imported; bundles are imported from a file")
+
+    def import_items(self, items) -> dict[str, Any]:
+        """
+        Import (label, raw record, fallback ID) items
+
+        Returns:
+            Dictionary with imported, rejected, errors (the first MAX_REPORTED_ERRORS
+            as {item, error}), bundles, replaced_files, source_error (why reading
+            stopped early, or None) and seconds
+        """
+        start = time.perf_counter()
+        stats = {"imported": 0, "rejected": 0, "errors": [], "bundles": 0, "replaced_files": 0,
+                 "source_error": None}
+        self._writer, self._rows = None, []
+        pending = deque()
+        try:
+            with self.executor_factory(max_workers=self.max_workers) as executor:
+                def submit(chunk):
+                    pending.append(executor.submit(prepare_chunk, chunk, self._new_ids(len(chunk))))
+                    # Bounded read-ahead: the input is never read much faster than it is stored
+                    if len(pending) >= self.max_workers * 2:
+                        self._add_prepared(pending.popleft().result(), stats)
+
+                chunk = []
+                try:
+                    for item in items:
+                        chunk.append(item)
+                        if len(chunk) >= CHUNK_SIZE:
+                            submit(chunk)
+                            chunk = []
+                except (OSError, ValueError, EOFError) as e:
+                    # A truncated or unreadable input: keep what was read before the problem
+                    stats["source_error"] = str(e)
+                if chunk:
+                    submit(chunk)
+                while pending:
+                    self._add_prepared(pending.popleft().result(), stats)
+            self._commit(stats)
+        except BaseException:
+            if self._writer is not None:
+                self._writer.abort()
+                self._writer, self._rows = None, []
+            raise
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        return stats
+
+    def _new_ids(self, count: int) -> Optional[List[str]]:
+        if self.ids != "new":
+            return None
+        new_ids = []
+        while len(new_ids) < count:
+            candidates = [character_ids.format_character_id(self.id_allocator.allocate_number())
+                          for _ in range(count - len(new_ids))]
+            # A counter that restarted below the archive must not hand out archived IDs again
+            taken = self.manifest.get_many(candidates)
+            new_ids += [character_id for character_id in candidates if character_id not in taken]
+        return new_ids
+
+    def _add_prepared(self, result: tuple, stats: dict[str, Any]) -> None:
+        prepared, errors = result
+        stats["rejected"] += len(errors)
+        room = MAX_REPORTED_ERRORS - len(stats["errors"])
+        stats["errors"] += [{"item": label, "error": message} for label, message in errors[:max(room, 0)]]
+        for character_id, data, fields, row in prepared:
+            if self._writer is not None and character_id in self._writer.index:
+                # The same ID again: commit the earlier copy so the later one wins
+                self._commit(stats)
+            if self._writer is None:
+                self._writer = character_storage.open_bundle_writer(self.manifest.characters_dir)
+            row["offset"], row["length"] = self._writer.add_packed(character_id, data, fields)
+            self._rows.append(row)
+            if len(self._rows) >= self.batch_size:
+                self._commit(stats)
+
+    def _commit(self, stats: dict[str, Any]) -> None:
+        """Close the open bundle and add its rows to the manifest in one append"""
+        if self._writer is None:
+            return
+        writer, rows = self._writer, self._rows
+        self._writer, self._rows = None, []
+        writer.close()
+        mtime = round(os.path.getmtime(writer.path), 3)
+        for row in rows:
+            row["path"], row["mtime"] = writer.path, mtime
+        replaced = self.manifest.get_many([row["id"] for row in rows])
+        self.manifest.record_rows(rows)
+        # A character's own file takes precedence over any bundle when the manifest
+        # is rebuilt, so the copies this batch replaced must go
+        for old_row in replaced.values():
+            if old_row["offset"] is None:
+                try:
+                    os.remove(old_row["path"])
+                    stats["replaced_files"] += 1
+                except FileNotFoundError:
+                    pass
+        if self.ids == "keep" and self.id_allocator is not None:
+            self.id_allocator.reserve_through(max(int(row["id"]) for row in rows))
+        stats["imported"] += len(rows)
+        stats["bundles"] += 1
+
+def main():
+    import production_config
+    import state_backend
+
+    parser = argparse.ArgumentParser(description='Import characters into the archive')
+    parser.add_argument('file', help='NDJSON (.ndjson/.jsonl, optionally .gz), binary (.trvc) or bundle file')
+    parser.add_argument('characters_dir', nargs='?', default='characters', help='Archive directory')
+    parser.add_argument('--format', choices=SOURCE_FORMATS, help='Source format (default: from the extension)')
+    parser.add_argument('--ids', choices=ID_POLICIES, default='keep', help='Keep character IDs or assign new ones')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Characters per bundle')
+    parser.add_argument('--workers', type=int, help='Process pool size (default: one per CPU)')
+    parser.add_argument('--state-url', default=production_config.get_config().STATE_STORAGE_URL,
+                        help='Shared state store holding the character ID counter')
+    options = parser.parse_args()
+
+    if options.state_url.startswith("sqlite:///"):
+        os.makedirs(os.path.dirname(options.state_url[len("sqlite:///"):]) or ".", exist_ok=True)
+    allocator = character_ids.CharacterIdAllocator(state_backend.create_state_store(options.state_url))
+    importer = CharacterImporter(character_archive.ArchiveManifest(options.characters_dir), allocator,
+                                 ids=options.ids, batch_size=options.batch_size, max_workers=options.workers)
+    stats = importer.import_file(options.file, options.format)
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Archive Migration for Classic Traveller Character Generator
+
+Records saved by older code are upgraded whenever they are loaded
+(character_upgrades), but an archive that is never rewritten pays for that on
+every load and keeps the old layout on disk for anything that reads the files
+directly. This module rewrites a whole archive at the current schema version.
+
+The archive is split into tasks that are stable from one run to the next: each
+bundle, each top-level shard directory (characters/ab/, with every shard below
+it) and the flat layout. A process pool runs the tasks; a task reads each
+character, upgrades any that need it, validates them, and writes the file back
+in its own format (to a temporary file, then renamed). A bundle that holds an
+older record is rewritten whole, records already current keeping their bytes.
+Records that cannot be read or fail validation are reported and left as they
+are.
+
+After every task a checkpoint (characters/migration.checkpoint) records it as
+done, with its counts, so an interrupted run started again skips the finished
+tasks and reports totals for the whole migration. The checkpoint is removed when
+the migration completes. Rewritten bundles move records to new offsets, so the
+manifest is rebuilt at the end if any bundle was rewritten.
+
+Run it while no server is writing to the archive.
+
+Usage:
+    import character_migration
+
+    stats = character_migration.migrate_archive("characters", max_workers=8,
+                                                 on_progress=lambda progress: print(progress))
+
+    python character_migration.py [characters_dir] [--workers N]
+"""
+
+import argparse
+import json
+import os
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, List, Optional
+
+import character_archive
+import character_generation_rules as chargen
+import character_schema
+import character_storage
+import character_upgrades
+
+# Not .json: that extension would make it look like a character file
+CHECKPOINT_NAME = "migration.checkpoint"
+
+# Unreadable or invalid records reported individually (all are counted)
+MAX_REPORTED_FAILURES = 100
+
+# Counters kept per task and summed over the migration
+COUNTERS = ("records", "upgraded", "failed", "bundles_rewritten")
+
+# =============================================================================
+# TASKS
+# =============================================================================
+
+def plan_tasks(characters_dir: str) -> List[tuple]:
+    """
+    Split an archive into migration tasks
+
+    Returns:
+        (key, kind, target) for each task: key names the task in the checkpoint;
+        kind is "bundle" (target: its path) or "files" (target: file paths)
+    """
+    bundles, paths = character_storage.list_archive(characters_dir)
+    tasks = [(os.path.basename(path), "bundle", path) for path in bundles]
+    groups = {}
+    for path in paths:
+        relative = os.path.relpath(path, characters_dir)
+        # Top-level shard ("ab"), or "." for the flat layout
+        top = relative.split(os.sep)[0] if os.sep in relative else "."
+        groups.setdefault(top, []).append(path)
+    tasks += [(top, "files", group) for top, group in sorted(groups.items())]
+    return tasks
+
+def upgraded_record(data: bytes) -> tuple:
+    """
+    Decode a stored character and upgrade it if it needs to be
+
+    Returns:
+        (record, changed)
+
+    Raises:
+        ValueError: If the data is not a character, has a newer schema version,
+            or does not match the schema once upgraded
+    """
+    try:
+        character_record = character_storage.decode_character(data)
+    except (zlib.error, RecursionError) as e:
+        raise ValueError(f"Corrupt character data: {e}")
+    changed = character_upgrades.needs_upgrade(character_record)
+    character_upgrades.upgrade(character_record)
+    character_schema.check_record(character_record)
+    return character_record, changed
+
+def migrate_files(paths: List[str]) -> dict[str, Any]:
+    """Upgrade single-character files in place, each in its own format"""
+    stats = dict.fromkeys(COUNTERS, 0)
+    stats["failures"] = []
+    for path in paths:
+        stats["records"] += 1
+        try:
+            with open(path, 'rb') as f:
+                character_record, changed = upgraded_record(f.read())
+            if changed:
+                tmp_path = path + ".tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(character_storage.encode_character(character_record, character_storage.storage_format(path)))
+                os.replace(tmp_path, path)
+                stats["upgraded"] += 1
+        except (OSError, ValueError) as e:
+            stats["failed"] += 1
+            stats["failures"].append([path, str(e)])
+    return stats
+
+def migrate_bundle(path: str) -> dict[str, Any]:
+    """Rewrite a bundle if any record in it needs an upgrade (records already current keep their bytes)"""
+    stats = dict.fromkeys(COUNTERS, 0)
+    stats["failures"] = []
+    try:
+        index = character_storage.read_bundle_index(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+    except (OSError, ValueError) as e:
+        stats["failed"] += 1
+        stats["failures"].append([path, str(e)])
+        return stats
+
+    entries = []   # (character_id, bytes, header fields)
+    for character_id, (offset, length) in sorted(index.items(), key=lambda item: item[1][0]):
+        stats["records"] += 1
+        record_data = data[offset:offset + length]
+        try:
+            character_record, changed = upgraded_record(record_data)
+        except ValueError as e:
+            stats["failed"] += 1
+            stats["failures"].append([f"{path}#{character_id}", str(e)])
+            entries.append((character_id, record_data, character_storage.header_fields({})))
+            continue
+        if changed:
+            stats["upgraded"] += 1
+            record_data = character_storage.encode_character(character_record, "gzip")
+        entries.append((character_id, record_data, character_storage.header_fields(character_record)))
+
+    if stats["upgraded"]:
+        # A temporary file left by an interrupted run is incomplete
+        if os.path.exists(path + ".tmp"):
+            os.remove(path + ".tmp")
+        writer = character_storage.BundleWriter(path)
+        for character_id, record_data, fields in entries:
+            writer.add_packed(character_id, record_data, fields)
+        writer.close()
+        stats["bundles_rewritten"] = 1
+    return stats
+
+def run_task(kind: str, target) -> dict[str, Any]:
+    """Process pool task: migrate one bundle or one group of files"""
+    return migrate_bundle(target) if kind == "bundle" else migrate_files(target)
+
+# =============================================================================
+# MIGRATION
+# =============================================================================
+
+def read_checkpoint(path: str) -> dict[str, Any]:
+    """Tasks already done towards the current schema version (empty if none or stale)"""
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        checkpoint = None
+    if not isinstance(checkpoint, dict) or checkpoint.get("schema_version") != chargen.SCHEMA_VERSION:
+        return {"schema_version": chargen.SCHEMA_VERSION, "done": {}, "failures": []}
+    return checkpoint
+
+def write_checkpoint(path: str, checkpoint: dict[str, Any]) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def migrate_archive(characters_dir: str = "characters", max_workers: Optional[int] = None,
+                    on_progress: Optional[Callable[[dict[str, Any]], None]] = None,
+                    executor_factory=ProcessPoolExecutor) -> dict[str, Any]:
+    """
+    Upgrade every character in an archive to the current schema version,
+    resuming from the checkpoint of an interrupted run
+
+    Args:
+        characters_dir: Archive directory
+        max_workers: Process pool size (default: one per CPU)
+        on_progress: Called after each task with the progress so far (see the returns)
+        executor_factory: Executor class taking max_workers
+
+    Returns:
+        Dictionary with schema_version, tasks, tasks_done, resumed (tasks done by
+        earlier runs), records, upgraded, failed, bundles_rewritten, failures (the
+        first MAX_REPORTED_FAILURES as [location, error]) and manifest_rebuilt
+    """
+    checkpoint_path = os.path.join(characters_dir, CHECKPOINT_NAME)
+    checkpoint = read_checkpoint(checkpoint_path)
+    done = checkpoint["done"]
+    tasks = plan_tasks(characters_dir)
+    remaining = [task for task in tasks if task[0] not in done]
+    resumed = len(done)
+
+    def progress() -> dict[str, Any]:
+        totals = {counter: sum(counts[counter] for counts in done.values()) for counter in COUNTERS}
+        return {"schema_version": chargen.SCHEMA_VERSION, "tasks": resumed + len(remaining),
+                "tasks_done": len(done), "resumed": resumed, **totals}
+
+    def finish(key: str, stats: dict[str, Any]) -> None:
+        done[key] = {counter: stats[counter] for counter in COUNTERS}
+        room = MAX_REPORTED_FAILURES - len(checkpoint["failures"])
+        checkpoint["failures"] += stats["failures"][:max(room, 0)]
+        write_checkpoint(checkpoint_path, checkpoint)
+
+    if remaining:
+        with executor_factory(max_workers=max_workers) as executor:
+            futures = {executor.submit(run_task, kind, target): key for key, kind, target in remaining}
+            try:
+                for future in as_completed(futures):
+                    finish(futures[future], future.result())
+                    if on_progress:
+                        on_progress(progress())
+            except BaseException:
+                # Interrupted: tasks not started are dropped; those already running
+                # finish their rewrites, so their counts go into the checkpoint too
+                for future in futures:
+                    future.cancel()
+                for future, key in futures.items():
+                    if key not in done and not future.cancelled() and future.exception() is None:
+                        finish(key, future.result())
+                raise
+
+    result = progress()
+    result["failures"] = checkpoint["failures"]
+    result["manifest_rebuilt"] = result["bundles_rewritten"] > 0
+    if result["manifest_rebuilt"]:
+        character_archive.ArchiveManifest(characters_dir).rebuild(max_workers=max_workers)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Upgrade every archived character to the current schema version')
+    parser.add_argument('characters_dir', nargs='?', default='characters', help='Archive directory')
+    parser.add_argument('--workers', type=int, help='Process pool size (default: one per CPU)')
+    options = parser.parse_args()
+
+    def report(progress):
+        print(f"{progress['tasks_done']}/{progress['tasks']} tasks, {progress['records']} characters, "
+              f"{progress['upgraded']} upgraded, {progress['failed']} failed", file=sys.stderr, flush=True)
+
+    stats = migrate_archive(options.characters_dir, options.workers, report)
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Character Record Schema for Classic Traveller Character Generator
+
+Character files were trusted as they were read, so a damaged or hand-edited file
+only failed later, as a KeyError deep in check_commission or perform_mustering_out.
+This module declares the shape of a character record, of the objects nested in
+it, and of each career event type, and validates records against it when they
+are loaded.
+
+The declarations are compiled once, at import, into plain Python functions (two
+per object and event type) with every field check written out inline. A valid
+record only runs the first kind, which costs little more than a type() call per
+field and stops at the first problem; only then does the second kind walk the
+record again to report every failure as a (path, message) pair, with paths such
+as "career_history[3].roll".
+
+A field can also be limited to a set of values (the career is one of the
+services), and once a character has a career its characteristics must include
+all six, which the rules read without checking. Fields not declared are
+allowed, so records keep working as fields are added.
+Events of an undeclared type only need a string event_type. Records saved by
+older code are validated after character_upgrades has brought them up to date.
+
+Usage:
+    import character_schema
+
+    errors = character_schema.validate(character_record)   # [] if valid
+    character_schema.check_record(character_record)        # raises RecordValidationError
+"""
+
+from collections import namedtuple
+from typing import Any, Dict, List, Tuple
+
+import character_generation_rules as chargen
+
+NoneType = type(None)
+
+# items / values: the type(s) of a list's items or a dict's values, or the name of
+# an object schema (or EVENT) every item must match; choices: the values allowed
+# (besides None, where None is one of the types)
+Field = namedtuple("Field", ["types", "required", "items", "values", "choices"])
+
+# Name standing for career events in items: dispatched on event_type
+EVENT = "event"
+
+def required(*types, items=None, values=None, choices=None) -> Field:
+    return Field(types, True, items, values, choices)
+
+def optional(*types, items=None, values=None, choices=None) -> Field:
+    return Field(types, False, items, values, choices)
+
+SERVICES = tuple(chargen.get_available_services())
+
+# =============================================================================
+# DECLARED SCHEMA
+# =============================================================================
+
+OBJECT_SCHEMAS = {
+    "record": {
+        "schema_version": required(int),
+        "name": required(str),
+        "age": required(int),
+        "terms_served": required(int),
+        "current_term": required(int),
+        "characteristics": required(dict, values=(int,)),
+        "skills": required(dict, values=(int,)),
+        "career_history": required(list, items=EVENT),
+        "skill_roll_eligibility": required(int),
+        "survival_outcome": optional(str, NoneType),
+        "seed": required(int),
+        "random_state": optional(list, tuple, NoneType),
+        "current_phase": required(str),
+        "phase_history": required(list, items="phase"),
+        "rdy_for_survival_check": required(bool),
+        "rdy_for_commission_check": required(bool),
+        "rdy_for_promotion_check": required(bool),
+        "rdy_for_ageing_check": required(bool),
+        "rdy_for_reenlistment": required(bool),
+        "rdy_for_muster_out": optional(bool),
+        "character_id": optional(str),
+        "upp": optional(str),
+        "career": optional(str, NoneType, choices=SERVICES),
+        "service_choice": optional(str, choices=SERVICES),
+        "drafted": optional(bool),
+        "commissioned": optional(bool),
+        "rank": optional(int),
+        "career_status": optional(str),
+        "version": optional(int),
+        "mustering_out_benefits": optional(dict)
+    },
+    "phase": {
+        "phase_id": required(str),
+        "term": required(int),
+        "phase_number": required(int),
+        "phase_name": required(str),
+        "completed": required(bool),
+        "action": required(str)
+    },
+    "mustering_out_benefits": {
+        "cash": required(int),
+        "items": required(list, items=(str,)),
+        "characteristic_boosts": required(dict, values=(int,)),
+        "cash_roll_details": optional(list, items=(dict,)),
+        "benefit_roll_details": optional(list, items=(dict,))
+    }
+}
+# Objects nested under a record field rather than listed in items
+NESTED_OBJECTS = {("record", "mustering_out_benefits"): "mustering_out_benefits"}
+
+# Characteristics a character with a career must have (they are generated before enlisting)
+CAREER_CHARACTERISTICS = tuple(chargen.UPP_ORDER)
+
+# Fields every roll-against-target event carries
+ROLL_FIELDS = {
+    "roll": required(int),
+    "modifier": required(int),
+    "modifier_details": required(list, items=(str,)),
+    "total": required(int),
+    "success": required(bool),
+    "outcome": required(str)
+}
+MUSTERING_ROLL_FIELDS = {
+    "career": required(str),
+    "roll": required(int),
+    "modifier": required(int),
+    "total_roll": required(int),
+    "result": required(str)
+}
+
+EVENT_SCHEMAS = {
+    "enlistment_attempt": dict(ROLL_FIELDS, service=required(str), target=required(int),
+                               assigned_service=required(str)),
+    "survival_check": dict(ROLL_FIELDS, career=required(str), target=required(int, NoneType)),
+    "commission_check": dict(ROLL_FIELDS, career=required(str), applicable=required(bool),
+                             target=required(int), rank=required(int)),
+    "promotion_check": dict(ROLL_FIELDS, career=required(str), applicable=required(bool),
+                            current_rank=required(int), target=required(int), rank=required(int)),
+    "skill_resolution": {
+        "career": required(str),
+        "table_choice": required(str),
+        "roll": required(int),
+        "skill_gained": required(str),
+        "result_type": required(str),
+        "skill_eligibilities_remaining": required(int)
+    },
+    "ageing_check": {
+        "previous_age": required(int),
+        "current_age": required(int),
+        "age_increase": required(int),
+        "ageing_effects": required(list),
+        "total_effects": required(int)
+    },
+    "ageing_check_detail": {
+        "age": required(int),
+        "stat": required(str),
+        "roll": required(int),
+        "target": required(int),
+        "old_value": required(int),
+        "new_value": required(int),
+        "loss": required(int)
+    },
+    "reenlistment_attempt": {
+        "career": required(str),
+        "roll": required(int, NoneType),
+        "target": required(int, NoneType),
+        "outcome": required(str),
+        "continue_career": required(bool)
+    },
+    "mustering_out_cash_roll": dict(MUSTERING_ROLL_FIELDS, amount=required(int)),
+    "mustering_out_benefit_roll": dict(MUSTERING_ROLL_FIELDS, benefit=required(str)),
+    "mustering_out_characteristic_boost": {
+        "characteristic": required(str),
+        "boost": required(int),
+        "old_value": required(int),
+        "new_value": required(int)
+    },
+    "mustering_out_summary": {
+        "career": required(str),
+        "total_cash": required(int),
+        "items": required(list, items=(str,)),
+        "characteristic_boosts": required(dict, values=(int,))
+    },
+    "status_change": {
+        "from": required(str),
+        "to": required(str)
+    }
+}
+
+class RecordValidationError(ValueError):
+    """A character record does not match the schema; errors holds (path, message) pairs"""
+
+    def __init__(self, errors: List[Tuple[str, str]]):
+        self.errors = errors
+        path, message = errors[0]
+        more = f" (and {len(errors) - 1} more)" if len(errors) > 1 else ""
+        super().__init__(f"Invalid character record: {path or 'record'} {message}{more}")
+
+# =============================================================================
+# COMPILER
+# =============================================================================
+
+def _type_test(types: tuple, name: str) -> str:
+    """Expression that is true when the value in name does NOT have one of the types"""
+    # type() rather than isinstance so bools are not accepted as ints
+    tests = [f"{name} is not None" if t is NoneType else f"type({name}) is not {t.__name__}" for t in types]
+    return " and ".join(tests)
+
+def _type_names(types: tuple) -> str:
+    return " or ".join("null" if t is NoneType else t.__name__ for t in types)
+
+def _item_lines(spec, item_path: str, indent: str) -> List[str]:
+    """Check one list item or dict value held in 'item'"""
+    if isinstance(spec, str):
+        check = "_check_event" if spec == EVENT else f"_check_{spec}"
+        return [f"{indent}if type(item) is dict:",
+                f"{indent}    {check}(item, {item_path} + '.', errors)",
+                f"{indent}else:",
+                f"{indent}    errors.append(({item_path}, 'must be an object, not ' + type(item).__name__))"]
+    return [f"{indent}if {_type_test(spec, 'item')}:",
+            f"{indent}    errors.append(({item_path}, 'must be {_type_names(spec)}, not ' + type(item).__name__))"]
+
+def _fast_item_lines(spec, indent: str) -> List[str]:
+    """Fail fast on one list item or dict value held in 'item'"""
+    if isinstance(spec, str):
+        check = "_valid_event" if spec == EVENT else f"_valid_{spec}"
+        return [f"{indent}if type(item) is not dict or not {check}(item):",
+                f"{indent}    return False"]
+    return [f"{indent}if {_type_test(spec, 'item')}:",
+            f"{indent}    return False"]
+
+def _object_source(name: str, fields: Dict[str, Field], nested: Dict[str, str]) -> str:
+    """
+    Source of two functions for one object: _valid_<name>(obj) returns False at the
+    first problem, and _check_<name>(obj, prefix, errors) collects every problem
+    with its path. Valid records only ever run the first.
+    """
+    fast = [f"def _valid_{name}(obj):", "    get = obj.get"]
+    full = [f"def _check_{name}(obj, prefix, errors):", "    get = obj.get"]
+    for field, spec in fields.items():
+        path = f"prefix + {field!r}"
+        type_test = _type_test(spec.types, "value")
+        fast += [f"    value = get({field!r}, _MISSING)",
+                 "    if value is _MISSING:",
+                 "        return False" if spec.required else "        pass",
+                 f"    elif {type_test}:",
+                 "        return False"]
+        full += [f"    value = get({field!r}, _MISSING)",
+                 "    if value is _MISSING:",
+                 f"        errors.append(({path}, 'is required'))" if spec.required else "        pass",
+                 f"    elif {type_test}:",
+                 f"        errors.append(({path}, 'must be {_type_names(spec.types)}, not ' + type(value).__name__))"]
+        if spec.choices is not None:
+            choice_test = f"value not in {frozenset(spec.choices)!r}"
+            if NoneType in spec.types:
+                choice_test = "value is not None and " + choice_test
+            fast += [f"    elif {choice_test}:", "        return False"]
+            full += [f"    elif {choice_test}:",
+                     f"        errors.append(({path}, {'must be one of ' + ', '.join(spec.choices)!r}))"]
+        if field in nested:
+            fast += ["    elif not _valid_" + nested[field] + "(value):", "        return False"]
+            full += ["    else:", f"        _check_{nested[field]}(value, {path} + '.', errors)"]
+        elif spec.items is not None or spec.values is not None:
+            # Only containers of the declared container type are walked
+            if spec.items is not None:
+                container, loop, item_path = "list", "for item in value:", f"{path} + '[' + str(index) + ']'"
+                full_loop = "for index, item in enumerate(value):"
+            else:
+                container, loop, item_path = "dict", "for item in value.values():", f"{path} + '.' + str(key)"
+                full_loop = "for key, item in value.items():"
+            item_spec = spec.items if spec.items is not None else spec.values
+            fast += [f"    elif type(value) is {container}:", f"        {loop}"] + _fast_item_lines(item_spec, " " * 12)
+            full += [f"    elif type(value) is {container}:", f"        {full_loop}"] + _item_lines(item_spec, item_path, " " * 12)
+    fast.append("    return True")
+    return "\n".join(fast) + "\n\n" + "\n".join(full) + "\n"
+
+def _compile() -> Dict[str, Any]:
+    """Generate and compile the checking functions for every declared schema"""
+    sources = []
+    for name, fields in OBJECT_SCHEMAS.items():
+        nested = {field: target for (owner, field), target in NESTED_OBJECTS.items() if owner == name}
+        sources.append(_object_source(name, fields, nested))
+    for event_type, fields in EVENT_SCHEMAS.items():
+        sources.append(_object_source("event_" + event_type, fields, {}))
+    sources.append(
+        "def _valid_event(obj):\n"
+        "    event_type = obj.get('event_type')\n"
+        "    if type(event_type) is not str:\n"
+        "        return False\n"
+        "    valid = _EVENT_VALIDATORS.get(event_type)\n"
+        "    return valid is None or valid(obj)\n"
+        "\n"
+        "def _check_event(obj, prefix, errors):\n"
+        "    event_type = obj.get('event_type')\n"
+        "    if type(event_type) is not str:\n"
+        "        errors.append((prefix + 'event_type', 'must be str, not ' + type(event_type).__name__))\n"
+        "    elif event_type in _EVENT_CHECKS:\n"
+        "        _EVENT_CHECKS[event_type](obj, prefix, errors)\n")
+    namespace = {"_MISSING": object(), "_EVENT_VALIDATORS": {}, "_EVENT_CHECKS": {}}
+    exec(compile("\n".join(sources), "<character_schema>", "exec"), namespace)
+    for event_type in EVENT_SCHEMAS:
+        namespace["_EVENT_VALIDATORS"][event_type] = namespace["_valid_event_" + event_type]
+        namespace["_EVENT_CHECKS"][event_type] = namespace["_check_event_" + event_type]
+    return namespace
+
+_COMPILED = _compile()
+_valid_record = _COMPILED["_valid_record"]
+_check_record = _COMPILED["_check_record"]
+
+# =============================================================================
+# VALIDATION
+# =============================================================================
+
+def _career_errors(character_record: dict[str, Any]) -> List[Tuple[str, str]]:
+    """A character with a career has every characteristic"""
+    characteristics = character_record.get("characteristics")
+    if not character_record.get("career") or type(characteristics) is not dict:
+        return []
+    missing = [name for name in CAREER_CHARACTERISTICS if name not in characteristics]
+    if missing:
+        return [("characteristics", f"must include {', '.join(missing)} once the character has a career")]
+    return []
+
+def validate(character_record: Any) -> List[Tuple[str, str]]:
+    """
+    Check a character record against the schema
+
+    Returns:
+        (path, message) for every problem found; empty if the record is valid
+    """
+    if type(character_record) is not dict:
+        return [("", "must be an object, not " + type(character_record).__name__)]
+    if _valid_record(character_record):
+        return _career_errors(character_record)
+    errors = []
+    _check_record(character_record, "", errors)
+    return errors + _career_errors(character_record)
+
+def check_record(character_record: Any) -> dict[str, Any]:
+    """
+    Return the record if it matches the schema
+
+    Raises:
+        RecordValidationError: With the path of every problem found
+    """
+    errors = validate(character_record)
+    if errors:
+        raise RecordValidationError(errors)
+    return character_record
@@ -0,0 +1,688 @@
+#!/usr/bin/env python3
+"""
+Character Storage Formats for Classic Traveller Character Generator
+
+Archived characters used to be pretty-printed JSON files, one per character,
+with the full Mersenne Twister state embedded. That is large on disk and puts one
+inode per character in the characters directory. This module adds two denser
+formats next to the original one:
+
+- gzip: one compact JSON document per character, gzip-compressed with zlib
+  (<id>.json.gz, readable with zcat)
+- binary: one character in the compact binary format of character_binary
+  (<id>.trvc), about 40% of the size of compact JSON with the random generator
+  state included; not compressed further
+- bundle: many gzip-compressed characters concatenated into one file, followed
+  by an index of (offset, length) per character ID, so any one character can be
+  read with a single seek. pack_files bundles only finished characters, without
+  their random generator state; bulk imports (character_import) bundle every
+  character they import. Bundles are written once and never modified; a later
+  save of a bundled character goes to its own file, which takes precedence.
+
+Single-character files live in a two-level sharded layout, characters/ab/cd/<id>.*
+where abcd is a hash prefix of the ID, so no directory grows past a few hundred
+entries however large the archive gets. Files in the older flat layout
+(characters/<id>.*) are still found, and migrate_to_shards moves them.
+
+Bundle layout:
+    MAGIC | record 1 | record 2 | ... | index | headers | footer
+    index   = zlib-compressed JSON {character_id: [offset, length]}
+    headers = one fixed-width HEADER per character, in record order
+    footer  = index offset, index length, headers offset, count (uint64) + MAGIC
+
+BundleReader memory-maps a bundle and unpacks headers (UPP, career, rank, terms,
+age, cash) straight from the mapping with struct, so analytics over millions of
+characters touch only the header pages and decode a record only when asked.
+
+Usage:
+    import character_storage
+
+    path = character_storage.store_character("characters", "0000000001", character_record)
+    character_storage.read_character(character_storage.resolve_character_path("characters", "0000000001"))
+    character_storage.read_character("characters/bundle-000001.bundle", offset, length)
+
+    with character_storage.BundleReader("characters/bundle-000001.bundle") as reader:
+        navy_cash = sum(h[5] for h in reader.headers() if h[1] == character_storage.CAREER_CODES.index("Navy"))
+        reader.character(0)
+
+    python character_storage.py compress [characters_dir]
+    python character_storage.py pack [characters_dir] [bundle_size]
+    python character_storage.py shard [characters_dir] [workers]
+    python character_storage.py stats [characters_dir]
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import character_binary
+import character_generation_tables as tables
+import character_schema
+import character_upgrades
+
+# Storage format -> file extension for single-character files
+FORMAT_EXTENSIONS = {"json": ".json", "gzip": ".json.gz", "binary": ".trvc"}
+BUNDLE_EXTENSION = ".bundle"
+
+# Directory layouts for single-character files, in resolution order:
+# sharded puts characters/<id>.json.gz at characters/ab/cd/<id>.json.gz (ab, cd: hash prefix)
+LAYOUTS = ("sharded", "flat")
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+
+# Dice roll reports are written next to the character file and move with it
+DICE_REPORT_SUFFIX = "_dice_rolls.csv"
+
+COMPRESSION_LEVEL = 6
+GZIP_MAGIC = b"\x1f\x8b"
+# zlib window bits selecting the gzip container (31) and automatic header detection (47)
+GZIP_WBITS = 31
+AUTO_WBITS = 47
+
+BUNDLE_MAGIC = b"TRVBNDL2"
+BUNDLE_FOOTER = struct.Struct("<QQQQ8s")
+# First bundle version: no header table
+BUNDLE_V1_MAGIC = b"TRVBNDL1"
+BUNDLE_V1_FOOTER = struct.Struct("<QQ8s")
+
+# Fixed-width header per bundled character, read without decoding the record:
+# UPP (6 ASCII characters), career code, rank, terms, age, cash, record offset, record length
+HEADER = struct.Struct("<6sBBBBIQI")
+HEADER_FIELDS = ["upp", "career", "rank", "terms", "age", "cash", "offset", "length"]
+BundleHeader = namedtuple("BundleHeader", HEADER_FIELDS)
+
+# Career code in a header -> service (0: none)
+CAREER_CODES = [None] + tables.get_service_list()
+
+# Characters per bundle written by pack_files
+DEFAULT_BUNDLE_SIZE = 10000
+
+# Dropped when a finished character is bundled: no more dice are rolled after mustering
+# out, and the generator state (most of a compressed character) is reproducible from
+# the seed. Bulk generation leaves it out of finished characters for the same reason.
+BUNDLE_DROPPED_FIELDS = ("random_state",)
+
+# =============================================================================
+# SINGLE CHARACTERS
+# =============================================================================
+
+def storage_format(path: str) -> Optional[str]:
+    """Format of a character file from its extension (None if not a character file)"""
+    # Check the longest extension first: ".json.gz" also ends in ".gz", not ".json"
+    for fmt, extension in sorted(FORMAT_EXTENSIONS.items(), key=lambda item: -len(item[1])):
+        if path.endswith(extension):
+            return fmt
+    return None
+
+def strip_extension(path: str) -> str:
+    """Path without its character file extension (characters/<id>)"""
+    fmt = storage_format(path)
+    return path[:-len(FORMAT_EXTENSIONS[fmt])] if fmt else os.path.splitext(path)[0]
+
+def encode_character(character_record: dict[str, Any], fmt: str = "gzip", text: Optional[str] = None) -> bytes:
+    """
+    Serialize a character in the given format
+
+    Args:
+        text: The record already encoded as compact JSON (used by the gzip format)
+    """
+    if fmt == "json":
+        return json.dumps(character_record, indent=2).encode("utf-8")
+    if fmt == "binary":
+        return character_binary.encode(character_record)
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+    if text is None:
+        text = json.dumps(character_record, separators=(',', ':'))
+    data = text.encode("utf-8")
+    return compressor.compress(data) + compressor.flush()
+
+def decode_character(data: bytes) -> dict[str, Any]:
+    """Parse a character in any format (gzip and binary are recognised by their magic bytes)"""
+    if data[:2] == GZIP_MAGIC:
+        data = zlib.decompress(data, AUTO_WBITS)
+    if character_binary.is_binary(data):
+        return character_binary.decode(data)
+    return json.loads(data)
+
+def save_character(path: str, character_record: dict[str, Any], text: Optional[str] = None) -> None:
+    """
+    Write a character file in the format its extension names, removing any copy
+    of the same character stored in another format (text: see encode_character)
+
+    The file is written beside its destination and renamed over it, so readers
+    (other workers, the cache) see the old file or the new one, never a partial one.
+    """
+    fmt = storage_format(path)
+    if fmt is None:
+        raise ValueError(f"Not a character file path: {path}")
+    data = encode_character(character_record, fmt, text)
+    # Unique per writer: two workers may save the same character at once
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    base = strip_extension(path)
+    for other_fmt, extension in FORMAT_EXTENSIONS.items():
+        if other_fmt != fmt and os.path.exists(base + extension):
+            os.remove(base + extension)
+
+def read_character(path: str, offset: Optional[int] = None, length: Optional[int] = None) -> dict[str, Any]:
+    """
+    Read a character from its own file, or from a bundle at (offset, length)
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the data is not a character
+    """
+    with open(path, 'rb') as f:
+        if offset is None:
+            data = f.read()
+        else:
+            f.seek(offset)
+            data = f.read(length)
+    try:
+        return decode_character(data)
+    except zlib.error as e:
+        raise ValueError(f"Corrupt character data in {path}: {e}")
+
+# =============================================================================
+# READ-THROUGH CACHE
+# =============================================================================
+
+class CharacterCache:
+    """
+    Bounded read-through cache of decoded characters, keyed by (path, offset).
+    Every lookup stats the file and re-reads it if its mtime or size changed, so
+    a character saved by any worker is never served stale. Records are upgraded
+    (character_upgrades) and checked against character_schema when they are
+    read, so hits cost neither.
+    Entries are weighed by their decoded JSON size and the least recently used
+    are evicted past max_bytes. Returned records are shared: copy them before modifying.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # (path, offset) -> (mtime_ns, size, nbytes, record)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, path: str, offset: Optional[int] = None, length: Optional[int] = None) -> dict[str, Any]:
+        """
+        Read a character (see read_character), from memory if the file is unchanged
+
+        Raises:
+            OSError: If the file cannot be read
+            ValueError: If the data is not a character, or has a newer schema version
+            character_schema.RecordValidationError: If the record does not match the schema
+        """
+        key = (path, offset)
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[:2] == (stat.st_mtime_ns, stat.st_size):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[3]
+                self._remove(key)
+                self.invalidations += 1
+            self.misses += 1
+
+        with open(path, 'rb') as f:
+            f.seek(offset or 0)
+            data = f.read() if offset is None else f.read(length)
+        if data[:2] == GZIP_MAGIC:
+            try:
+                data = zlib.decompress(data, AUTO_WBITS)
+            except zlib.error as e:
+                raise ValueError(f"Corrupt character data in {path}: {e}")
+        record = character_binary.decode(data) if character_binary.is_binary(data) else json.loads(data)
+        character_schema.check_record(character_upgrades.upgrade(record))
+
+        if len(data) <= self.max_bytes:
+            with self._lock:
+                if key in self._entries:
+                    self._remove(key)
+                self._entries[key] = (stat.st_mtime_ns, stat.st_size, len(data), record)
+                self._bytes += len(data)
+                while self._bytes > self.max_bytes:
+                    self._remove(next(iter(self._entries)))
+                    self.evictions += 1
+        return record
+
+    def _remove(self, key: tuple) -> None:
+        self._bytes -= self._entries.pop(key)[2]
+
+    def stats(self) -> dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes
+            }
+
+# =============================================================================
+# DIRECTORY LAYOUT
+# =============================================================================
+
+def shard_path(characters_dir: str, character_key: str) -> str:
+    """Two-level shard directory for a character: characters/ab/cd from a hash of its ID"""
+    digest = hashlib.sha256(character_key.encode("utf-8")).hexdigest()
+    return os.path.join(characters_dir, *(digest[level * SHARD_WIDTH:(level + 1) * SHARD_WIDTH]
+                                          for level in range(SHARD_LEVELS)))
+
+def character_file_path(characters_dir: str, character_key: str, fmt: str = "gzip",
+                        layout: str = "sharded") -> str:
+    """Where a character's own file goes in the given format and layout"""
+    directory = shard_path(characters_dir, character_key) if layout == "sharded" else characters_dir
+    return os.path.join(directory, character_key + FORMAT_EXTENSIONS[fmt])
+
+def candidate_paths(characters_dir: str, character_key: str) -> List[str]:
+    """Every place a character's own file can be, in resolution order (sharded first)"""
+    return [character_file_path(characters_dir, character_key, fmt, layout)
+            for layout in LAYOUTS for fmt in FORMAT_EXTENSIONS]
+
+def resolve_character_path(characters_dir: str, character_key: str) -> Optional[str]:
+    """Find a character's own file in either layout and either format (None if it has none)"""
+    for path in candidate_paths(characters_dir, character_key):
+        if os.path.exists(path):
+            return path
+    return None
+
+def store_character(characters_dir: str, character_key: str, character_record: dict[str, Any],
+                    fmt: str = "gzip", layout: str = "sharded", text: Optional[str] = None) -> str:
+    """
+    Save a character in the given format and layout and remove any older copy
+    stored in another format or layout (text: see encode_character)
+
+    Returns:
+        The path written
+    """
+    path = character_file_path(characters_dir, character_key, fmt, layout)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    save_character(path, character_record, text)
+    for other_path in candidate_paths(characters_dir, character_key):
+        if other_path != path and os.path.exists(other_path):
+            os.remove(other_path)
+    return path
+
+def is_shard_name(name: str) -> bool:
+    return len(name) == SHARD_WIDTH and all(c in "0123456789abcdef" for c in name)
+
+def shard_directories(characters_dir: str) -> List[str]:
+    """Leaf shard directories that exist under characters_dir"""
+    directories = [characters_dir]
+    for _ in range(SHARD_LEVELS):
+        children = []
+        for directory in directories:
+            try:
+                children += [entry.path for entry in os.scandir(directory)
+                             if entry.is_dir() and is_shard_name(entry.name)]
+            except FileNotFoundError:
+                continue
+        directories = children
+    return sorted(directories)
+
+def list_archive(characters_dir: str) -> Tuple[List[str], List[str]]:
+    """
+    Character bundles and single-character files under a directory
+
+    Returns:
+        (bundle paths sorted by name, character file paths): flat files come first
+        and sharded files after them, so that a sharded copy takes precedence
+    """
+    bundles, flat_files, sharded_files = [], [], []
+    try:
+        entries = list(os.scandir(characters_dir))
+    except FileNotFoundError:
+        return bundles, flat_files
+    for entry in entries:
+        if entry.name.endswith(BUNDLE_EXTENSION):
+            bundles.append(entry.path)
+        elif storage_format(entry.name) and entry.is_file():
+            flat_files.append(entry.path)
+    for directory in shard_directories(characters_dir):
+        sharded_files += sorted(entry.path for entry in os.scandir(directory)
+                                if storage_format(entry.name) and entry.is_file())
+    return sorted(bundles), sorted(flat_files) + sharded_files
+
+# =============================================================================
+# BUNDLES
+# =============================================================================
+
+class BundleWriter:
+    """Write a bundle: add() compressed characters, then close() appends the index and headers"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._tmp_path = path + ".tmp"
+        # Exclusive: two writers must never share a bundle (see open_bundle_writer)
+        self._file = open(self._tmp_path, 'xb')
+        self._file.write(BUNDLE_MAGIC)
+        self.index = {}
+        self._headers = bytearray()
+
+    def add(self, character_id: str, data: bytes, character_record: dict[str, Any]) -> Tuple[int, int]:
+        """Append one encoded character and its fixed-width header; returns its (offset, length)"""
+        return self.add_packed(character_id, data, header_fields(character_record))
+
+    def add_packed(self, character_id: str, data: bytes, fields: tuple) -> Tuple[int, int]:
+        """add() with the header fields already extracted (see header_fields)"""
+        if character_id in self.index:
+            raise ValueError(f"Character {character_id} is already in this bundle")
+        offset = self._file.tell()
+        self._file.write(data)
+        self.index[character_id] = [offset, len(data)]
+        self._headers += HEADER.pack(*fields, offset, len(data))
+        return offset, len(data)
+
+    def close(self) -> None:
+        index = zlib.compress(json.dumps(self.index, separators=(',', ':')).encode("utf-8"))
+        index_offset = self._file.tell()
+        self._file.write(index)
+        headers_offset = self._file.tell()
+        self._file.write(self._headers)
+        self._file.write(BUNDLE_FOOTER.pack(index_offset, len(index), headers_offset, len(self.index), BUNDLE_MAGIC))
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        """Discard the bundle being written"""
+        self._file.close()
+        os.remove(self._tmp_path)
+
+def header_fields(character_record: dict[str, Any]) -> tuple:
+    """Header fields before offset and length (numbers clamped to their field widths)"""
+    benefits = character_record.get("mustering_out_benefits") or {}
+    career = character_record.get("career")
+    return (
+        (character_record.get("upp") or "______").encode("ascii", "replace")[:6],
+        CAREER_CODES.index(career) if career in CAREER_CODES else 0,
+        min(character_record.get("rank") or 0, 255),
+        min(character_record.get("terms_served") or 0, 255),
+        min(character_record.get("age") or 0, 255),
+        min(benefits.get("cash") or 0, 0xFFFFFFFF)
+    )
+
+def pack_header(character_record: dict[str, Any], offset: int, length: int) -> bytes:
+    """Fixed-width header for a bundled character"""
+    return HEADER.pack(*header_fields(character_record), offset, length)
+
+def read_bundle_footer(f) -> tuple:
+    """
+    (index offset, index length, headers offset, character count) from an open bundle.
+    Version 1 bundles have no header table: headers offset and count are None.
+    """
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    if size < len(BUNDLE_MAGIC) + BUNDLE_V1_FOOTER.size:
+        raise ValueError(f"{f.name} is not a character bundle")
+    f.seek(-len(BUNDLE_MAGIC), os.SEEK_END)
+    magic = f.read(len(BUNDLE_MAGIC))
+    if magic == BUNDLE_V1_MAGIC:
+        f.seek(-BUNDLE_V1_FOOTER.size, os.SEEK_END)
+        index_offset, index_length, _ = BUNDLE_V1_FOOTER.unpack(f.read(BUNDLE_V1_FOOTER.size))
+        return index_offset, index_length, None, None
+    if magic != BUNDLE_MAGIC or size < len(BUNDLE_MAGIC) + BUNDLE_FOOTER.size:
+        raise ValueError(f"{f.name} is not a character bundle")
+    f.seek(-BUNDLE_FOOTER.size, os.SEEK_END)
+    index_offset, index_length, headers_offset, count, _ = BUNDLE_FOOTER.unpack(f.read(BUNDLE_FOOTER.size))
+    return index_offset, index_length, headers_offset, count
+
+def read_bundle_index(path: str) -> Dict[str, List[int]]:
+    """
+    Read a bundle's index: character_id -> [offset, length], in bundle order
+
+    Raises:
+        ValueError: If the file is not a complete bundle
+    """
+    with open(path, 'rb') as f:
+        index_offset, index_length, _, _ = read_bundle_footer(f)
+        f.seek(index_offset)
+        return json.loads(zlib.decompress(f.read(index_length)))
+
+class BundleReader:
+    """
+    Memory-mapped view of a bundle. Headers are unpacked straight from the mapping
+    (only their pages are read); full records are decoded only when asked for.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._index_offset, self._index_length, headers_offset, self.count = read_bundle_footer(f)
+            if headers_offset is None:
+                raise ValueError(f"{path} has no header table (version 1 bundle); read it with read_bundle_index")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self._headers = self._view[headers_offset:headers_offset + self.count * HEADER.size]
+        self._ids = None
+        self._positions = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def header(self, position: int) -> BundleHeader:
+        """Header of the character at a position in the bundle"""
+        if not 0 <= position < self.count:
+            raise IndexError(position)
+        return BundleHeader(*HEADER.unpack_from(self._headers, position * HEADER.size))
+
+    def headers(self) -> Iterator[tuple]:
+        """Raw header tuples (see HEADER_FIELDS) for every character, in bundle order"""
+        return HEADER.iter_unpack(self._headers)
+
+    def character(self, position: int) -> dict[str, Any]:
+        """Decode the full record of the character at a position"""
+        header = self.header(position)
+        return decode_character(self._view[header.offset:header.offset + header.length])
+
+    def ids(self) -> List[str]:
+        """Character IDs in bundle order (the index is read on first use)"""
+        if self._ids is None:
+            index = zlib.decompress(self._view[self._index_offset:self._index_offset + self._index_length])
+            self._ids = list(json.loads(index))
+            self._positions = {character_id: position for position, character_id in enumerate(self._ids)}
+        return self._ids
+
+    def get(self, character_id: str) -> Optional[dict[str, Any]]:
+        """Decode one character by ID (None if it is not in this bundle)"""
+        self.ids()
+        position = self._positions.get(character_id)
+        return None if position is None else self.character(position)
+
+    def close(self) -> None:
+        self._headers.release()
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def scan_headers(characters_dir: str) -> Iterator[tuple]:
+    """
+    Every bundled character's header in a directory, without decoding any records
+
+    Yields:
+        (bundle path, position, header tuple in HEADER_FIELDS order)
+    """
+    for path in list_archive(characters_dir)[0]:
+        with BundleReader(path) as reader:
+            for position, header in enumerate(reader.headers()):
+                yield path, position, header
+
+# =============================================================================
+# CONVERTERS
+# =============================================================================
+
+def compress_files(characters_dir: str) -> dict[str, int]:
+    """Convert every .json character file (in either layout) to .json.gz in place"""
+    stats = {"converted": 0, "bytes_before": 0, "bytes_after": 0}
+    for path in list_archive(characters_dir)[1]:
+        if storage_format(path) != "json":
+            continue
+        try:
+            character_record = read_character(path)
+        except (OSError, ValueError):
+            continue
+        new_path = strip_extension(path) + FORMAT_EXTENSIONS["gzip"]
+        stats["bytes_before"] += os.path.getsize(path)
+        save_character(new_path, character_record)
+        stats["bytes_after"] += os.path.getsize(new_path)
+        stats["converted"] += 1
+    return stats
+
+def next_bundle_path(characters_dir: str) -> str:
+    """Path for a new bundle, numbered after every bundle present or being written"""
+    try:
+        names = os.listdir(characters_dir)
+    except FileNotFoundError:
+        names = []
+    numbers = [int(name[7:13]) for name in names
+               if name.startswith("bundle-") and name[7:13].isdigit()
+               and (name.endswith(BUNDLE_EXTENSION) or name.endswith(BUNDLE_EXTENSION + ".tmp"))]
+    return os.path.join(characters_dir, f"bundle-{max(numbers, default=0) + 1:06d}{BUNDLE_EXTENSION}")
+
+def open_bundle_writer(characters_dir: str) -> "BundleWriter":
+    """Start the next bundle; a number claimed by a concurrent writer is skipped"""
+    os.makedirs(characters_dir, exist_ok=True)
+    while True:
+        try:
+            return BundleWriter(next_bundle_path(characters_dir))
+        except FileExistsError:
+            continue
+
+def pack_files(characters_dir: str, bundle_size: int = DEFAULT_BUNDLE_SIZE) -> dict[str, int]:
+    """
+    Move finished (mustered-out) characters from their own files into bundles.
+    Characters still in play stay in their files, since the server rewrites them.
+    """
+    stats = {"packed": 0, "bundles": 0, "bytes_before": 0, "bytes_after": 0}
+    writer = None
+    packed_paths = []
+
+    def finish_bundle():
+        writer.close()
+        stats["bundles"] += 1
+        stats["bytes_after"] += os.path.getsize(writer.path)
+        for packed_path in packed_paths:
+            os.remove(packed_path)
+        packed_paths.clear()
+
+    for path in list_archive(characters_dir)[1]:
+        try:
+            character_record = read_character(path)
+        except (OSError, ValueError):
+            continue
+        if not isinstance(character_record, dict) or not character_record.get("mustering_out_benefits"):
+            continue
+        if writer is None:
+            writer = open_bundle_writer(characters_dir)
+        character_id = character_record.get("character_id") or os.path.basename(strip_extension(path))
+        packed_record = {key: value for key, value in character_record.items() if key not in BUNDLE_DROPPED_FIELDS}
+        writer.add(character_id, encode_character(packed_record, "gzip"), packed_record)
+        stats["bytes_before"] += os.path.getsize(path)
+        stats["packed"] += 1
+        packed_paths.append(path)
+        if len(writer.index) >= bundle_size:
+            finish_bundle()
+            writer = None
+    if writer is not None:
+        finish_bundle()
+    return stats
+
+def migrate_to_shards(characters_dir: str, max_workers: int = 8) -> dict[str, int]:
+    """
+    Move flat characters/<id>.* files (and their dice roll reports) into the sharded
+    layout, several renames at a time. Safe to re-run; a file already present in
+    its shard is newer and is kept.
+    """
+    try:
+        entries = [entry for entry in os.scandir(characters_dir) if entry.is_file()]
+    except FileNotFoundError:
+        return {"moved": 0, "skipped": 0}
+    moves = []
+    for entry in entries:
+        if storage_format(entry.name):
+            key = os.path.basename(strip_extension(entry.name))
+        elif entry.name.endswith(DICE_REPORT_SUFFIX):
+            key = entry.name[:-len(DICE_REPORT_SUFFIX)]
+        else:
+            continue
+        moves.append((entry.path, os.path.join(shard_path(characters_dir, key), entry.name)))
+
+    def move(paths):
+        source, target = paths
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.exists(target):
+            os.remove(source)
+            return False
+        os.rename(source, target)
+        return True
+
+    # Renames are filesystem calls that release the GIL, so threads run them in parallel
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        moved = sum(executor.map(move, moves))
+    return {"moved": moved, "skipped": len(moves) - moved}
+
+def archive_stats(characters_dir: str) -> dict[str, int]:
+    """Files, bundles and bytes used by the archive"""
+    bundles, files = list_archive(characters_dir)
+    return {
+        "files": len(files),
+        "bundles": len(bundles),
+        "bundled_characters": sum(len(read_bundle_index(path)) for path in bundles),
+        "bytes": sum(os.path.getsize(path) for path in bundles + files)
+    }
+
+def main():
+    commands = ("compress", "pack", "shard", "stats")
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print("Usage: python character_storage.py compress|pack|shard|stats [characters_dir] [bundle_size|workers]")
+        sys.exit(1)
+    command = sys.argv[1]
+    characters_dir = sys.argv[2] if len(sys.argv) > 2 else "characters"
+    if command == "compress":
+        stats = compress_files(characters_dir)
+    elif command == "pack":
+        stats = pack_files(characters_dir, int(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_BUNDLE_SIZE)
+    elif command == "shard":
+        stats = migrate_to_shards(characters_dir, int(sys.argv[3]) if len(sys.argv) > 3 else 8)
+    else:
+        stats = archive_stats(characters_dir)
+    print(json.dumps(stats, indent=2))
+    if command != "stats":
+        # File paths changed: re-index the archive so the manifest points at the new locations
+        import character_archive
+        count = character_archive.ArchiveManifest(characters_dir).rebuild()
+        print(f"Rebuilt manifest with {count} characters")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Character Record Upgrades for Classic Traveller Character Generator
+
+The meaning of record fields has shifted over time: current_term used to be a
+structure before it became a plain term number, and the rdy_for_* readiness
+flags replaced older state that the rules engine no longer reads. Records now
+carry a schema_version (character_generation_rules.SCHEMA_VERSION for new ones;
+records without one are version 0), and this module holds the registry of steps
+that bring an older record up to date, one version at a time.
+
+Records are upgraded lazily, when they are loaded (character cache, archive
+manifest, shared state store, bulk import), so older archives keep working
+without being rewritten; character_migration rewrites a whole archive offline.
+Each step only touches what its version lacks, so a record that already has the
+newer shape passes through unchanged.
+Records are upgraded before they are validated, so steps treat fields of the
+wrong type as missing. A record that still cannot be upgraded raises
+character_schema.RecordValidationError and is left as it was.
+
+To change the record layout: bump SCHEMA_VERSION in the rules module and
+register a step for the previous version here with @upgrade_step.
+
+Usage:
+    import character_upgrades
+
+    character_upgrades.needs_upgrade(character_record)    # True for older records
+    character_upgrades.upgrade(character_record)          # upgraded in place and returned
+"""
+
+from typing import Any, Callable, Dict
+
+import character_generation_rules as chargen
+import character_schema
+
+VERSION_FIELD = "schema_version"
+
+# Readiness flags every record in play carries (rdy_for_muster_out is only set when due)
+READINESS_FLAGS = ("rdy_for_survival_check", "rdy_for_commission_check", "rdy_for_promotion_check",
+                   "rdy_for_ageing_check", "rdy_for_reenlistment")
+
+# Version -> function upgrading a record from that version to the next
+UPGRADES: Dict[int, Callable[[dict[str, Any]], None]] = {}
+
+def upgrade_step(from_version: int):
+    """Register a function that upgrades a record in place from from_version to from_version + 1"""
+    def register(function):
+        if from_version in UPGRADES:
+            raise ValueError(f"An upgrade from schema version {from_version} is already registered")
+        UPGRADES[from_version] = function
+        return function
+    return register
+
+# =============================================================================
+# UPGRADE STEPS
+# =============================================================================
+
+@upgrade_step(0)
+def term_number_fields(character_record: dict[str, Any]) -> None:
+    """current_term becomes the 1-based term number; survival_outcome no longer says "pending" """
+    if type(character_record.get("current_term")) is not int:
+        terms_served = character_record.get("terms_served")
+        character_record["current_term"] = (terms_served if type(terms_served) is int else 0) + 1
+    if character_record.get("survival_outcome") == "pending":
+        character_record["survival_outcome"] = None
+
+@upgrade_step(1)
+def readiness_flags(character_record: dict[str, Any]) -> None:
+    """Records saved before the rdy_for_* flags get them, worked out as the rules would have set them"""
+    if any(flag in character_record for flag in READINESS_FLAGS):
+        return
+    character_record.update(derive_readiness(character_record))
+
+def derive_readiness(character_record: dict[str, Any]) -> dict[str, bool]:
+    """
+    Readiness flags for a record from its last career event (see the check_* rules).
+    Fields of the wrong type count as missing; validation reports them afterwards.
+    """
+    flags = dict.fromkeys(READINESS_FLAGS, False)
+    if character_record.get("mustering_out_benefits"):
+        flags["rdy_for_muster_out"] = False
+        return flags
+    history = character_record.get("career_history")
+    if not isinstance(history, list):
+        history = []
+    # Status changes and per-characteristic ageing details follow the event that set the flags
+    events = [event for event in history if isinstance(event, dict)
+              and event.get("event_type") not in ("status_change", "ageing_check_detail")]
+    last = events[-1] if events else {}
+    event_type = last.get("event_type")
+    eligibility = character_record.get("skill_roll_eligibility")
+    skills_pending = type(eligibility) is int and eligibility > 0
+    career = character_record.get("career")
+    # The rules tables are only looked up for a known service with well-formed fields
+    rules_apply = (career in chargen.get_available_services()
+                   and type(character_record.get("rank", 0)) in (int, type(None))
+                   and isinstance(character_record.get("characteristics", {}), dict))
+    # After a promotion check, or a survival that leads to no check, skills come next: no flag
+
+    if not career or event_type == "enlistment_attempt":
+        flags["rdy_for_survival_check"] = True
+    elif event_type == "survival_check":
+        if not last.get("success"):
+            flags["rdy_for_ageing_check"] = True
+        elif career in ("Scouts", "Others") or not rules_apply:
+            pass    # straight on to skills
+        elif not character_record.get("commissioned"):
+            flags["rdy_for_commission_check"] = chargen.get_commission_requirements(character_record)[0] is not None
+        else:
+            flags["rdy_for_promotion_check"] = chargen.get_promotion_requirements(character_record)[0] is not None
+    elif event_type == "commission_check":
+        flags["rdy_for_promotion_check"] = bool(last.get("success"))
+    elif event_type == "skill_resolution":
+        flags["rdy_for_ageing_check"] = not skills_pending
+    elif event_type == "ageing_check":
+        flags["rdy_for_reenlistment"] = True
+    elif event_type == "reenlistment_attempt":
+        if last.get("continue_career"):
+            flags["rdy_for_survival_check"] = True
+        else:
+            flags["rdy_for_muster_out"] = True
+    return flags
+
+# =============================================================================
+# UPGRADING
+# =============================================================================
+
+def record_version(character_record: dict[str, Any]) -> int:
+    """
+    Schema version of a record (0 if it has none)
+
+    Raises:
+        character_schema.RecordValidationError: If the version is not a whole
+            number, or is newer than this code
+    """
+    version = character_record.get(VERSION_FIELD, 0)
+    if type(version) is not int or version < 0:
+        raise character_schema.RecordValidationError([(VERSION_FIELD, f"is not a valid version: {version!r}")])
+    if version > chargen.SCHEMA_VERSION:
+        raise character_schema.RecordValidationError(
+            [(VERSION_FIELD, f"{version} is newer than this server's {chargen.SCHEMA_VERSION}")])
+    return version
+
+def needs_upgrade(character_record: Any) -> bool:
+    return isinstance(character_record, dict) and character_record.get(VERSION_FIELD) != chargen.SCHEMA_VERSION
+
+def upgrade(character_record: Any) -> Any:
+    """
+    Bring a record up to the current schema version, in place (anything but a dict
+    is returned as it is, for validation to reject). The steps run on a copy, so a
+    record that cannot be upgraded is left as it was.
+
+    Returns:
+        The record
+
+    Raises:
+        character_schema.RecordValidationError: If the record's version is invalid
+            or newer than this code, or a step fails on a malformed record
+    """
+    if not needs_upgrade(character_record):
+        return character_record
+    version = record_version(character_record)
+    # Steps only set top-level fields, so a shallow copy keeps the record untouched until all succeed
+    upgraded = dict(character_record)
+    while version < chargen.SCHEMA_VERSION:
+        try:
+            UPGRADES[version](upgraded)
+        except Exception as e:
+            raise character_schema.RecordValidationError(
+                [("", f"cannot be upgraded from {VERSION_FIELD} {version}: {type(e).__name__}: {e}")])
+        version += 1
+        upgraded[VERSION_FIELD] = version
+    character_record.update(upgraded)
+    return character_record
+
+# Every version before the current one needs a step
+_unregistered = [version for version in range(chargen.SCHEMA_VERSION) if version not in UPGRADES]
+if _unregistered:
+    raise ImportError(f"No upgrade registered from schema version {_unregistered[0]}")
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Dice Roll Reports for Classic Traveller Character Generator
+
+A dice roll report lists every roll a character made, one CSV row per career
+event that carries a roll: term, event, target, modifiers, total, success and
+outcome. The report used to be written to a file next to the character's
+archive file and read back from there. This module builds the rows straight
+from the record and yields the CSV text as it goes, so a report can be streamed
+to a client with no temporary file, and it exports the roll log of a whole
+archive, or a filtered part of it, into one CSV file.
+
+An archive export takes the characters the manifest selects (the same filters
+and skill queries as /api/archive) in ID order and splits them into chunks. A
+process pool reads each chunk's characters and formats their rows; the parent
+writes the chunks back in order, with a bounded number in flight, so the output
+is the same for any worker count and memory stays flat however large the
+archive. Each row of an archive export starts with the character's ID; the
+per-character summary row of the single-character report is left out.
+
+Usage:
+    import dice_report
+
+    for text in dice_report.iter_report(character_record):     # CSV text, header first
+        ...
+    dice_report.write_report(character_record, "0000000001_dice_rolls.csv")
+    stats = dice_report.export_archive(manifest, "rolls.csv", {"career": "Navy"}, max_workers=8)
+
+    python dice_report.py rolls.csv [characters_dir] [--career Navy] [--q "Pilot-2"] [--workers N]
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterator, List, Optional
+
+import character_archive
+import character_storage
+import character_upgrades
+import skill_index
+
+REPORT_FIELDS = (
+    'Roll_Number',
+    'Character_Name',
+    'Character_Seed',
+    'Term',
+    'Event_Type',
+    'Action_Description',
+    'Roll_Result',
+    'Target_Number',
+    'Modifier',
+    'Modifier_Details',
+    'Total_Roll',
+    'Success',
+    'Outcome',
+    'Career_At_Time'
+)
+ARCHIVE_FIELDS = ('Character_ID',) + REPORT_FIELDS
+
+# Readable descriptions of event types (enlistment and ageing details name their service or stat)
+EVENT_DESCRIPTIONS = {
+    'survival_check': "Survival",
+    'commission_check': "Commission",
+    'promotion_check': "Promotion",
+    'reenlistment_attempt': "Reenlistment",
+    'skill_resolution': "Skill Roll",
+    'mustering_out_cash_roll': "Mustering Out (Cash)",
+    'mustering_out_benefit_roll': "Mustering Out (Benefit)"
+}
+
+# Rows formatted before the CSV text is yielded
+ROWS_PER_CHUNK = 500
+# Characters per process pool task in an archive export
+CHUNK_SIZE = 200
+# Characters that could not be read, reported individually (all are counted)
+MAX_REPORTED_FAILURES = 100
+
+# =============================================================================
+# ROWS
+# =============================================================================
+
+def describe_event(event: dict[str, Any], event_type: str) -> str:
+    if event_type == 'enlistment_attempt':
+        return f"Enlistment ({event.get('service', 'Unknown')})"
+    if event_type == 'ageing_check_detail':
+        return f"Ageing Check ({event.get('stat', 'Unknown')})"
+    description = EVENT_DESCRIPTIONS.get(event_type)
+    return description if description is not None else event_type.replace('_', ' ').title()
+
+def describe_outcome(event: dict[str, Any], event_type: str, success: bool) -> str:
+    if event_type == 'enlistment_attempt':
+        if success:
+            return f"Enlisted in {event.get('assigned_service', 'Unknown')}"
+        return f"Drafted into {event.get('assigned_service', 'Unknown')}"
+    if event_type == 'survival_check':
+        return "Survived" if success else "Injured"
+    if event_type == 'commission_check':
+        return f"Commissioned (Rank {event.get('rank', 1)})" if success else "Commission denied"
+    if event_type == 'promotion_check':
+        return f"Promoted to Rank {event.get('rank', 0)}" if success else "Promotion denied"
+    if event_type == 'reenlistment_attempt':
+        return event.get('status_text', 'Unknown outcome')
+    if event_type == 'skill_resolution':
+        return f"Gained: {event.get('skill_gained', 'Unknown skill')}"
+    if event_type == 'mustering_out_cash_roll':
+        return f"Received Cr{event.get('amount', 0):,}"
+    if event_type == 'mustering_out_benefit_roll':
+        return f"Received: {event.get('benefit', 'Unknown benefit')}"
+    if event_type == 'ageing_check_detail':
+        if event.get('loss', 0) > 0:
+            return f"Lost {event.get('loss')} {event.get('stat', 'stat')} ({event.get('old_value')} → {event.get('new_value')})"
+        return f"No {event.get('stat', 'stat')} loss"
+    return event.get('outcome', 'Unknown outcome')
+
+def summary_row(character_record: dict[str, Any]) -> list:
+    """The report's first row: the character's final age, career, terms and UPP"""
+    return ['SUMMARY', character_record.get('name', 'Unknown'), character_record.get('seed', 77),
+            f"Final Age: {character_record.get('age', 18)}",
+            f"Career: {character_record.get('career', 'Unknown')}",
+            f"Terms Served: {character_record.get('terms_served', 0)}",
+            f"UPP: {character_record.get('upp', '______')}",
+            '', '', '', '', '', '', '']
+
+def iter_rolls(character_record: dict[str, Any]) -> Iterator[tuple]:
+    """(term, event) for each career event that carries a roll; term 0 is before enlistment"""
+    term = 0
+    for event in character_record.get('career_history', []):
+        event_type = event.get('event_type', '')
+        if event_type == 'enlistment_attempt':
+            term = 1
+        elif event_type == 'reenlistment_attempt' and event.get('continue_career', False):
+            term += 1
+        if event.get('roll') is not None:
+            yield term, event
+
+def roll_rows(character_record: dict[str, Any]) -> Iterator[list]:
+    """One row (in REPORT_FIELDS order) for each career event that carries a roll"""
+    name = character_record.get('name', 'Unknown')
+    seed = character_record.get('seed', 77)
+    career = character_record.get('career', '')
+    for roll_number, (term, event) in enumerate(iter_rolls(character_record), 1):
+        event_type = event.get('event_type', '')
+        roll = event['roll']
+        target = event.get('target')
+        modifier = event.get('modifier', 0)
+        success = event.get('success', False)
+        yield [roll_number, name, seed, term if term > 0 else '', event_type,
+               describe_event(event, event_type), roll,
+               target if target is not None else '', modifier,
+               '; '.join(event.get('modifier_details', [])),
+               roll + modifier if modifier is not None else '',
+               'Yes' if success else 'No', describe_outcome(event, event_type, success),
+               event.get('career', career)]
+
+def csv_text(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+# =============================================================================
+# SINGLE CHARACTER REPORTS
+# =============================================================================
+
+def iter_report(character_record: dict[str, Any]) -> Iterator[str]:
+    """A character's dice roll report as CSV text: header and summary, then the rolls in chunks"""
+    yield csv_text([REPORT_FIELDS, summary_row(character_record)])
+    rows = []
+    for row in roll_rows(character_record):
+        rows.append(row)
+        if len(rows) >= ROWS_PER_CHUNK:
+            yield csv_text(rows)
+            rows = []
+    if rows:
+        yield csv_text(rows)
+
+def write_report(character_record: dict[str, Any], csv_path: str) -> None:
+    """Write a character's dice roll report to a CSV file"""
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        f.writelines(iter_report(character_record))
+
+# =============================================================================
+# ARCHIVE EXPORT
+# =============================================================================
+
+def report_chunk(locations: List[tuple]) -> tuple:
+    """
+    Process pool task: read characters and format their roll rows
+
+    Args:
+        locations: (id, path, offset, length) for each character (see ArchiveManifest.locations)
+
+    Returns:
+        (CSV text, characters, rolls, failures as [character ID, error])
+    """
+    rows = []
+    characters = 0
+    failures = []
+    for character_id, path, offset, length in locations:
+        try:
+            character_record = character_upgrades.upgrade(character_storage.read_character(path, offset, length))
+            if not isinstance(character_record, dict):
+                raise ValueError("Not a character record")
+            character_rows = [[character_id] + row for row in roll_rows(character_record)]
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            failures.append([character_id, str(e)])
+            continue
+        characters += 1
+        rows += character_rows
+    return csv_text(rows), characters, len(rows), failures
+
+def iter_archive_report(locations: List[tuple], max_workers: Optional[int] = None,
+                        executor_factory=ProcessPoolExecutor,
+                        stats: Optional[dict[str, Any]] = None) -> Iterator[str]:
+    """
+    The roll log of many archived characters as CSV text, header first, in the order given
+
+    Args:
+        locations: (id, path, offset, length) for each character (see ArchiveManifest.locations)
+        max_workers: Process pool size (default: one per CPU)
+        executor_factory: Executor class taking max_workers
+        stats: Updated as chunks are written: characters, rolls, failed and failures
+            (the first MAX_REPORTED_FAILURES as [character ID, error])
+    """
+    stats = {} if stats is None else stats
+    stats.update({"characters": 0, "rolls": 0, "failed": 0, "failures": []})
+    max_workers = max_workers or os.cpu_count() or 1
+    yield csv_text([ARCHIVE_FIELDS])
+
+    def merge(result):
+        text, characters, rolls, failures = result
+        stats["characters"] += characters
+        stats["rolls"] += rolls
+        stats["failed"] += len(failures)
+        room = MAX_REPORTED_FAILURES - len(stats["failures"])
+        stats["failures"] += failures[:max(room, 0)]
+        return text
+
+    pending = deque()
+    with executor_factory(max_workers=max_workers) as executor:
+        try:
+            for start in range(0, len(locations), CHUNK_SIZE):
+                pending.append(executor.submit(report_chunk, locations[start:start + CHUNK_SIZE]))
+                # Bounded look-ahead; chunks come back in the order they were submitted
+                if len(pending) >= max_workers * 2:
+                    yield merge(pending.popleft().result())
+            while pending:
+                yield merge(pending.popleft().result())
+        finally:
+            # Stopped early (a closed download or an error): drop the chunks not yet started
+            for future in pending:
+                future.cancel()
+
+def export_archive(manifest: character_archive.ArchiveManifest, out_path: str,
+                   filters: Optional[dict[str, Any]] = None, skills: Optional[list] = None,
+                   max_workers: Optional[int] = None, executor_factory=ProcessPoolExecutor) -> dict[str, Any]:
+    """
+    Write the roll log of every archived character matching the filters to one CSV file
+
+    Args:
+        manifest: Archive to export
+        out_path: CSV file to write (written to a temporary file, then renamed)
+        filters: Parsed filters (see character_archive.parse_filters)
+        skills: Parsed skill query (see skill_index.parse_skill_query)
+        max_workers: Process pool size (default: one per CPU)
+        executor_factory: Executor class taking max_workers
+
+    Returns:
+        Dictionary with characters, rolls, failed, failures and seconds
+    """
+    start = time.perf_counter()
+    stats = {}
+    locations = manifest.locations(filters, skills)
+    tmp_path = out_path + ".tmp"
+    try:
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            f.writelines(iter_archive_report(locations, max_workers, executor_factory, stats))
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the dice rolls of archived characters to one CSV file')
+    parser.add_argument('out', help='CSV file to write')
+    parser.add_argument('characters_dir', nargs='?', default='characters', help='Archive directory')
+    for name in character_archive.TEXT_FILTERS + tuple(character_archive.RANGE_FILTERS):
+        parser.add_argument('--' + name.replace('_', '-'), dest=name, help=f'Archive filter: {name}')
+    parser.add_argument('--q', help='Skill query, e.g. "Pilot-2 AND Navigation"')
+    parser.add_argument('--workers', type=int, help='Process pool size (default: one per CPU)')
+    options = parser.parse_args()
+
+    try:
+        filters = character_archive.parse_filters(vars(options))
+        skills = skill_index.parse_skill_query(options.q) if options.q else None
+    except ValueError as e:
+        parser.error(str(e))
+    stats = export_archive(character_archive.ArchiveManifest(options.characters_dir), options.out,
+                           filters, skills, options.workers)
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
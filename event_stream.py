@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Server-Sent Events for Classic Traveller Character Generator
+
+This module is a small in-process publish/subscribe broker used to push background
+job progress and new career_history events to browsers over Server-Sent Events.
+
+Every subscriber gets its own bounded queue. When a slow client falls behind, the
+oldest queued events are dropped (and counted) instead of letting the queue grow,
+so one stalled browser can never grow server memory.
+
+The broker only reaches subscribers in the process that publishes. A stream can
+therefore be given a poll function that reads what happened from shared state
+(a job's status file, the shared state store). The stream then sends only what
+the poll returns: a local event just makes it poll at once, and it also polls
+every POLL_SECONDS, so events from other worker processes arrive as well.
+
+Usage:
+    import event_stream
+
+    broker = event_stream.EventBroker()
+    subscription = broker.subscribe("job:1234")
+    broker.publish("job:1234", "progress", {"completed": 10})
+    event = subscription.get(timeout=15)
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Iterator, Optional
+
+# Events kept per subscriber before the oldest are dropped
+DEFAULT_QUEUE_SIZE = 100
+
+# Seconds between keep-alive comments on an idle stream
+KEEPALIVE_SECONDS = 15
+
+# Seconds between polls of shared state for events published by other processes
+POLL_SECONDS = 1.0
+
+class Subscription:
+    """A subscriber's bounded event queue with drop-oldest backpressure"""
+
+    def __init__(self, channel: str, maxsize: int = DEFAULT_QUEUE_SIZE):
+        self.channel = channel
+        self._queue = deque(maxlen=maxsize)
+        self._condition = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, event: dict[str, Any]) -> None:
+        with self._condition:
+            if len(self._queue) == self._queue.maxlen:
+                # deque(maxlen) discards the oldest entry on append
+                self.dropped += 1
+            self._queue.append(event)
+            self._condition.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[dict[str, Any]]:
+        """Wait for the next event; returns None on timeout or when closed"""
+        with self._condition:
+            if not self._queue and not self.closed:
+                self._condition.wait(timeout)
+            if self._queue:
+                return self._queue.popleft()
+            return None
+
+    def take_dropped(self) -> int:
+        """Return and reset the number of events dropped since the last call"""
+        with self._condition:
+            dropped, self.dropped = self.dropped, 0
+            return dropped
+
+    def close(self) -> None:
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+class EventBroker:
+    """Fans published events out to every subscriber of a channel"""
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel: str) -> Subscription:
+        subscription = Subscription(channel, self.queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscription.close()
+        with self._lock:
+            subscribers = self._subscriptions.get(subscription.channel)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[subscription.channel]
+
+    def has_subscribers(self, channel: str) -> bool:
+        with self._lock:
+            return bool(self._subscriptions.get(channel))
+
+    def publish(self, channel: str, event_type: str, data: Any) -> int:
+        """Queue an event for every subscriber of the channel; returns the subscriber count"""
+        with self._lock:
+            subscribers = list(self._subscriptions.get(channel, ()))
+        event = {"event": event_type, "data": data}
+        for subscription in subscribers:
+            subscription.put(event)
+        return len(subscribers)
+
+def format_sse(event_type: str, data: Any) -> str:
+    """Format one Server-Sent Events message"""
+    payload = json.dumps(data, separators=(',', ':'))
+    return f"event: {event_type}\ndata: {payload}\n\n"
+
+def stream_events(broker: EventBroker, subscription: Subscription, initial_events=(),
+                  is_finished=None, poll=None) -> Iterator[str]:
+    """
+    Yield SSE messages for a subscription until the client disconnects
+
+    Args:
+        broker: The broker the subscription belongs to
+        subscription: The subscriber's queue
+        initial_events: (event_type, data) pairs sent first, e.g. a current snapshot
+        is_finished: Optional callable taking an event; the stream ends after an event
+            for which it returns True (e.g. a job reaching a final status)
+        poll: Optional callable returning the (event_type, data) pairs that happened
+            since its last call, read from state shared by every process. If given,
+            only polled events are sent; queued events just trigger an early poll.
+    """
+    try:
+        # Sent at once so the client (and any proxy) gets the response before the first event
+        yield ": connected\n\n"
+        for event_type, data in initial_events:
+            yield format_sse(event_type, data)
+            if is_finished and is_finished({"event": event_type, "data": data}):
+                return
+        last_sent = time.monotonic()
+        while True:
+            event = subscription.get(timeout=POLL_SECONDS if poll else KEEPALIVE_SECONDS)
+            if poll:
+                # Whatever was queued is also in the shared state the poll reads
+                while subscription.get(timeout=0) is not None:
+                    pass
+                subscription.take_dropped()
+                events = [{"event": event_type, "data": data} for event_type, data in poll()]
+            else:
+                dropped = subscription.take_dropped()
+                if dropped:
+                    yield format_sse("dropped", {"count": dropped})
+                events = [event] if event is not None else []
+            if not events:
+                if subscription.closed:
+                    return
+                if time.monotonic() - last_sent >= KEEPALIVE_SECONDS or not poll:
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+                continue
+            for event in events:
+                yield format_sse(event["event"], event["data"])
+                if is_finished and is_finished(event):
+                    return
+            last_sent = time.monotonic()
+    finally:
+        broker.unsubscribe(subscription)
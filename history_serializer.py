@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Incremental History Serialization for Classic Traveller Character Generator
+
+A character's career_history and phase_history only ever grow: an entry never
+changes once it is appended. Every action nevertheless saved the character to the
+state store and the archive and sent it back in the response, re-encoding both
+histories from scratch each time, so the cost of an action grew with the length
+of the career.
+
+HistorySerializer remembers, per character, the JSON already produced for each
+history list and encodes only entries appended since. The rest of the record is
+small and is encoded normally; the history text is spliced in after it. A copy
+of the entries behind each cached prefix is kept too, and the prefix is reused
+only while the list still starts with equal entries. Comparing entries is much
+cheaper than encoding them, and it means a rolled-back batch, a reloaded
+character or a different character under the same key (a legacy name, an
+imported record that replaced an ID) falls back to a full encode.
+
+Usage:
+    import history_serializer
+
+    serializer = history_serializer.HistorySerializer(max_characters=1024)
+    text = serializer.dumps("0000000001", character_record)   # same JSON as json.dumps, compact
+"""
+
+import copy
+import json
+import threading
+from collections import OrderedDict
+from typing import Any
+
+# Append-only lists whose encoded prefix is cached
+HISTORY_FIELDS = ("career_history", "phase_history")
+
+SEPARATORS = (',', ':')
+
+class HistorySerializer:
+    """Compact JSON encoder that reuses each character's already-encoded history prefix"""
+
+    def __init__(self, max_characters: int = 1024):
+        self.max_characters = max_characters
+        self._prefixes = OrderedDict()   # (character key, field) -> (copies of the entries, their text)
+        self._lock = threading.Lock()
+        self.reused_entries = 0
+        self.encoded_entries = 0
+
+    def dumps(self, character_key: str, character_record: dict[str, Any]) -> str:
+        """Encode a character record as compact JSON (history fields last)"""
+        head = {key: value for key, value in character_record.items() if key not in HISTORY_FIELDS}
+        text = json.dumps(head, separators=SEPARATORS)
+        parts = []
+        for field in HISTORY_FIELDS:
+            if field not in character_record:
+                continue
+            entries = character_record[field]
+            if isinstance(entries, list) and character_key:
+                encoded = "[" + self._encode_entries(character_key, field, entries) + "]"
+            else:
+                encoded = json.dumps(entries, separators=SEPARATORS)
+            parts.append(json.dumps(field) + ":" + encoded)
+        if not parts:
+            return text
+        return text[:-1] + ("," if head else "") + ",".join(parts) + "}"
+
+    def _encode_entries(self, character_key: str, field: str, entries: list) -> str:
+        key = (character_key, field)
+        with self._lock:
+            cached = self._prefixes.get(key)
+        known, prefix = [], ""
+        if cached is not None and len(cached[0]) <= len(entries) and entries[:len(cached[0])] == cached[0]:
+            # Every cached entry is still there unchanged: the key has not been reused and nothing was rolled back
+            known, prefix = cached
+        count = len(known)
+        new_entries = [json.dumps(entry, separators=SEPARATORS) for entry in entries[count:]]
+        text = prefix + ("," if prefix and new_entries else "") + ",".join(new_entries)
+        if new_entries:
+            # Copies, so an entry changed in place later is noticed too
+            known = known + copy.deepcopy(entries[count:])
+        with self._lock:
+            self.reused_entries += count
+            self.encoded_entries += len(new_entries)
+            if entries:
+                self._prefixes[key] = (known, text)
+                self._prefixes.move_to_end(key)
+                while len(self._prefixes) > self.max_characters * len(HISTORY_FIELDS):
+                    self._prefixes.popitem(last=False)
+        return text
+
+    def stats(self) -> dict[str, int]:
+        """History entries reused from cached prefixes versus encoded afresh"""
+        with self._lock:
+            return {
+                "reused_entries": self.reused_entries,
+                "encoded_entries": self.encoded_entries,
+                "cached_histories": len(self._prefixes)
+            }
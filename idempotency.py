@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Idempotency Keys for Classic Traveller Character Generator
+
+Proxies retry POSTs that time out. Without protection a retried /api/survival
+rolls the dice again and appends a second event. Clients (or proxies) send an
+Idempotency-Key header; the first response for a key is stored, and a retry with
+the same key gets that response replayed without running the route again.
+
+Stored responses live in the shared state store, keyed by (character, key), so
+a retry that reaches another worker process is replayed too, and expire after
+ttl_seconds. A request claims its key atomically before the route runs: a retry
+arriving while the first request is still running finds the claim and is told
+to try again later instead of running the route a second time. A claim left by
+a request that failed, or by a worker that died, is released or expires. A key
+reused for a different request (another route or body) is reported instead of
+replayed.
+
+Usage:
+    import idempotency
+
+    store = idempotency.IdempotencyStore(state_store, ttl_seconds=86400)
+    fingerprint = idempotency.request_fingerprint("POST", "/api/survival", b"{}")
+    entry = store.claim(("Alex Nova", "retry-1"), fingerprint)   # None: run the route
+    store.complete(("Alex Nova", "retry-1"), {"fingerprint": fingerprint, ...})
+"""
+
+import hashlib
+import json
+from typing import Any, Optional
+
+import state_backend
+
+# Longest Idempotency-Key header accepted
+MAX_KEY_LENGTH = 255
+
+# Status codes that are never stored: the client should really retry these
+NOT_STORED_STATUSES = (409, 429)
+
+def request_fingerprint(method: str, path: str, body: bytes) -> str:
+    """Identify a request so a reused key with a different request can be detected"""
+    digest = hashlib.sha256(body or b"").hexdigest()
+    return f"{method} {path} {digest}"
+
+def should_store(status_code: int) -> bool:
+    """Store successes and client errors; never server errors, conflicts or rate limits"""
+    return status_code < 500 and status_code not in NOT_STORED_STATUSES
+
+class IdempotencyStore:
+    """Stored responses in a shared state store, claimed before the route runs"""
+
+    def __init__(self, state_store, ttl_seconds: float = 86400, claim_seconds: float = 300):
+        self.state_store = state_store
+        self.ttl_seconds = ttl_seconds
+        self.claim_seconds = claim_seconds
+
+    @staticmethod
+    def _state_key(key: tuple) -> str:
+        # Hashed so any scope and header value make one bounded, unambiguous key
+        digest = hashlib.sha256(json.dumps(list(key)).encode("utf-8")).hexdigest()
+        return f"idempotency:{digest}"
+
+    def claim(self, key: tuple, fingerprint: str) -> Optional[dict[str, Any]]:
+        """
+        Claim a key for a request about to run
+
+        Returns:
+            None if the caller now holds the key and should run the request;
+            otherwise the entry already there: a stored response, or
+            {"fingerprint": ..., "pending": True} while another request holds it
+        """
+        state_key = self._state_key(key)
+        entry, version = self.state_store.get_with_version(state_key)
+        if entry is not None:
+            return entry
+        try:
+            self.state_store.set(state_key, {"fingerprint": fingerprint, "pending": True},
+                                 expected_version=version, expires_in=self.claim_seconds)
+        except state_backend.VersionConflict:
+            # Claimed (or completed) by another request since it was read
+            return self.state_store.get(state_key) or {"fingerprint": fingerprint, "pending": True}
+        return None
+
+    def complete(self, key: tuple, entry: dict[str, Any]) -> None:
+        """Store the response for a key, replacing the claim"""
+        self.state_store.set(self._state_key(key), entry, expires_in=self.ttl_seconds)
+
+    def release(self, key: tuple) -> None:
+        """Give up a claim without storing a response, so a retry runs the request"""
+        self.state_store.set(self._state_key(key), None, expires_in=self.claim_seconds)
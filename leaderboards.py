@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Archive Leaderboards for Classic Traveller Character Generator
+
+The archive shows the top characters by mustering-out cash, final rank, terms
+served and skill levels, overall and per service. Sorting the whole archive on
+every request does not scale, so this module keeps a bounded top-K board for
+each (metric, service): a min-heap of the K best entries whose root is the entry
+a newcomer has to beat. Offering a character is O(log K).
+
+Only finished (mustered-out) characters are ranked. The archive manifest feeds
+the boards as it reads or records rows, so every worker sees the same boards.
+A character whose value drops while on a board (rare: finished characters do
+not change) marks that board stale; it is rebuilt from the retained values the
+next time it is read.
+
+Usage:
+    import leaderboards
+
+    boards = leaderboards.Leaderboards(size=100)
+    boards.update(manifest_row)
+    boards.top("cash", career="Navy", limit=10)   # [(character_id, value), ...]
+"""
+
+import heapq
+from typing import Any, List, Optional
+
+# Entries kept per board; the endpoint cannot ask for more
+DEFAULT_SIZE = 100
+
+# Metric name -> value computed from a manifest row
+METRICS = {
+    "cash": lambda row: row.get("cash") or 0,
+    "rank": lambda row: row.get("rank") or 0,
+    "terms": lambda row: row.get("terms") or 0,
+    "skills": lambda row: sum(level for level in (row.get("skills") or {}).values()
+                              if isinstance(level, int))
+}
+METRIC_NAMES = list(METRICS)
+
+class Leaderboard:
+    """Bounded top-K of (value, character_id); ties go to the higher character ID"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._heap = []      # min-heap of (value, character_id): the root is the weakest entry
+        self._members = {}   # character_id -> value currently on the board
+        self.stale = False
+
+    def offer(self, character_id: str, value) -> None:
+        """Add or update a character's entry in O(log K)"""
+        entry = (value, character_id)
+        current = self._members.get(character_id)
+        if current is not None:
+            if value == current:
+                return
+            if value < current:
+                # Someone off the board may now beat this character
+                self.stale = True
+                return
+            # Moving up: drop the old entry (O(K), only when an entry improves)
+            self._heap.remove((current, character_id))
+            heapq.heapify(self._heap)
+            del self._members[character_id]
+        if len(self._heap) < self.size:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            _, evicted_id = heapq.heapreplace(self._heap, entry)
+            del self._members[evicted_id]
+        else:
+            return
+        self._members[character_id] = value
+
+    def discard(self, character_id: str) -> None:
+        """Forget a character that is no longer ranked"""
+        if character_id in self._members:
+            self.stale = True
+
+    def load(self, entries) -> None:
+        """Replace the board with the best of the given (value, character_id) entries"""
+        self._heap = heapq.nlargest(self.size, entries)
+        heapq.heapify(self._heap)
+        self._members = {character_id: value for value, character_id in self._heap}
+        self.stale = False
+
+    def top(self, limit: int) -> List[tuple]:
+        """Best entries first, as (character_id, value)"""
+        return [(character_id, value) for value, character_id in sorted(self._heap, reverse=True)[:limit]]
+
+class Leaderboards:
+    """Top-K boards for every metric, overall (career None) and per service"""
+
+    def __init__(self, size: int = DEFAULT_SIZE):
+        self.size = size
+        self._boards = {}   # (metric, career) -> Leaderboard
+        self._values = {}   # character_id -> (career, {metric: value}) for ranked characters
+
+    def _board(self, metric: str, career: Optional[str]) -> Leaderboard:
+        board = self._boards.get((metric, career))
+        if board is None:
+            board = self._boards[(metric, career)] = Leaderboard(self.size)
+        return board
+
+    def update(self, row: dict[str, Any]) -> None:
+        """Rank (or un-rank) a character from its manifest row"""
+        character_id = row["id"]
+        previous = self._values.get(character_id)
+        if row.get("status") != "complete":
+            if previous is not None:
+                del self._values[character_id]
+                for metric in METRIC_NAMES:
+                    self._board(metric, None).discard(character_id)
+                    self._board(metric, previous[0]).discard(character_id)
+            return
+
+        career = row.get("career")
+        values = {metric: value_of(row) for metric, value_of in METRICS.items()}
+        if previous is not None and previous[0] != career:
+            for metric in METRIC_NAMES:
+                self._board(metric, previous[0]).discard(character_id)
+        self._values[character_id] = (career, values)
+        for metric, value in values.items():
+            self._board(metric, None).offer(character_id, value)
+            self._board(metric, career).offer(character_id, value)
+
+    def top(self, metric: str, career: Optional[str] = None, limit: int = 10) -> List[tuple]:
+        """
+        Best characters for a metric, overall or within one service
+
+        Returns:
+            List of (character_id, value), best first
+
+        Raises:
+            ValueError: If metric is unknown
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown leaderboard metric '{metric}' (use one of {', '.join(METRIC_NAMES)})")
+        board = self._boards.get((metric, career))
+        if board is None:
+            return []
+        if board.stale:
+            board.load((values[metric], character_id)
+                       for character_id, (character_career, values) in self._values.items()
+                       if career is None or character_career == career)
+        return board.top(limit)
@@ -14,8 +14,42 @@ class Config:
     HOST = os.environ.get('HOST', '0.0.0.0')
     PORT = int(os.environ.get('PORT', 443))
     
+    # Seed used when the shared state store has none yet
+    DEFAULT_SEED = int(os.environ.get('TRAVELLER_SEED', 77))
+    
     # Rate limiting
-    RATELIMIT_STORAGE_URL = os.environ.get('REDIS_URL', 'memory://')
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'true').lower() != 'false'
+    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', os.environ.get('REDIS_URL', 'memory://'))
+    # Budget overrides, e.g. 'expensive.global=100/5' (capacity/refill per second; see rate_limiting.parse_limits)
+    RATELIMIT_LIMITS = os.environ.get('RATELIMIT_LIMITS', '')
+    
+    # Character IDs reserved from the shared counter at a time
+    ID_BATCH_SIZE = int(os.environ.get('ID_BATCH_SIZE', 1000))
+    
+    # Idempotency-Key responses kept (in the shared state store) for retried POSTs
+    IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 86400))
+    # How long a running request holds its key before a retry may run it again
+    IDEMPOTENCY_CLAIM_SECONDS = int(os.environ.get('IDEMPOTENCY_CLAIM_SECONDS', 300))
+    
+    # Data storage (background job results, indexes)
+    DATA_DIR = os.environ.get('DATA_DIR', 'data')
+    
+    # Archived character files: 'gzip' (compact, compressed), 'binary' (character_binary) or 'json' (pretty-printed)
+    CHARACTER_STORAGE_FORMAT = os.environ.get('CHARACTER_STORAGE_FORMAT', 'gzip')
+    # 'sharded' (characters/ab/cd/<id>.*, by hash prefix) or 'flat' (characters/<id>.*)
+    CHARACTER_LAYOUT = os.environ.get('CHARACTER_LAYOUT', 'sharded')
+    
+    # Memory per worker for decoded archived characters (read-through cache)
+    CHARACTER_CACHE_MAX_BYTES = int(os.environ.get('CHARACTER_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    
+    # Shared state (current character, seed) for multi-worker deployments
+    STATE_STORAGE_URL = os.environ.get('STATE_STORAGE_URL', 'sqlite:///' + os.path.join(DATA_DIR, 'state.db'))
+    
+    # Background generation jobs
+    MAX_CONCURRENT_JOBS = int(os.environ.get('MAX_CONCURRENT_JOBS', 2))
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+    # Seconds a finished job (its status and result file) is kept before it is deleted
+    JOB_RETENTION_SECONDS = float(os.environ.get('JOB_RETENTION_SECONDS', 3600))
     
     # Logging
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Rate Limiting for Classic Traveller Character Generator
+
+Token-bucket rate limiting for the /api/* routes. Every request spends one token
+from two buckets: one for the client in the route's budget group, and one shared
+by all clients in that group. A request the shared bucket turns away gets its
+client token back, so denied requests do not use up the client's budget. Cheap
+read-only routes, normal actions and expensive bulk routes have separate budgets;
+a deployment can change any of them with RATELIMIT_LIMITS (see parse_limits).
+
+Bucket state lives in a pluggable backend chosen by RATELIMIT_STORAGE_URL:
+    memory://               In-process dictionary (single worker)
+    sqlite:///path/to/db    SQLite file shared by every worker on one host
+    redis://host:6379/0     Redis, shared across hosts (needs the redis package)
+
+Usage:
+    import rate_limiting
+
+    limits = rate_limiting.parse_limits("expensive.global=100/5")
+    limiter = rate_limiting.RateLimiter(rate_limiting.create_backend("memory://"), limits)
+    result = limiter.check("127.0.0.1", "expensive")
+    if not result.allowed:
+        ...  # respond 429 with Retry-After: result.retry_after
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from typing import Optional
+
+# (capacity, refill tokens per second) for each budget group; RATELIMIT_LIMITS overrides them
+DEFAULT_LIMITS = {
+    "cheap": {"per_client": (120, 20.0), "global": (5000, 1000.0)},
+    "standard": {"per_client": (60, 10.0), "global": (2000, 400.0)},
+    "expensive": {"per_client": (3, 0.1), "global": (10, 0.5)}
+}
+
+# Routes that do not follow the default grouping (GET = cheap, everything else = standard)
+ROUTE_GROUPS = {
+    ("POST", "/api/calculate_probability"): "cheap",
+    ("POST", "/api/career_survival"): "cheap",
+    ("POST", "/api/action_probability"): "cheap",
+    ("POST", "/api/enlistment_probabilities"): "cheap",
+    ("POST", "/api/get_rank_title"): "cheap",
+    ("POST", "/api/bulk_generate"): "expensive",
+    ("POST", "/api/jobs"): "expensive",
+    ("POST", "/api/autoplay"): "expensive",
+    ("POST", "/api/archive/rebuild"): "expensive",
+    ("POST", "/api/import"): "expensive",
+    ("GET", "/api/archive/dice_rolls"): "expensive"
+}
+
+RateLimitResult = namedtuple("RateLimitResult", ["allowed", "remaining", "retry_after", "group"])
+
+def parse_limits(spec: Optional[str]) -> dict:
+    """
+    DEFAULT_LIMITS with a deployment's overrides applied
+
+    Args:
+        spec: Comma-separated group.bucket=capacity/refill_rate entries, e.g.
+            "expensive.global=100/5,expensive.per_client=5/0.2" (empty: the defaults)
+
+    Raises:
+        ValueError: If an entry is malformed or names an unknown group or bucket
+    """
+    limits = {group: dict(buckets) for group, buckets in DEFAULT_LIMITS.items()}
+    for entry in (spec or "").split(","):
+        if not entry.strip():
+            continue
+        try:
+            name, value = entry.split("=")
+            group, bucket = name.strip().split(".")
+            capacity, refill_rate = (float(number) for number in value.split("/"))
+        except ValueError:
+            raise ValueError(f"Invalid rate limit '{entry.strip()}': expected group.bucket=capacity/refill_rate")
+        if group not in limits or bucket not in limits[group]:
+            raise ValueError(f"Unknown rate limit bucket: {group}.{bucket}")
+        if capacity < 1 or refill_rate <= 0:
+            raise ValueError(f"Rate limit {group}.{bucket} needs a capacity of at least 1 and a positive refill rate")
+        limits[group][bucket] = (capacity, refill_rate)
+    return limits
+
+def _refill(tokens: float, updated_at: float, now: float, capacity: float, refill_rate: float) -> float:
+    return min(capacity, tokens + max(0.0, now - updated_at) * refill_rate)
+
+def _retry_after(tokens: float, cost: float, refill_rate: float) -> float:
+    return max(0.0, (cost - tokens) / refill_rate) if refill_rate > 0 else math.inf
+
+class MemoryBackend:
+    """Token buckets in a dictionary - fast, but only correct for a single worker process"""
+
+    # Prune idle buckets once the table grows past this many keys
+    PRUNE_THRESHOLD = 10000
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, capacity: float, refill_rate: float, cost: float = 1, now: Optional[float] = None):
+        """Spend cost tokens if available (a negative cost refunds up to capacity); returns (allowed, remaining, retry_after)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = _refill(tokens, updated_at, now, capacity, refill_rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens = min(capacity, tokens - cost)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.PRUNE_THRESHOLD:
+                self._prune(now)
+        return allowed, tokens, 0.0 if allowed else _retry_after(tokens, cost, refill_rate)
+
+    def _prune(self, now: float) -> None:
+        # Buckets untouched for a minute have refilled for every group's budget
+        stale = [key for key, (_, updated_at) in self._buckets.items() if now - updated_at > 60]
+        for key in stale:
+            del self._buckets[key]
+
+class SQLiteBackend:
+    """Token buckets in a SQLite file - shared by all worker processes on one host"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread, and a fresh one in a forked worker process
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def consume(self, key: str, capacity: float, refill_rate: float, cost: float = 1, now: Optional[float] = None):
+        """Spend cost tokens if available (a negative cost refunds up to capacity); returns (allowed, remaining, retry_after)"""
+        now = time.time() if now is None else now
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated_at = row if row else (capacity, now)
+            tokens = _refill(tokens, updated_at, now, capacity, refill_rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens = min(capacity, tokens - cost)
+            connection.execute(
+                "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                (key, tokens, now))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return allowed, tokens, 0.0 if allowed else _retry_after(tokens, cost, refill_rate)
+
+class RedisBackend:
+    """Token buckets in Redis - shared across hosts; updated atomically by a Lua script"""
+
+    TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * refill_rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = math.min(capacity, tokens - cost)
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill_rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+    def __init__(self, url: str, client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ValueError("RATELIMIT_STORAGE_URL uses Redis but the 'redis' package is not installed")
+            client = redis.Redis.from_url(url)
+        self._script = client.register_script(self.TOKEN_BUCKET_SCRIPT)
+
+    def consume(self, key: str, capacity: float, refill_rate: float, cost: float = 1, now: Optional[float] = None):
+        """Spend cost tokens if available (a negative cost refunds up to capacity); returns (allowed, remaining, retry_after)"""
+        now = time.time() if now is None else now
+        allowed, tokens = self._script(keys=[f"ratelimit:{key}"], args=[capacity, refill_rate, now, cost])
+        allowed, tokens = bool(int(allowed)), float(tokens)
+        return allowed, tokens, 0.0 if allowed else _retry_after(tokens, cost, refill_rate)
+
+def create_backend(storage_url: str):
+    """
+    Create the bucket backend for a RATELIMIT_STORAGE_URL
+
+    Raises:
+        ValueError: If the URL scheme is not supported
+    """
+    if storage_url.startswith("memory://"):
+        return MemoryBackend()
+    if storage_url.startswith("sqlite:///"):
+        return SQLiteBackend(storage_url[len("sqlite:///"):])
+    if storage_url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(storage_url)
+    raise ValueError(f"Unsupported RATELIMIT_STORAGE_URL: {storage_url}")
+
+class RateLimiter:
+    """Checks requests against per-client and per-route-group token buckets"""
+
+    def __init__(self, backend, limits: Optional[dict] = None, route_groups: Optional[dict] = None):
+        self.backend = backend
+        self.limits = limits or DEFAULT_LIMITS
+        self.route_groups = ROUTE_GROUPS if route_groups is None else route_groups
+
+    def group_for(self, method: str, rule: str) -> str:
+        """Budget group for a route (rule is the URL rule, e.g. '/api/jobs/<job_id>')"""
+        group = self.route_groups.get((method, rule))
+        if group:
+            return group
+        return "cheap" if method in ("GET", "HEAD", "OPTIONS") else "standard"
+
+    def check(self, client_id: str, group: str, now: Optional[float] = None) -> RateLimitResult:
+        """Spend one token from the client's bucket and the group's shared bucket (neither if either is empty)"""
+        limits = self.limits[group]
+        capacity, refill_rate = limits["per_client"]
+        allowed, remaining, retry_after = self.backend.consume(
+            f"client:{group}:{client_id}", capacity, refill_rate, now=now)
+        if not allowed:
+            return RateLimitResult(False, int(remaining), retry_after, group)
+
+        global_capacity, global_refill_rate = limits["global"]
+        global_allowed, _, global_retry_after = self.backend.consume(
+            f"route:{group}", global_capacity, global_refill_rate, now=now)
+        if not global_allowed:
+            # Turned away by the shared budget: the client's token is given back
+            _, remaining, _ = self.backend.consume(
+                f"client:{group}:{client_id}", capacity, refill_rate, cost=-1, now=now)
+            return RateLimitResult(False, int(remaining), global_retry_after, group)
+
+        return RateLimitResult(True, int(remaining), 0.0, group)
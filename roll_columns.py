@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Columnar Roll Event Export for Classic Traveller Character Generator
+
+The dice roll CSV (dice_report) is made for reading, not for analysis: summing
+hundreds of millions of rolls from it means parsing every field of every row
+first. This module exports the roll events of the archive, or a filtered part of
+it, as typed columns an analyst can memory-map and aggregate without parsing:
+
+    character_id  int64    the character's ID as a number
+    term          int8     1-based term (0 before enlistment)
+    event_type    uint8    index into metadata["event_types"]
+    roll          int16    the dice roll
+    modifier      int16    the modifier applied (0 when there is none)
+    target        int16    the target number (NO_TARGET when there is none)
+    success       bool
+
+An export is a directory of row groups, each a directory holding one NumPy .npy
+file per column (written with struct and array; NumPy is not needed to write or
+read them), and metadata.json naming the columns, their dtypes, the event type
+codes and each row group with its row count:
+
+    rolls/metadata.json
+    rolls/row_group-000000/character_id.npy, term.npy, event_type.npy, ...
+
+A row group holds the rolls of ROW_GROUP_SIZE characters. Characters are taken
+in ID order from the manifest (the same filters and skill queries as
+/api/archive), and each row group is one task for a process pool, which reads
+the characters and writes the group's column files itself, so the parent
+handles no row data. The export is written next to its destination and renamed
+into place when complete. Characters that cannot be read, or whose ID is not a
+number, are counted and reported, not exported.
+
+Usage:
+    import roll_columns
+
+    stats = roll_columns.export_archive(manifest, "rolls", {"career": "Navy"}, max_workers=8)
+    for group in roll_columns.iter_row_groups("rolls", ["roll", "success"]):   # array.array columns
+        ...
+
+    # With NumPy: np.load("rolls/row_group-000000/roll.npy", mmap_mode="r")
+
+    python roll_columns.py rolls [characters_dir] [--career Navy] [--q "Pilot-2"] [--workers N]
+"""
+
+import argparse
+import ast
+import json
+import os
+import shutil
+import struct
+import sys
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterator, List, Optional
+
+import character_archive
+import character_storage
+import character_upgrades
+import dice_report
+import skill_index
+
+FORMAT_VERSION = 1
+METADATA_NAME = "metadata.json"
+
+# (column, array typecode, .npy dtype)
+COLUMNS = (
+    ("character_id", "q", "<i8"),
+    ("term", "b", "|i1"),
+    ("event_type", "B", "|u1"),
+    ("roll", "h", "<i2"),
+    ("modifier", "h", "<i2"),
+    ("target", "h", "<i2"),
+    ("success", "B", "|b1")
+)
+COLUMN_NAMES = tuple(name for name, _, _ in COLUMNS)
+
+# Event types that carry a roll; anything else is stored as "other"
+EVENT_TYPES = ("enlistment_attempt", "survival_check", "commission_check", "promotion_check",
+               "skill_resolution", "ageing_check_detail", "reenlistment_attempt",
+               "mustering_out_cash_roll", "mustering_out_benefit_roll", "other")
+EVENT_CODES = {event_type: code for code, event_type in enumerate(EVENT_TYPES)}
+OTHER_EVENT = EVENT_CODES["other"]
+
+# Stored in the target column for rolls with no target number
+NO_TARGET = -1
+
+# Characters per row group (one process pool task)
+ROW_GROUP_SIZE = 10000
+# Characters that could not be exported, reported individually (all are counted)
+MAX_REPORTED_FAILURES = 100
+
+NPY_MAGIC = b"\x93NUMPY"
+# Magic, version 1.0 and the header length
+NPY_PREFIX = struct.Struct("<6sBBH")
+
+# =============================================================================
+# NPY FILES
+# =============================================================================
+
+def npy_header(dtype: str, length: int) -> bytes:
+    """.npy version 1.0 header for a one-dimensional column, padded so the data is 64-byte aligned"""
+    header = f"{{'descr': '{dtype}', 'fortran_order': False, 'shape': ({length},), }}"
+    header += " " * (-(NPY_PREFIX.size + len(header) + 1) % 64) + "\n"
+    return NPY_PREFIX.pack(NPY_MAGIC, 1, 0, len(header)) + header.encode("latin1")
+
+def write_column(path: str, values: array, dtype: str) -> None:
+    if sys.byteorder == "big" and values.itemsize > 1:
+        values = array(values.typecode, values)
+        values.byteswap()
+    with open(path, 'wb') as f:
+        f.write(npy_header(dtype, len(values)))
+        values.tofile(f)
+
+def read_column(path: str) -> array:
+    """
+    Read a column file written by this module into an array
+
+    Raises:
+        ValueError: If the file is not a .npy column of a known dtype
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        magic, major, _, header_length = NPY_PREFIX.unpack_from(data)
+        header = ast.literal_eval(data[NPY_PREFIX.size:NPY_PREFIX.size + header_length].decode("latin1"))
+    except (struct.error, ValueError, SyntaxError, UnicodeDecodeError):
+        raise ValueError(f"Not a column file: {path}")
+    typecodes = {dtype: typecode for _, typecode, dtype in COLUMNS}
+    if magic != NPY_MAGIC or major != 1 or not isinstance(header, dict) or header.get("descr") not in typecodes:
+        raise ValueError(f"Not a column file: {path}")
+    values = array(typecodes[header["descr"]])
+    values.frombytes(data[NPY_PREFIX.size + header_length:])
+    if sys.byteorder == "big" and values.itemsize > 1:
+        values.byteswap()
+    return values
+
+# =============================================================================
+# ROW GROUPS
+# =============================================================================
+
+def character_columns(character_id: str, character_record: dict[str, Any]) -> List[array]:
+    """
+    One character's roll events as arrays in COLUMNS order
+
+    Raises:
+        ValueError, TypeError, OverflowError: If the ID is not a number or a value does not fit its column
+    """
+    number = int(character_id)
+    columns = [array(typecode) for _, typecode, _ in COLUMNS]
+    for term, event in dice_report.iter_rolls(character_record):
+        target = event.get("target")
+        row = (number, term, EVENT_CODES.get(event.get("event_type"), OTHER_EVENT), event["roll"],
+               event.get("modifier") or 0, NO_TARGET if target is None else target,
+               1 if event.get("success") else 0)
+        for column, value in zip(columns, row):
+            column.append(value)
+    return columns
+
+def write_row_group(locations: List[tuple], group_dir: str) -> tuple:
+    """
+    Process pool task: read characters and write their roll events as one row group
+
+    Args:
+        locations: (id, path, offset, length) for each character (see ArchiveManifest.locations)
+        group_dir: Directory to write the column files into
+
+    Returns:
+        (characters, rows, failures as [character ID, error])
+    """
+    columns = [array(typecode) for _, typecode, _ in COLUMNS]
+    characters = 0
+    failures = []
+    for character_id, path, offset, length in locations:
+        try:
+            character_record = character_upgrades.upgrade(character_storage.read_character(path, offset, length))
+            if not isinstance(character_record, dict):
+                raise ValueError("Not a character record")
+            values = character_columns(character_id, character_record)
+        except (OSError, ValueError, TypeError, OverflowError, AttributeError, KeyError) as e:
+            failures.append([character_id, str(e)])
+            continue
+        for column, character_values in zip(columns, values):
+            column.extend(character_values)
+        characters += 1
+    os.makedirs(group_dir)
+    for (name, _, dtype), column in zip(COLUMNS, columns):
+        write_column(os.path.join(group_dir, name + ".npy"), column, dtype)
+    return characters, len(columns[0]), failures
+
+def read_metadata(directory: str) -> dict[str, Any]:
+    with open(os.path.join(directory, METADATA_NAME)) as f:
+        return json.load(f)
+
+def iter_row_groups(directory: str, columns: Optional[List[str]] = None) -> Iterator[dict[str, array]]:
+    """Each row group of an export as {column: array}, in order (all columns unless given)"""
+    for group in read_metadata(directory)["row_groups"]:
+        yield {name: read_column(os.path.join(directory, group["path"], name + ".npy"))
+               for name in columns or COLUMN_NAMES}
+
+# =============================================================================
+# EXPORT
+# =============================================================================
+
+def export_archive(manifest: character_archive.ArchiveManifest, out_dir: str,
+                   filters: Optional[dict[str, Any]] = None, skills: Optional[list] = None,
+                   max_workers: Optional[int] = None, row_group_size: int = ROW_GROUP_SIZE,
+                   executor_factory=ProcessPoolExecutor) -> dict[str, Any]:
+    """
+    Export the roll events of every archived character matching the filters as column files
+
+    Args:
+        manifest: Archive to export
+        out_dir: Directory to create (written next to it, then renamed into place)
+        filters: Parsed filters (see character_archive.parse_filters)
+        skills: Parsed skill query (see skill_index.parse_skill_query)
+        max_workers: Process pool size (default: one per CPU)
+        row_group_size: Characters per row group
+        executor_factory: Executor class taking max_workers
+
+    Returns:
+        Dictionary with characters, rows, row_groups, failed, failures (the first
+        MAX_REPORTED_FAILURES as [character ID, error]) and seconds
+
+    Raises:
+        ValueError: If out_dir already exists
+    """
+    start = time.perf_counter()
+    if os.path.exists(out_dir):
+        raise ValueError(f"{out_dir} already exists")
+    locations = manifest.locations(filters, skills)
+    row_group_size = max(1, row_group_size)
+    max_workers = max_workers or os.cpu_count() or 1
+    # A directory left by an interrupted export is incomplete
+    tmp_dir = out_dir.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    stats = {"characters": 0, "rows": 0, "row_groups": 0, "failed": 0, "failures": []}
+    groups = []
+
+    def add_group(path, result):
+        characters, rows, failures = result
+        groups.append({"path": path, "rows": rows, "characters": characters})
+        stats["characters"] += characters
+        stats["rows"] += rows
+        stats["failed"] += len(failures)
+        room = MAX_REPORTED_FAILURES - len(stats["failures"])
+        stats["failures"] += failures[:max(room, 0)]
+
+    pending = deque()
+    try:
+        with executor_factory(max_workers=max_workers) as executor:
+            try:
+                for index, first in enumerate(range(0, len(locations), row_group_size)):
+                    path = f"row_group-{index:06d}"
+                    pending.append((path, executor.submit(write_row_group, locations[first:first + row_group_size],
+                                                          os.path.join(tmp_dir, path))))
+                    if len(pending) >= max_workers * 2:
+                        path, future = pending.popleft()
+                        add_group(path, future.result())
+                while pending:
+                    path, future = pending.popleft()
+                    add_group(path, future.result())
+            finally:
+                for _, future in pending:
+                    future.cancel()
+        stats["row_groups"] = len(groups)
+        metadata = {
+            "format_version": FORMAT_VERSION,
+            "columns": [{"name": name, "dtype": dtype} for name, _, dtype in COLUMNS],
+            "event_types": list(EVENT_TYPES),
+            "no_target": NO_TARGET,
+            "rows": stats["rows"],
+            "row_groups": groups
+        }
+        with open(os.path.join(tmp_dir, METADATA_NAME), 'w') as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(tmp_dir, out_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the roll events of archived characters as column files')
+    parser.add_argument('out_dir', help='Directory to create')
+    parser.add_argument('characters_dir', nargs='?', default='characters', help='Archive directory')
+    for name in character_archive.TEXT_FILTERS + tuple(character_archive.RANGE_FILTERS):
+        parser.add_argument('--' + name.replace('_', '-'), dest=name, help=f'Archive filter: {name}')
+    parser.add_argument('--q', help='Skill query, e.g. "Pilot-2 AND Navigation"')
+    parser.add_argument('--row-group-size', type=int, default=ROW_GROUP_SIZE, help='Characters per row group')
+    parser.add_argument('--workers', type=int, help='Process pool size (default: one per CPU)')
+    options = parser.parse_args()
+
+    try:
+        filters = character_archive.parse_filters(vars(options))
+        skills = skill_index.parse_skill_query(options.q) if options.q else None
+        stats = export_archive(character_archive.ArchiveManifest(options.characters_dir), options.out_dir,
+                               filters, skills, options.workers, options.row_group_size)
+    except ValueError as e:
+        parser.error(str(e))
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
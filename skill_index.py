@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Skill Index for Classic Traveller Character Generator
+
+GMs search the archive for "someone with Pilot-2 and Navigation". Checking every
+character's skills dict is a full scan, so this module keeps an inverted index
+from (skill, level) to the characters holding that skill at exactly that level.
+
+Each character gets a small integer position and each (skill, level) keeps a
+bitmap (a Python int) of positions. "Pilot-2" is the OR of the Pilot bitmaps for
+levels 2 and up, AND intersects terms and OR unions groups, so a query is a few
+big-integer operations however large the archive is. The archive manifest feeds
+the index as rows are read or recorded, so it is always as current as the
+manifest.
+
+Queries are written "Pilot-2 AND Navigation OR Ship's Boat-1": OR separates
+alternatives, AND joins requirements, and "Skill-N" asks for level N or better
+(a bare skill name means any level). Skill names are matched case-insensitively.
+
+Usage:
+    import skill_index
+
+    index = skill_index.SkillIndex()
+    index.update("0000000001", {"Pilot": 2, "Navigation": 1})
+    query = skill_index.parse_skill_query("Pilot-2 AND Navigation")
+    index.matching_ids(index.match(query))   # ["0000000001"]
+"""
+
+import re
+from typing import Any, List, Optional
+
+# Longest query accepted, and most terms in it
+MAX_QUERY_LENGTH = 500
+MAX_QUERY_TERMS = 20
+
+# AND/OR only as whole words, so "Pilot AND" leaves an empty (invalid) term
+OR_PATTERN = re.compile(r'\s*(?<!\S)OR(?!\S)\s*', re.IGNORECASE)
+AND_PATTERN = re.compile(r'\s*(?<!\S)AND(?!\S)\s*', re.IGNORECASE)
+# "Jack-of-all-Trades-1": the level is only the trailing number
+TERM_PATTERN = re.compile(r'^(.+?)(?:-(\d+))?$')
+
+def parse_skill_query(text: str) -> List[List[tuple]]:
+    """
+    Parse a skill query into OR-groups of AND-ed (skill, minimum level) terms
+
+    Args:
+        text: Query such as "Pilot-2 AND Navigation OR Ship's Boat-1"
+
+    Returns:
+        List of groups, each a list of (lower-case skill name, minimum level)
+
+    Raises:
+        ValueError: If the query is empty, too long or has an empty term
+    """
+    text = (text or "").strip()
+    if not text:
+        raise ValueError("Skill query is empty")
+    if len(text) > MAX_QUERY_LENGTH:
+        raise ValueError(f"Skill query is longer than {MAX_QUERY_LENGTH} characters")
+    groups = []
+    for alternative in OR_PATTERN.split(text):
+        group = []
+        for term in AND_PATTERN.split(alternative.strip()):
+            match = TERM_PATTERN.match(term.strip())
+            if not match or not match.group(1).strip():
+                raise ValueError(f"Invalid skill term: '{term}'")
+            group.append((match.group(1).strip().lower(), int(match.group(2) or 0)))
+        groups.append(group)
+    if sum(len(group) for group in groups) > MAX_QUERY_TERMS:
+        raise ValueError(f"Skill query has more than {MAX_QUERY_TERMS} terms")
+    return groups
+
+def positions_bitmap(positions: List[int]) -> int:
+    """Bitmap with the given positions set, built in one pass over a byte buffer"""
+    low = min(positions)
+    buffer = bytearray(((max(positions) - low) >> 3) + 1)
+    for position in positions:
+        offset = position - low
+        buffer[offset >> 3] |= 1 << (offset & 7)
+    return int.from_bytes(buffer, "little") << low
+
+class SkillIndex:
+    """Inverted index from (skill, level) to bitmaps of character positions"""
+
+    def __init__(self):
+        self._bitmaps = {}     # (skill, level) -> int bitmap of positions
+        self._levels = {}      # skill -> set of levels present in _bitmaps
+        self._positions = {}   # character id -> bit position
+        self._ids = []         # bit position -> character id
+        self._indexed = []     # bit position -> (skill, level) pairs currently set
+
+    def update(self, character_id: str, skills: Optional[dict[str, Any]]) -> None:
+        """Index a character's current skills, replacing whatever was indexed before"""
+        position = self._positions.get(character_id)
+        if position is None:
+            position = len(self._ids)
+            self._positions[character_id] = position
+            self._ids.append(character_id)
+            self._indexed.append(())
+        pairs = tuple((str(skill).lower(), level) for skill, level in (skills or {}).items()
+                      if isinstance(level, int))
+        old_pairs = self._indexed[position]
+        if pairs == old_pairs:
+            return
+        bit = 1 << position
+        for pair in old_pairs:
+            self._bitmaps[pair] &= ~bit
+        for pair in pairs:
+            self._bitmaps[pair] = self._bitmaps.get(pair, 0) | bit
+            self._levels.setdefault(pair[0], set()).add(pair[1])
+        self._indexed[position] = pairs
+
+    def update_many(self, entries) -> None:
+        """
+        Index many (character_id, skills) at once. Each (skill, level) bitmap is
+        rebuilt once for the whole batch instead of once per character, which
+        matters when bulk loads make the bitmaps large.
+        """
+        added = {}     # (skill, level) -> positions gaining it
+        removed = {}   # (skill, level) -> positions losing it
+        # The last entry for a character wins, as with repeated update() calls
+        for character_id, skills in dict(entries).items():
+            position = self._positions.get(character_id)
+            if position is None:
+                position = len(self._ids)
+                self._positions[character_id] = position
+                self._ids.append(character_id)
+                self._indexed.append(())
+            pairs = tuple((str(skill).lower(), level) for skill, level in (skills or {}).items()
+                          if isinstance(level, int))
+            old_pairs = self._indexed[position]
+            if pairs == old_pairs:
+                continue
+            for pair in old_pairs:
+                removed.setdefault(pair, []).append(position)
+            for pair in pairs:
+                added.setdefault(pair, []).append(position)
+            self._indexed[position] = pairs
+        for pair, positions in removed.items():
+            self._bitmaps[pair] &= ~positions_bitmap(positions)
+        for pair, positions in added.items():
+            self._bitmaps[pair] = self._bitmaps.get(pair, 0) | positions_bitmap(positions)
+            self._levels.setdefault(pair[0], set()).add(pair[1])
+
+    def skill_bitmap(self, skill: str, min_level: int = 0) -> int:
+        """Characters holding skill at min_level or better"""
+        bitmap = 0
+        for level in self._levels.get(skill, ()):
+            if level >= min_level:
+                bitmap |= self._bitmaps[(skill, level)]
+        return bitmap
+
+    def match(self, groups: List[List[tuple]]) -> int:
+        """Bitmap of characters matching a parsed query (see parse_skill_query)"""
+        result = 0
+        for group in groups:
+            matched = None
+            for skill, level in group:
+                bitmap = self.skill_bitmap(skill, level)
+                matched = bitmap if matched is None else matched & bitmap
+                if not matched:
+                    break
+            result |= matched or 0
+        return result
+
+    def matching_ids(self, bitmap: int) -> List[str]:
+        """Sorted character IDs for the set bits of a bitmap"""
+        # Reading the binary string once is far faster than peeling bits off a large int
+        bits = bin(bitmap)[:1:-1]
+        ids = []
+        position = bits.find("1")
+        while position != -1:
+            ids.append(self._ids[position])
+            position = bits.find("1", position + 1)
+        ids.sort()
+        return ids
+
+    def skills(self) -> dict[str, List[int]]:
+        """Skill names in the index and the levels held by at least one character"""
+        return {skill: sorted(level for level in levels if self._bitmaps[(skill, level)])
+                for skill, levels in sorted(self._levels.items())
+                if any(self._bitmaps[(skill, level)] for level in levels)}
+
+    def __len__(self) -> int:
+        return len(self._ids)
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Shared State Backend for Classic Traveller Character Generator
+
+The web app's current character and global seed must be the same in every
+worker process of a multi-worker WSGI server, so this module keeps them in a
+shared key-value store rather than in process memory. Every value carries a
+version number; each worker keeps a read-through cache and only re-reads a value
+when its version has changed. A value set with expires_in (such as a stored
+Idempotency-Key response) is dropped once it expires, as though it had never
+been set, and is not cached.
+
+Stores are chosen by STATE_STORAGE_URL:
+    memory://               In-process dictionary (single worker, tests)
+    sqlite:///path/to/db    SQLite file shared by every worker on one host
+    redis://host:6379/0     Redis, shared across hosts (needs the redis package)
+
+Usage:
+    import state_backend
+
+    store = state_backend.create_state_store("sqlite:///data/state.db")
+    store.set("global_seed", 42)
+    store.get("global_seed")
+    store.set("idempotency:...", entry, expected_version=0, expires_in=86400)
+"""
+
+import copy
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+class VersionConflict(Exception):
+    """Raised when a compare-and-set finds the value was changed by someone else"""
+
+class MemoryStateStore:
+    """Versioned values in a dictionary - the single-process stand-in for a shared store"""
+
+    def __init__(self):
+        self._values = {}
+        self._deadlines = {}
+        self._expiry = []   # heap of (deadline, key) for values set with expires_in
+        self._lock = threading.Lock()
+
+    def _expire(self) -> None:
+        """Drop expired values (called with the lock held)"""
+        now = time.time()
+        while self._expiry and self._expiry[0][0] <= now:
+            deadline, key = heapq.heappop(self._expiry)
+            if self._deadlines.get(key) == deadline:
+                del self._deadlines[key]
+                del self._values[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a copy of a value (callers may modify it freely)"""
+        with self._lock:
+            self._expire()
+            if key not in self._values:
+                return default
+            return copy.deepcopy(self._values[key][1])
+
+    def get_with_version(self, key: str, default: Any = None) -> tuple:
+        """Get a copy of a value together with its version (0 if it was never set)"""
+        with self._lock:
+            self._expire()
+            if key not in self._values:
+                return default, 0
+            version, value = self._values[key]
+            return copy.deepcopy(value), version
+
+    def get_version(self, key: str) -> int:
+        """Current version of a key (0 if it was never set)"""
+        with self._lock:
+            self._expire()
+            return self._values.get(key, (0, None))[0]
+
+    def set(self, key: str, value: Any, expected_version: Optional[int] = None,
+            text: Optional[str] = None, expires_in: Optional[float] = None) -> int:
+        """
+        Store a value; returns its new version (text, the value's JSON, is not needed here)
+
+        Raises:
+            VersionConflict: If expected_version is given and the stored version differs
+        """
+        with self._lock:
+            self._expire()
+            version = self._values.get(key, (0, None))[0]
+            if expected_version is not None and version != expected_version:
+                raise VersionConflict(f"{key} is at version {version}, expected {expected_version}")
+            self._values[key] = (version + 1, copy.deepcopy(value))
+            if expires_in is None:
+                self._deadlines.pop(key, None)
+            else:
+                self._deadlines[key] = time.time() + expires_in
+                heapq.heappush(self._expiry, (self._deadlines[key], key))
+            return version + 1
+
+    def set_default(self, key: str, value: Any) -> Any:
+        """Store a value only if the key has never been set; returns the stored value"""
+        with self._lock:
+            self._expire()
+            if key not in self._values:
+                self._values[key] = (1, copy.deepcopy(value))
+            return copy.deepcopy(self._values[key][1])
+
+class CachedStateStore:
+    """
+    Base class for shared stores with a per-worker read-through cache
+
+    Values are stored as JSON text. The cache keeps (version, text) per key, so a
+    read whose version is unchanged costs one small version lookup and a json.loads
+    of the cached text instead of a round trip for the whole value. Values that
+    expire are read from the store every time, so they never fill the cache.
+    """
+
+    def __init__(self):
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a fresh copy of a value (callers may modify it freely)"""
+        return self.get_with_version(key, default)[0]
+
+    def get_with_version(self, key: str, default: Any = None) -> tuple:
+        """Get a fresh copy of a value together with its version (0 if it was never set)"""
+        version = self.get_version(key)
+        if version == 0:
+            return default, 0
+        with self._cache_lock:
+            cached = self._cache.get(key)
+        if cached is None or cached[0] != version:
+            row = self._read(key)
+            if row is None:
+                return default, 0
+            version, text, expires = row
+            cached = (version, text)
+            if not expires:
+                with self._cache_lock:
+                    self._cache[key] = cached
+        return json.loads(cached[1]), cached[0]
+
+    def set(self, key: str, value: Any, expected_version: Optional[int] = None,
+            text: Optional[str] = None, expires_in: Optional[float] = None) -> int:
+        """
+        Store a value; returns its new version
+
+        Args:
+            text: The value already encoded as JSON, if the caller has it
+            expires_in: Seconds after which the value is dropped (None to keep it)
+
+        Raises:
+            VersionConflict: If expected_version is given and the stored version differs
+        """
+        if text is None:
+            text = json.dumps(value, separators=(',', ':'))
+        version = self._write(key, text, expected_version=expected_version, expires_in=expires_in)
+        with self._cache_lock:
+            if expires_in is None:
+                self._cache[key] = (version, text)
+            else:
+                self._cache.pop(key, None)
+        return version
+
+    def set_default(self, key: str, value: Any) -> Any:
+        """Store a value only if the key has never been set; returns the stored value"""
+        self._write(key, json.dumps(value, separators=(',', ':')), only_if_missing=True)
+        return self.get(key)
+
+    def get_version(self, key: str) -> int:
+        raise NotImplementedError
+
+    def _read(self, key: str) -> Optional[tuple]:
+        """Read (version, text, expires) for a key, or None if it is not set"""
+        raise NotImplementedError
+
+    def _write(self, key: str, text: str, only_if_missing: bool = False,
+               expected_version: Optional[int] = None, expires_in: Optional[float] = None) -> int:
+        """Write a key's text, bumping its version; returns the version now stored"""
+        raise NotImplementedError
+
+class SQLiteStateStore(CachedStateStore):
+    """Versioned values in a SQLite file - shared by all worker processes on one host"""
+
+    def __init__(self, path: str):
+        super().__init__()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._pid = None
+        self._open()
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS shared_state "
+            "(key TEXT PRIMARY KEY, version INTEGER NOT NULL, value TEXT NOT NULL, expires_at REAL)")
+        # Databases created before values could expire lack the column
+        columns = [row[1] for row in self._connection.execute("PRAGMA table_info(shared_state)")]
+        if "expires_at" not in columns:
+            self._connection.execute("ALTER TABLE shared_state ADD COLUMN expires_at REAL")
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS shared_state_expiry ON shared_state (expires_at)")
+
+    def _open(self) -> None:
+        self._connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._pid = os.getpid()
+        # PRAGMA data_version only changes when another connection commits, so an
+        # unchanged value means every cached entry is still current
+        self._data_version = None
+        self._versions = {}
+
+    def _db(self) -> sqlite3.Connection:
+        # A connection must not be shared with a forked worker; each process opens its own
+        if self._pid != os.getpid():
+            self._open()
+        return self._connection
+
+    def get_version(self, key: str) -> int:
+        with self._lock:
+            connection = self._db()
+            data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self._data_version:
+                self._versions = dict(connection.execute(
+                    "SELECT key, version FROM shared_state WHERE expires_at IS NULL"))
+                self._data_version = data_version
+            version = self._versions.get(key)
+            if version is None:
+                # Values that expire are looked up one at a time, so they never fill the version map
+                row = connection.execute("SELECT version FROM shared_state WHERE key = ? AND expires_at > ?",
+                                         (key, time.time())).fetchone()
+                version = row[0] if row else 0
+            return version
+
+    def _read(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            return self._db().execute(
+                "SELECT version, value, expires_at IS NOT NULL FROM shared_state "
+                "WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())).fetchone()
+
+    def _write(self, key: str, text: str, only_if_missing: bool = False,
+               expected_version: Optional[int] = None, expires_in: Optional[float] = None) -> int:
+        with self._lock:
+            connection = self._db()
+            now = time.time()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                if expires_in is not None:
+                    connection.execute("DELETE FROM shared_state WHERE expires_at <= ?", (now,))
+                row = connection.execute(
+                    "SELECT version FROM shared_state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                    (key, now)).fetchone()
+                current_version = row[0] if row else 0
+                if expected_version is not None and current_version != expected_version:
+                    raise VersionConflict(f"{key} is at version {current_version}, expected {expected_version}")
+                if row and only_if_missing:
+                    version = row[0]
+                else:
+                    version = (row[0] if row else 0) + 1
+                    connection.execute(
+                        "INSERT OR REPLACE INTO shared_state (key, version, value, expires_at) VALUES (?, ?, ?, ?)",
+                        (key, version, text, None if expires_in is None else now + expires_in))
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            if expires_in is None:
+                self._versions[key] = version
+            else:
+                self._versions.pop(key, None)
+            return version
+
+class RedisStateStore(CachedStateStore):
+    """Versioned values in Redis hashes - shared across hosts"""
+
+    WRITE_SCRIPT = """
+if ARGV[2] == '1' and redis.call('EXISTS', KEYS[1]) == 1 then
+    return tonumber(redis.call('HGET', KEYS[1], 'version'))
+end
+if ARGV[3] ~= '' and tonumber(redis.call('HGET', KEYS[1], 'version') or '0') ~= tonumber(ARGV[3]) then
+    return -1
+end
+local version = redis.call('HINCRBY', KEYS[1], 'version', 1)
+redis.call('HSET', KEYS[1], 'value', ARGV[1])
+if ARGV[4] ~= '' then
+    redis.call('HSET', KEYS[1], 'expires', '1')
+    redis.call('PEXPIRE', KEYS[1], ARGV[4])
+else
+    redis.call('HDEL', KEYS[1], 'expires')
+    redis.call('PERSIST', KEYS[1])
+end
+return version
+"""
+
+    def __init__(self, url: str, client=None):
+        super().__init__()
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ValueError("STATE_STORAGE_URL uses Redis but the 'redis' package is not installed")
+            client = redis.Redis.from_url(url)
+        self._client = client
+        self._write_script = client.register_script(self.WRITE_SCRIPT)
+
+    def get_version(self, key: str) -> int:
+        version = self._client.hget(f"state:{key}", "version")
+        return int(version) if version else 0
+
+    def _read(self, key: str) -> Optional[tuple]:
+        version, text, expires = self._client.hmget(f"state:{key}", "version", "value", "expires")
+        if version is None:
+            return None
+        return int(version), text.decode() if isinstance(text, bytes) else text, expires is not None
+
+    def _write(self, key: str, text: str, only_if_missing: bool = False,
+               expected_version: Optional[int] = None, expires_in: Optional[float] = None) -> int:
+        expected = '' if expected_version is None else str(expected_version)
+        expires = '' if expires_in is None else str(max(1, int(expires_in * 1000)))
+        version = int(self._write_script(keys=[f"state:{key}"],
+                                         args=[text, '1' if only_if_missing else '0', expected, expires]))
+        if version < 0:
+            raise VersionConflict(f"{key} changed, expected version {expected_version}")
+        return version
+
+def create_state_store(storage_url: str):
+    """
+    Create the shared state store for a STATE_STORAGE_URL
+
+    Raises:
+        ValueError: If the URL scheme is not supported
+    """
+    if storage_url.startswith("memory://"):
+        return MemoryStateStore()
+    if storage_url.startswith("sqlite:///"):
+        return SQLiteStateStore(storage_url[len("sqlite:///"):])
+    if storage_url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStateStore(storage_url)
+    raise ValueError(f"Unsupported STATE_STORAGE_URL: {storage_url}")
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Archive Manifest Testing for Classic Traveller Character Generator
+
+This module checks that the archive manifest tracks saved characters without
+re-reading their files: filters and keyset pagination, rows appended by another
+process, compaction of superseded rows, and a parallel rebuild from the files.
+It also checks skill queries against the inverted skill index and the top-K
+leaderboards against sorting the whole archive, and that new characters never
+reuse an archived character's ID.
+
+Usage: python test_archive.py
+"""
+
+import json
+import os
+import random
+import tempfile
+
+import app as app_module
+import character_archive
+import character_generation_rules as chargen
+import character_ids
+import leaderboards
+import skill_index
+import state_backend
+from test_concurrency import AppTestConfig, with_test_app
+
+def save_characters(characters_dir, manifest, count, start=0):
+    """Generate finished characters, write their files and record them in the manifest"""
+    os.makedirs(characters_dir, exist_ok=True)
+    characters = []
+    for index in range(start, start + count):
+        character = chargen.generate_complete_character(chargen.derive_seed(5, index))
+        character["character_id"] = f"{index:010d}"
+        path = os.path.join(characters_dir, f"{character['character_id']}.json")
+        with open(path, 'w') as f:
+            json.dump(character, f)
+        if manifest is not None:
+            manifest.record(character, path)
+        characters.append(character)
+    return characters
+
+def test_filters_and_pagination():
+    """Pages follow the cursor without gaps or repeats, honour the filters and keep totals current"""
+    with tempfile.TemporaryDirectory() as characters_dir:
+        manifest = character_archive.ArchiveManifest(characters_dir)
+        characters = save_characters(characters_dir, manifest, 60)
+
+        seen = []
+        after = None
+        while True:
+            page = manifest.query({}, limit=25, after=after)
+            seen.extend(row["id"] for row in page["characters"])
+            assert page["total"] == 60
+            after = page["next_cursor"]
+            if after is None:
+                break
+        assert seen == sorted(character["character_id"] for character in characters)
+
+        filters = character_archive.parse_filters({"career": "navy", "min_terms": "2"})
+        expected = sorted(c["character_id"] for c in characters
+                          if c["career"] == "Navy" and c["terms_served"] >= 2)
+        page = manifest.query(filters, limit=500)
+        assert [row["id"] for row in page["characters"]] == expected
+        assert page["total"] == len(expected) and page["next_cursor"] is None
+
+        # Totals are remembered per query, and recounted once the rows change
+        extra = save_characters(characters_dir, manifest, 1, start=60)[0]
+        assert manifest.query({}, limit=1)["total"] == 61
+        page = manifest.query(filters, limit=1)
+        assert page["total"] == len(expected) + (extra["career"] == "Navy" and extra["terms_served"] >= 2)
+
+def test_other_process_appends_are_seen():
+    """A second manifest instance (another worker) sees appended and updated rows"""
+    with tempfile.TemporaryDirectory() as characters_dir:
+        writer = character_archive.ArchiveManifest(characters_dir)
+        reader = character_archive.ArchiveManifest(characters_dir)
+        save_characters(characters_dir, writer, 3)
+        assert len(reader) == 3
+
+        character = save_characters(characters_dir, None, 1, start=1)[0]
+        character["name"] = "Renamed Traveller"
+        writer.record(character, os.path.join(characters_dir, "0000000001.json"))
+        assert len(reader) == 3
+        assert reader.get("0000000001")["name"] == "Renamed Traveller"
+
+def test_compaction_keeps_latest_rows():
+    """Superseded rows are compacted away and the latest row per character survives"""
+    original = character_archive.COMPACT_MIN_SUPERSEDED
+    try:
+        character_archive.COMPACT_MIN_SUPERSEDED = 5
+        with tempfile.TemporaryDirectory() as characters_dir:
+            manifest = character_archive.ArchiveManifest(characters_dir)
+            character = save_characters(characters_dir, manifest, 1)[0]
+            path = os.path.join(characters_dir, "0000000000.json")
+            for age in range(20, 40):
+                character["age"] = age
+                manifest.record(character, path)
+            with open(manifest.path) as f:
+                lines = f.read().splitlines()
+            assert len(lines) < 10, f"Manifest was not compacted ({len(lines)} lines)"
+            assert character_archive.ArchiveManifest(characters_dir).get("0000000000")["age"] == 39
+    finally:
+        character_archive.COMPACT_MIN_SUPERSEDED = original
+
+def test_parallel_rebuild_matches_incremental():
+    """Rebuilding from the files gives the same rows as recording each save"""
+    with tempfile.TemporaryDirectory() as characters_dir:
+        manifest = character_archive.ArchiveManifest(characters_dir)
+        save_characters(characters_dir, manifest, 40)
+        incremental = manifest.query({}, limit=500)["characters"]
+        os.remove(manifest.path)
+
+        rebuilt = character_archive.ArchiveManifest(characters_dir)
+        assert rebuilt.rebuild(max_workers=2, chunk_size=7) == 40
+        assert rebuilt.query({}, limit=500)["characters"] == incremental
+
+def check_archive_endpoints(client):
+    created = []
+    for _ in range(3):
+        character = client.post('/api/autoplay', json={"scope": "career"}).get_json()["character"]
+        created.append(character["character_id"])
+        assert client.post('/api/archive_character').status_code == 200
+
+    first = client.get('/api/archive?limit=2').get_json()
+    assert first["total"] == 3 and [row["id"] for row in first["characters"]] == created[:2]
+    second = client.get(f'/api/archive?limit=2&after={first["next_cursor"]}').get_json()
+    assert [row["id"] for row in second["characters"]] == created[2:]
+    assert client.get('/api/archive?min_terms=lots').status_code == 400
+
+    detail = client.get(f'/api/archive/{created[0]}').get_json()
+    assert detail["character"]["character_id"] == created[0]
+    assert detail["summary"]["upp"] == detail["character"]["upp"]
+    assert client.get('/api/archive/9999999999').status_code == 404
+    client.get(f'/api/archive/{created[0]}')
+    cache = client.get('/api/metrics').get_json()["character_cache"]
+    assert cache["hits"] >= 1 and cache["misses"] >= 1
+
+    skills = client.get('/api/archive/skills').get_json()["skills"]
+    skill, levels = next(iter(skills.items()))
+    found = client.get(f'/api/archive/skills?q={skill}-{levels[0]}&limit=10').get_json()
+    assert found["total"] >= 1
+    assert all(skill in {name.lower() for name in row["skills"]} for row in found["characters"])
+    assert client.get('/api/archive/skills?q=Pilot AND').status_code == 400
+
+    boards = client.get('/api/leaderboards?limit=2').get_json()["leaderboards"]
+    assert set(boards) == set(leaderboards.METRIC_NAMES) and len(boards["cash"]) == 2
+    assert boards["cash"][0]["value"] >= boards["cash"][1]["value"]
+    assert client.get('/api/leaderboards?metric=charm').status_code == 400
+    assert client.get('/api/leaderboards?career=Pirates').status_code == 400
+
+    rebuilt = client.post('/api/archive/rebuild').get_json()
+    assert rebuilt["characters"] == 3
+
+def test_archive_endpoints():
+    """Archived characters can be listed, paged, fetched by ID and re-indexed over HTTP"""
+    with_test_app(check_archive_endpoints)
+
+def check_new_ids_skip_archived(client):
+    for _ in range(2):
+        client.post('/api/create_character')
+        client.post('/api/archive_character')
+    archived = {row["id"]: row for row in client.get('/api/archive').get_json()["characters"]}
+
+    # A restart with a fresh (memory://) state store, whose ID counter starts from nothing
+    restarted = app_module.create_app(AppTestConfig()).test_client()
+    restarted.post('/api/create_character')
+    created = restarted.get('/api/current_character').get_json()["character"]["character_id"]
+    assert created == character_ids.format_character_id(len(archived) + 1), created
+
+    # A counter moved back while running is skipped past the archived IDs, not reused
+    services = app_module.app_services(restarted.application)
+    services.id_allocator = character_ids.CharacterIdAllocator(state_backend.MemoryStateStore())
+    restarted.post('/api/archive_character')
+    restarted.post('/api/create_character')
+    created = restarted.get('/api/current_character').get_json()["character"]["character_id"]
+    assert created == character_ids.format_character_id(len(archived) + 2), created
+    rows = restarted.get('/api/archive').get_json()["characters"]
+    assert len(rows) == len(archived) + 2
+    assert all(row == archived[row["id"]] for row in rows if row["id"] in archived)
+
+def test_new_ids_skip_archived():
+    """New characters never take the ID of an archived one, even when the ID counter starts over"""
+    with_test_app(check_new_ids_skip_archived)
+
+def test_skill_index_queries():
+    """AND/OR skill queries with minimum levels match exactly, and updates replace old skills"""
+    index = skill_index.SkillIndex()
+    index.update("a", {"Pilot": 2, "Navigation": 1})
+    index.update("b", {"Pilot": 1, "Navigation": 3})
+    index.update("c", {"Jack-of-all-Trades": 1, "Ship's Boat": 2})
+
+    def ids(text):
+        return index.matching_ids(index.match(skill_index.parse_skill_query(text)))
+    assert ids("Pilot-2 AND Navigation") == ["a"]
+    assert ids("pilot and navigation-2") == ["b"]
+    assert ids("Pilot-2 OR Ship's Boat-1") == ["a", "c"]
+    assert ids("Jack-of-all-Trades-1") == ["c"]
+    assert ids("Pilot-3") == []
+
+    index.update("a", {"Navigation": 1})
+    assert ids("Pilot") == ["b"]
+    assert index.skills()["pilot"] == [1]
+
+def test_skill_search_matches_scan():
+    """Manifest skill queries agree with scanning every character's skills"""
+    with tempfile.TemporaryDirectory() as characters_dir:
+        manifest = character_archive.ArchiveManifest(characters_dir)
+        characters = save_characters(characters_dir, manifest, 80)
+        query = "Gun Combat-2 AND Vehicle OR Pilot OR Blade Combat-3"
+        expected = sorted(c["character_id"] for c in characters
+                          if (c["skills"].get("Gun Combat", 0) >= 2 and "Vehicle" in c["skills"])
+                          or "Pilot" in c["skills"] or c["skills"].get("Blade Combat", 0) >= 3)
+        page = manifest.query({}, limit=500, skills=skill_index.parse_skill_query(query))
+        assert [row["id"] for row in page["characters"]] == expected
+        assert expected, "Query matched nobody; pick one that exercises the index"
+
+        # Another worker's manifest builds its index from the file
+        other = character_archive.ArchiveManifest(characters_dir)
+        assert other.query({}, limit=500, skills=skill_index.parse_skill_query(query)) == page
+
+def test_leaderboards_match_full_sort():
+    """Top-K boards agree with sorting every character, through promotions and demotions"""
+    rng = random.Random(39)
+    boards = leaderboards.Leaderboards(size=5)
+    latest = {}
+    for step in range(400):
+        character_id = f"{rng.randrange(60):010d}"
+        row = {"id": character_id, "career": rng.choice(["Navy", "Army"]),
+               "status": "complete" if rng.random() < 0.9 else "active",
+               "cash": rng.randrange(0, 50000, 1000), "rank": rng.randrange(7),
+               "terms": rng.randrange(1, 8), "skills": {"Pilot": rng.randrange(1, 4)}}
+        boards.update(row)
+        latest[character_id] = row
+        if step % 50 == 49:
+            for metric in leaderboards.METRIC_NAMES:
+                for career in (None, "Navy", "Army"):
+                    expected = sorted(((leaderboards.METRICS[metric](r), r["id"]) for r in latest.values()
+                                       if r["status"] == "complete" and career in (None, r["career"])),
+                                      reverse=True)[:5]
+                    got = boards.top(metric, career, limit=5)
+                    assert got == [(i, v) for v, i in expected], f"{metric}/{career}: {got} != {expected}"
+
+def test_manifest_leaderboard():
+    """The manifest ranks finished characters and returns their rows best first"""
+    with tempfile.TemporaryDirectory() as characters_dir:
+        manifest = character_archive.ArchiveManifest(characters_dir)
+        characters = save_characters(characters_dir, manifest, 30)
+        top = manifest.leaderboard("cash", limit=3)
+        best = sorted(characters, key=lambda c: (c["mustering_out_benefits"]["cash"], c["character_id"]),
+                      reverse=True)[:3]
+        assert [row["id"] for row in top] == [c["character_id"] for c in best]
+        assert top[0]["value"] == best[0]["mustering_out_benefits"]["cash"]
+        navy = character_archive.ArchiveManifest(characters_dir).leaderboard("terms", career="Navy", limit=100)
+        assert all(row["career"] == "Navy" for row in navy)
+        assert len(navy) == sum(1 for c in characters if c["career"] == "Navy")
+
+def test_invalid_query_rejected():
+    """Non-numeric ranges and out-of-range page sizes raise ValueError"""
+    for parse, args in ((character_archive.parse_filters, {"min_terms": "many"}),
+                        (character_archive.parse_page, {"limit": "0"}),
+                        (character_archive.parse_page, {"limit": "100000"}),
+                        (skill_index.parse_skill_query, " "),
+                        (skill_index.parse_skill_query, "Pilot AND  AND Navigation")):
+        try:
+            parse(args)
+        except ValueError:
+            continue
+        raise AssertionError(f"{args} was accepted")
+
+def main():
+    """Run all archive manifest tests"""
+    print("CLASSIC TRAVELLER ARCHIVE MANIFEST TESTING")
+    tests = [
+        test_filters_and_pagination,
+        test_other_process_appends_are_seen,
+        test_compaction_keeps_latest_rows,
+        test_parallel_rebuild_matches_incremental,
+        test_skill_index_queries,
+        test_skill_search_matches_scan,
+        test_leaderboards_match_full_sort,
+        test_manifest_leaderboard,
+        test_invalid_query_rejected,
+        test_archive_endpoints,
+        test_new_ids_skip_archived
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"{test.__name__:45} ✅ PASSED")
+        except AssertionError as e:
+            print(f"{test.__name__:45} ❌ FAILED: {e}")
+
+if __name__ == "__main__":
+    main()
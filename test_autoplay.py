@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Autoplay Policy Testing for Classic Traveller Character Generator
+
+This module checks that policy-driven autoplay (autoplay_term / autoplay_career)
+finishes careers, honours the policy fields, and is reproducible for a seed, and
+that batched action pipelines (run_action_pipeline) apply atomically.
+
+Usage: python test_autoplay.py
+"""
+
+import character_generation_rules as chargen
+from test_concurrency import with_test_app
+
+def new_character(seed):
+    """Create a seeded character record and matching random generator"""
+    character = chargen.create_character_record()
+    character["name"] = f"Autoplay {seed}"
+    character["seed"] = seed
+    return chargen.set_seed(seed), character
+
+def test_full_career_completes():
+    """Every seeded career should end mustered out with a sensible term count"""
+    for seed in range(50):
+        rng, character = new_character(seed)
+        character = chargen.autoplay_career(rng, character)
+        assert character.get("mustering_out_benefits"), f"Seed {seed} did not muster out"
+        assert character["upp"].count("_") == 0
+        assert 0 <= character["terms_served"] <= chargen.AUTOPLAY_MAX_TERMS
+
+def test_single_term_stops_after_reenlistment():
+    """Term scope should play exactly one term unless the career ends"""
+    rng, character = new_character(7)
+    character = chargen.autoplay_term(rng, character, {"service": "Scouts"})
+    reenlistments = [e for e in character["career_history"] if e["event_type"] == "reenlistment_attempt"]
+    assert len(reenlistments) >= 1
+    if reenlistments[-1].get("continue_career"):
+        assert character["terms_served"] == 1
+        assert character["rdy_for_survival_check"]
+        assert not character.get("mustering_out_benefits")
+    else:
+        assert character.get("mustering_out_benefits")
+
+def test_reenlist_until_term_and_cash_split():
+    """reenlist_until_term=1 leaves after the first term; cash_rolls=0 takes only benefits"""
+    # Force every roll to 11 so the character always survives and never rolls a mandatory 12
+    original_roll_2d6 = chargen.roll_2d6
+    try:
+        chargen.roll_2d6 = lambda rng: 11
+        rng, character = new_character(3)
+        policy = {"service": "Navy", "reenlist_until_term": 1, "cash_rolls": 0}
+        character = chargen.autoplay_career(rng, character, policy)
+    finally:
+        chargen.roll_2d6 = original_roll_2d6
+    assert character["terms_served"] == 1
+    benefits = character["mustering_out_benefits"]
+    assert benefits["cash_roll_details"] == []
+    assert benefits["cash"] == 0
+
+def test_retire_when_eligible():
+    """With rolls of 11 the character reenlists until term 5, then retires"""
+    original_roll_2d6 = chargen.roll_2d6
+    try:
+        chargen.roll_2d6 = lambda rng: 11
+        rng, character = new_character(11)
+        policy = {"service": "Army", "retire_when_eligible": True, "skill_tables": ["education", "service"]}
+        character = chargen.autoplay_career(rng, character, policy)
+    finally:
+        chargen.roll_2d6 = original_roll_2d6
+    last_reenlistment = [e for e in character["career_history"] if e["event_type"] == "reenlistment_attempt"][-1]
+    assert last_reenlistment["outcome"] == "retired"
+    assert character["terms_served"] == 5
+
+def test_same_seed_same_character():
+    """Autoplay must be reproducible for the same seed and policy"""
+    results = []
+    for _ in range(2):
+        rng, character = new_character(1234)
+        results.append(chargen.autoplay_career(rng, character, {"reenlist_until_age": 34}))
+    assert results[0] == results[1]
+
+def test_invalid_policy_rejected():
+    """Unknown fields and out-of-range values raise ValueError"""
+    bad_policies = [
+        {"colour": "blue"},
+        {"service": "Pirates"},
+        {"skill_tables": ["cooking"]},
+        {"reenlist_until_term": 0},
+        {"cash_rolls": 4},
+        {"retire_when_eligible": "yes"}
+    ]
+    for policy in bad_policies:
+        try:
+            chargen.normalize_autoplay_policy(policy)
+        except ValueError:
+            continue
+        raise AssertionError(f"Policy {policy} was accepted")
+
+def test_action_pipeline_applies_steps():
+    """A valid pipeline advances the character and reports events per step"""
+    original_roll_2d6 = chargen.roll_2d6
+    try:
+        chargen.roll_2d6 = lambda rng: 11
+        rng, character = new_character(21)
+        steps = [f"characteristic:{name}" for name in chargen.UPP_ORDER]
+        steps += ["enlist:Navy", "survival", "commission", "promotion",
+                  "skill:service", "skill:personal", "skill:education", "skill:advanced",
+                  "ageing", "reenlist:reenlist"]
+        updated, results = chargen.run_action_pipeline(rng, character, steps)
+    finally:
+        chargen.roll_2d6 = original_roll_2d6
+    assert [result["step"] for result in results] == steps
+    assert updated["terms_served"] == 1
+    assert updated["rank"] == 2
+    assert chargen.get_available_actions(updated) == ["survival"]
+
+def test_action_pipeline_rolls_back():
+    """A step blocked by the readiness flags fails the batch and leaves the record untouched"""
+    rng, character = new_character(22)
+    character = chargen.autoplay_term(rng, character, {"service": "Scouts", "reenlist_until_term": 9})
+    snapshot = repr(character)
+    for steps in (["survival", "ageing", "survival"], ["survival", "teleport"]):
+        try:
+            chargen.run_action_pipeline(rng, character, steps)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"Pipeline {steps} should have failed")
+        assert repr(character) == snapshot
+
+def test_invalid_step_arguments_rejected():
+    """A bad step argument fails the batch while parsing, before any dice are rolled"""
+    rng, character = new_character(23)
+    rolls = []
+    original_roll_2d6 = chargen.roll_2d6
+    chargen.roll_2d6 = lambda generator: rolls.append(1) or original_roll_2d6(generator)
+    try:
+        for bad_step in ("reenlist:later", "skill:cooking", "enlist:Pirates", "characteristic:luck"):
+            try:
+                chargen.run_action_pipeline(rng, character, ["characteristic:strength", bad_step])
+            except ValueError as e:
+                assert "Invalid" in str(e), str(e)
+            else:
+                raise AssertionError(f"Step {bad_step} should have been rejected")
+        try:
+            chargen.attempt_reenlistment(rng, dict(character, career="Navy", age=22), "later")
+            assert False, "unknown reenlistment preference accepted"
+        except ValueError:
+            pass
+    finally:
+        chargen.roll_2d6 = original_roll_2d6
+    assert rolls == []
+
+def check_batch_rejects_bad_argument(client):
+    client.post('/api/create_character')
+    before = client.get('/api/current_character').get_json()["character"]
+    response = client.post('/api/batch_actions', json={"steps": ["characteristic:strength", "reenlist:later"]})
+    assert response.status_code == 400 and response.get_json()["rolled_back"] is True
+    assert response.get_json()["error"].endswith("Invalid reenlistment preference: later")
+    assert client.get('/api/current_character').get_json()["character"] == before
+
+def test_batch_endpoint_rejects_bad_argument():
+    """/api/batch_actions answers a bad step argument with 400 and leaves the character as it was"""
+    with_test_app(check_batch_rejects_bad_argument)
+
+def main():
+    """Run all autoplay tests"""
+    print("CLASSIC TRAVELLER AUTOPLAY TESTING")
+    tests = [
+        test_full_career_completes,
+        test_single_term_stops_after_reenlistment,
+        test_reenlist_until_term_and_cash_split,
+        test_retire_when_eligible,
+        test_same_seed_same_character,
+        test_invalid_policy_rejected,
+        test_action_pipeline_applies_steps,
+        test_action_pipeline_rolls_back,
+        test_invalid_step_arguments_rejected,
+        test_batch_endpoint_rejects_bad_argument
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"{test.__name__:45} ✅ PASSED")
+        except AssertionError as e:
+            print(f"{test.__name__:45} ❌ FAILED: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Bulk Generation Testing for Classic Traveller Character Generator
+
+This module checks that background generation jobs write the same characters as
+streaming generation (in JSON and binary formats), respect the concurrent job cap,
+can be cancelled, leave no partial files when cancelled or failed, keep their
+result when a cancel arrives after the last chunk, and are deleted with their
+files once finished for the retention time. It also checks that progress events
+go through bounded (drop-oldest) subscriber queues, and that /api/bulk_generate
+streams the same NDJSON over HTTP.
+A thread pool stands in for the process pool to keep the tests fast.
+
+Usage: python test_bulk_generation.py
+"""
+
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import app as app_module
+import bulk_generation
+import character_binary
+import event_stream
+from test_concurrency import with_test_app
+
+def wait_for(manager, job_id, statuses, timeout=30):
+    """Poll a job until it reaches one of the given statuses"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = manager.get_status(job_id)
+        if status["status"] in statuses:
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} never reached {statuses}: {status}")
+
+def new_manager(data_dir, **kwargs):
+    return bulk_generation.GenerationJobManager(
+        data_dir, max_workers=2, chunk_size=25,
+        executor_factory=lambda: ThreadPoolExecutor(max_workers=2), **kwargs)
+
+def test_job_output_matches_streaming():
+    """A completed job holds exactly the streamed characters, in order"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        manager = new_manager(data_dir)
+        job = manager.submit({"count": 120, "seed": 9, "fields": ["name", "upp", "skills"]})
+        status = wait_for(manager, job["id"], ["completed", "failed"])
+        assert status["status"] == "completed", status
+        assert status["completed"] == 120
+        with open(status["result_path"]) as f:
+            job_lines = f.read().splitlines()
+        streamed = list(bulk_generation.iter_character_lines(9, 0, 120, None, ["name", "upp", "skills"]))
+        assert job_lines == streamed
+
+def test_json_array_format():
+    """The json format writes one valid JSON array"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        manager = new_manager(data_dir)
+        job = manager.submit({"count": 60, "seed": 3, "format": "json"})
+        status = wait_for(manager, job["id"], ["completed", "failed"])
+        with open(status["result_path"]) as f:
+            characters = json.load(f)
+        assert len(characters) == 60
+        assert all("random_state" not in character for character in characters)
+
+def test_binary_format():
+    """The binary format holds length-prefixed records that decode to the streamed characters"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        manager = new_manager(data_dir)
+        job = manager.submit({"count": 60, "seed": 3, "format": "binary"})
+        status = wait_for(manager, job["id"], ["completed", "failed"])
+        assert status["status"] == "completed", status
+        with open(status["result_path"], 'rb') as f:
+            characters = [character_binary.decode(data) for data in character_binary.iter_records(f)]
+        streamed = [json.loads(line) for line in bulk_generation.iter_character_lines(3, 0, 60)]
+        assert characters == streamed
+
+def test_concurrency_cap_and_cancel():
+    """Jobs beyond the cap wait queued; cancelled jobs stop and leave no result file"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        manager = new_manager(data_dir, max_concurrent_jobs=1)
+        first = manager.submit({"count": 5000, "seed": 1})
+        second = manager.submit({"count": 10, "seed": 2})
+        wait_for(manager, first["id"], ["running"])
+        assert manager.get_status(second["id"])["status"] == "queued"
+
+        manager.cancel(first["id"])
+        manager.cancel(second["id"])
+        first_status = wait_for(manager, first["id"], ["cancelled", "completed"])
+        second_status = wait_for(manager, second["id"], ["cancelled", "completed"])
+        assert first_status["status"] == "cancelled"
+        assert first_status["completed"] < 5000
+        assert first_status["result_path"] is None
+        assert second_status["status"] == "cancelled"
+        leftovers = [name for name in os.listdir(manager.jobs_dir) if name.endswith((".part", ".cancel"))]
+        assert not leftovers, leftovers
+
+def test_failed_job_cleaned_up():
+    """A job that fails leaves no partial result behind"""
+    original_generate_chunk = bulk_generation.generate_chunk
+    bulk_generation.generate_chunk = lambda *args: 1 / 0
+    try:
+        with tempfile.TemporaryDirectory() as data_dir:
+            manager = new_manager(data_dir)
+            job = manager.submit({"count": 100, "seed": 6})
+            status = wait_for(manager, job["id"], ["completed", "failed"])
+            assert status["status"] == "failed" and "division by zero" in status["error"], status
+            assert not [name for name in os.listdir(manager.jobs_dir) if name.endswith(".part")]
+    finally:
+        bulk_generation.generate_chunk = original_generate_chunk
+
+def test_finished_jobs_expire():
+    """Finished jobs drop out of the job list after the retention time, with their files, in any process"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        manager = new_manager(data_dir, retention_seconds=0)
+        job = manager.submit({"count": 10, "seed": 7})
+        wait_for(manager, job["id"], ["completed"])
+        assert manager.list_jobs() == []
+        assert manager.get_status(job["id"]) is None
+        assert os.listdir(manager.jobs_dir) == []
+
+        # Another server process (here a second manager) deletes expired jobs it did not run
+        other = new_manager(data_dir)
+        job = other.submit({"count": 10, "seed": 8})
+        wait_for(other, job["id"], ["completed"])
+        sweeper = new_manager(data_dir, retention_seconds=0)
+        assert sweeper.get_status(job["id"])["status"] == "completed"
+        assert sweeper.list_jobs() == [] and os.listdir(manager.jobs_dir) == []
+
+def test_late_cancel_keeps_result():
+    """A cancel that arrives after the last chunk leaves a complete, valid result"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        def cancel_when_written(job):
+            if job["status"] == "running" and job["completed"] == job["total"]:
+                manager.cancel(job["id"])
+        manager = new_manager(data_dir, on_update=cancel_when_written)
+        job = manager.submit({"count": 50, "seed": 3, "format": "json"})
+        status = wait_for(manager, job["id"], ["completed", "cancelled", "failed"])
+        assert status["status"] == "completed", status
+        with open(status["result_path"]) as f:
+            assert len(json.load(f)) == 50
+        assert not [name for name in os.listdir(manager.jobs_dir) if name.endswith(".cancel")]
+
+def test_invalid_spec_rejected():
+    """Bad counts and formats raise ValueError"""
+    for spec in ({"count": 0}, {"count": "many"}, {"format": "xml"}, {"fields": "name"}):
+        try:
+            bulk_generation.normalize_job_spec(spec)
+        except ValueError:
+            continue
+        raise AssertionError(f"Spec {spec} was accepted")
+
+def test_progress_events_published():
+    """Every job update reaches subscribers, ending with the final status"""
+    broker = event_stream.EventBroker(queue_size=1000)
+    with tempfile.TemporaryDirectory() as data_dir:
+        manager = new_manager(data_dir, on_update=lambda job: broker.publish(f"job:{job['id']}", "progress", job))
+        job = manager.submit({"count": 100, "seed": 4})
+        subscription = broker.subscribe(f"job:{job['id']}")
+        wait_for(manager, job["id"], ["completed"])
+    events = []
+    while True:
+        event = subscription.get(timeout=0)
+        if event is None:
+            break
+        events.append(event["data"])
+    assert events, "No progress events received"
+    assert events[-1]["status"] == "completed"
+    assert events[-1]["throughput"] is not None
+    assert [e["completed"] for e in events] == sorted(e["completed"] for e in events)
+
+def test_event_queue_drops_oldest():
+    """A slow subscriber keeps only the newest events and reports how many were dropped"""
+    broker = event_stream.EventBroker(queue_size=3)
+    subscription = broker.subscribe("character:test")
+    for index in range(10):
+        broker.publish("character:test", "career_event", index)
+    received = [subscription.get(timeout=0)["data"] for _ in range(3)]
+    assert received == [7, 8, 9]
+    assert subscription.take_dropped() == 7
+    assert subscription.get(timeout=0) is None
+
+    broker.unsubscribe(subscription)
+    assert not broker.has_subscribers("character:test")
+
+def check_bulk_generate_endpoint(client):
+    response = client.post('/api/bulk_generate', json={"count": 12, "seed": 9})
+    assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+    assert response.get_data(as_text=True).splitlines() == list(bulk_generation.iter_character_lines(9, 0, 12))
+
+    fields = ["name", "upp", "skills"]
+    lines = client.post('/api/bulk_generate', json={"count": 3, "seed": 9, "fields": fields,
+                                                    "policy": {"service": "Scouts"}}).get_data(as_text=True).splitlines()
+    characters = [json.loads(line) for line in lines]
+    assert len(characters) == 3 and all(set(character) == set(fields) for character in characters)
+    assert lines == list(bulk_generation.iter_character_lines(9, 0, 3, {"service": "Scouts"}, fields))
+
+    assert len(client.post('/api/bulk_generate', json={"seed": 9}).get_data(as_text=True).splitlines()) == 1
+    for body in ({"count": 0}, {"count": app_module.BULK_GENERATE_MAX_COUNT + 1}, {"count": "many"},
+                 {"count": 2, "seed": "abc"}, {"count": 2, "fields": "name"}, {"count": 2, "fields": ["name", 3]},
+                 {"count": 2, "policy": {"service": "Pirates"}}):
+        response = client.post('/api/bulk_generate', json=body)
+        assert response.status_code == 400 and response.get_json()["success"] is False, body
+
+def test_bulk_generate_endpoint():
+    """POST /api/bulk_generate streams NDJSON, projects fields and rejects bad counts and input"""
+    with_test_app(check_bulk_generate_endpoint)
+
+def main():
+    """Run all bulk generation tests"""
+    print("CLASSIC TRAVELLER BULK GENERATION TESTING")
+    tests = [
+        test_job_output_matches_streaming,
+        test_json_array_format,
+        test_binary_format,
+        test_concurrency_cap_and_cancel,
+        test_failed_job_cleaned_up,
+        test_finished_jobs_expire,
+        test_late_cancel_keeps_result,
+        test_invalid_spec_rejected,
+        test_progress_events_published,
+        test_event_queue_drops_oldest,
+        test_bulk_generate_endpoint
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"{test.__name__:45} ✅ PASSED")
+        except AssertionError as e:
+            print(f"{test.__name__:45} ❌ FAILED: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Bulk Import Testing for Classic Traveller Character Generator
+
+This module checks that NDJSON, binary and bundle files import into the archive
+in bundled batches: imported characters load back unchanged and are found by the
+manifest and skill index, malformed and invalid records are rejected with their
+line, kept IDs replace the archived copy and advance the ID counter, a truncated
+stream keeps what was read before the problem, and /api/import does the same
+over HTTP.
+
+Usage: python test_character_import.py
+"""
+
+import gzip
+import io
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import bulk_generation
+import character_archive
+import character_binary
+import character_ids
+import character_import
+import character_storage
+import skill_index
+import state_backend
+from test_concurrency import with_test_app
+
+def generated_characters(count, seed=47):
+    """Finished characters as bulk generation writes them (no IDs, no generator state)"""
+    return [json.loads(line) for line in bulk_generation.iter_character_lines(seed, 0, count)]
+
+def new_importer(characters_dir, ids="keep", batch_size=character_import.DEFAULT_BATCH_SIZE):
+    allocator = character_ids.CharacterIdAllocator(state_backend.MemoryStateStore(), batch_size=10)
+    manifest = character_archive.ArchiveManifest(characters_dir)
+    importer = character_import.CharacterImporter(manifest, allocator, ids=ids, batch_size=batch_size,
+                                                  max_workers=2, executor_factory=ThreadPoolExecutor)
+    return importer, manifest, allocator
+
+def test_ndjson_import_new_ids():
+    """Valid lines import in batches of batch_size; bad lines are rejected with their line number"""
+    characters = generated_characters(25)
+    with tempfile.TemporaryDirectory() as characters_dir:
+        path = os.path.join(characters_dir, "import.ndjson.gz")
+        invalid = dict(characters[0], age="old")
+        with gzip.open(path, 'wt') as f:
+            for index, character in enumerate(characters):
+                f.write(json.dumps(character) + "\n")
+                if index == 9:
+                    f.write("{not json\n\n" + json.dumps(invalid) + "\n")
+        importer, manifest, _ = new_importer(characters_dir, ids="new", batch_size=10)
+        stats = importer.import_file(path)
+
+        assert stats["imported"] == 25 and stats["rejected"] == 2 and stats["bundles"] == 3
+        assert [error["item"] for error in stats["errors"]] == ["line 11", "line 13"]
+        assert stats["errors"][1]["error"] == "Invalid character record: age must be int, not str"
+        assert len(character_storage.list_archive(characters_dir)[0]) == 3
+
+        ids = [row["id"] for row in manifest.query({}, limit=500)["characters"]]
+        assert ids == [character_ids.format_character_id(number) for number in range(1, 28) if number not in (11, 12)]
+        for character_id, character in zip(ids, characters):
+            assert manifest.load(character_id) == dict(character, character_id=character_id)
+
+        # A fresh manifest sees the same rows, and a rebuild from the bundles agrees
+        assert len(character_archive.ArchiveManifest(characters_dir)) == 25
+        assert character_archive.ArchiveManifest(characters_dir).rebuild(max_workers=1) == 25
+        query = skill_index.parse_skill_query("Pilot-1")
+        expected = sorted(character_id for character_id, character in zip(ids, characters)
+                          if character["skills"].get("Pilot", 0) >= 1)
+        assert manifest.skill_index.matching_ids(manifest.skill_index.match(query)) == expected
+
+def test_keep_ids_replaces_archived_copies():
+    """A kept ID replaces the archived file; the counter moves past it; repeats keep the last; new IDs skip it"""
+    characters = generated_characters(4)
+    with tempfile.TemporaryDirectory() as characters_dir:
+        importer, manifest, allocator = new_importer(characters_dir)
+        old = dict(characters[0], character_id="0000000500")
+        old_path = character_storage.store_character(characters_dir, "0000000500", old)
+        manifest.record(old, old_path)
+
+        records = [dict(characters[1], character_id="0000000500"),
+                   dict(characters[2], character_id="0000000007"),
+                   dict(characters[3], character_id="0000000007"),
+                   characters[0],
+                   dict(characters[0], character_id="../../etc")]
+        stream = io.BytesIO("".join(json.dumps(record) + "\n" for record in records).encode("utf-8"))
+        stats = importer.import_stream(stream, "ndjson")
+
+        assert stats["imported"] == 3 and stats["rejected"] == 2 and stats["bundles"] == 2
+        assert stats["replaced_files"] == 1 and not os.path.exists(old_path)
+        assert all("ids=new" in error["error"] for error in stats["errors"])
+        assert manifest.load("0000000500") == records[0]
+        assert manifest.load("0000000007") == records[2]
+        assert len(manifest) == 2
+        assert allocator.allocate_number() == 501
+
+        # New IDs from a counter that starts over skip the archived ones
+        importer, manifest, _ = new_importer(characters_dir, ids="new")
+        stream = io.BytesIO("".join(json.dumps(character) + "\n" for character in characters * 2).encode("utf-8"))
+        assert importer.import_stream(stream, "ndjson")["imported"] == 8
+        assert manifest.load("0000000007") == records[2]
+        assert [row["id"] for row in manifest.query({})["characters"]] == \
+            [character_ids.format_character_id(number) for number in (1, 2, 3, 4, 5, 6, 7, 8, 9, 500)]
+
+def test_binary_and_bundle_sources():
+    """Binary streams and bundles import; a truncated stream keeps the records before the break"""
+    characters = [dict(character, character_id=f"{index + 1:010d}")
+                  for index, character in enumerate(generated_characters(6))]
+    with tempfile.TemporaryDirectory() as work_dir:
+        binary_path = os.path.join(work_dir, "characters.trvc")
+        with open(binary_path, 'wb') as f:
+            for character in characters[:3]:
+                character_binary.write_record(f, character_binary.encode(character))
+            f.write(character_binary.RECORD_LENGTH.pack(1000) + b"TRVC")
+        bundle_path = os.path.join(work_dir, "other.bundle")
+        writer = character_storage.BundleWriter(bundle_path)
+        for character in characters[3:]:
+            writer.add(character["character_id"], character_storage.encode_character(character), character)
+        writer.close()
+
+        characters_dir = os.path.join(work_dir, "characters")
+        importer, manifest, _ = new_importer(characters_dir)
+        stats = importer.import_file(binary_path)
+        assert stats["imported"] == 3 and stats["source_error"] == "Truncated record", stats
+        stats = importer.import_file(bundle_path)
+        assert stats["imported"] == 3 and stats["source_error"] is None
+        for character in characters:
+            assert manifest.load(character["character_id"]) == character
+        try:
+            importer.import_file(os.path.join(work_dir, "characters.csv"))
+            assert False, "unknown format accepted"
+        except ValueError:
+            pass
+
+def check_import_endpoint(client):
+    body = "".join(line + "\n" for line in bulk_generation.iter_character_lines(48, 0, 12))
+    response = client.post('/api/import?ids=new', data=gzip.compress(body.encode("utf-8")),
+                           headers={"Content-Encoding": "gzip", "Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()["imported"] == 12
+    assert client.get('/api/archive').get_json()["total"] == 12
+
+    assert client.post('/api/import?format=csv', data=body).status_code == 400
+    assert client.post('/api/import?ids=mine', data=body).status_code == 400
+    response = client.post('/api/import', data=body)
+    assert response.get_json()["imported"] == 0 and response.get_json()["rejected"] == 12
+
+    # A line nested too deeply to decode is rejected on its own
+    nested = "[" * 100000 + "]" * 100000 + "\n" + body.splitlines()[0] + "\n"
+    response = client.post('/api/import?ids=new', data=nested)
+    assert response.status_code == 200, response.get_json()
+    assert (response.get_json()["imported"], response.get_json()["rejected"]) == (1, 1)
+    assert response.get_json()["errors"][0]["item"] == "line 1"
+
+def test_import_endpoint():
+    """POST /api/import streams a gzip NDJSON body into the archive"""
+    with_test_app(check_import_endpoint)
+
+def main():
+    """Run all bulk import tests"""
+    print("CLASSIC TRAVELLER BULK IMPORT TESTING")
+    tests = [
+        test_ndjson_import_new_ids,
+        test_keep_ids_replaces_archived_copies,
+        test_binary_and_bundle_sources,
+        test_import_endpoint
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"{test.__name__:45} ✅ PASSED")
+        except AssertionError as e:
+            print(f"{test.__name__:45} ❌ FAILED: {e}")
+
+if __name__ == "__main__":
+    main()
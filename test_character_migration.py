@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Schema Upgrade and Migration Testing for Classic Traveller Character Generator
+
+This module checks that records saved before schema versions are upgraded step
+by step to the current layout (readiness flags derived as the rules set them,
+current_term as a term number), that current records pass through unchanged,
+that older archive files are upgraded when loaded without being rewritten, and
+that the offline migrator rewrites files and bundles, reports failures, and
+resumes an interrupted run from its checkpoint. Records too malformed to upgrade
+are rejected as invalid by every loader (cache, manifest, migrator, import,
+shared state) rather than failing the request or the run.
+
+Usage: python test_character_migration.py
+"""
+
+import copy
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import app as app_module
+import character_archive
+import character_generation_rules as chargen
+import character_import
+import character_migration
+import character_schema
+import character_storage
+import character_upgrades
+from test_concurrency import with_test_app
+
+FLAGS = character_upgrades.READINESS_FLAGS + ("rdy_for_muster_out",)
+
+def legacy(character):
+    """The record as code before schema versions and readiness flags saved it"""
+    record = copy.deepcopy(character)
+    del record["schema_version"]
+    for flag in FLAGS:
+        record.pop(flag, None)
+    record["current_term"] = {"number": record["terms_served"] + 1, "phase": "survival"}
+    return record
+
+def finished_character(index):
+    return json.loads(json.dumps(chargen.generate_complete_character(chargen.derive_seed(48, index))))
+
+def test_upgrade_steps():
+    """Older records are upgraded to the current version; current ones are left alone"""
+    character = finished_character(0)
+    assert character["schema_version"] == chargen.SCHEMA_VERSION
+    assert character_upgrades.upgrade(copy.deepcopy(character)) == character
+
+    upgraded = character_upgrades.upgrade(legacy(character))
+    assert upgraded["schema_version"] == chargen.SCHEMA_VERSION
+    assert upgraded["current_term"] == character["terms_served"] + 1
+    assert not any(upgraded.get(flag) for flag in FLAGS)
+    character_schema.check_record(upgraded)
+
+    fresh = chargen.create_named_character(5, "0000000001")
+    old_fresh = dict(legacy(fresh), survival_outcome="pending")
+    assert character_upgrades.upgrade(old_fresh) == fresh
+
+    for version in (chargen.SCHEMA_VERSION + 1, "2", -1):
+        try:
+            character_upgrades.upgrade(dict(character, schema_version=version))
+            assert False, f"schema_version {version!r} accepted"
+        except ValueError:
+            pass
+
+def test_readiness_derived_like_the_rules():
+    """At every step of real careers, flags derived for a flagless record match the ones the rules set"""
+    services = chargen.get_available_services()
+    for index in range(60):
+        character = chargen.create_named_character(chargen.derive_seed(49, index), f"{index:010d}")
+        rng = chargen.get_random_generator(character)
+        for characteristic in chargen.UPP_ORDER:
+            chargen.set_characteristic(character, characteristic, chargen.generate_characteristic(rng, characteristic))
+        character = chargen.attempt_enlistment(rng, character, services[index % len(services)])
+        while not character.get("mustering_out_benefits"):
+            upgraded = character_upgrades.upgrade(legacy(character))
+            assert {flag: bool(upgraded.get(flag)) for flag in FLAGS} == \
+                   {flag: bool(character.get(flag)) for flag in FLAGS}, character["career_history"][-1]
+            if character.get("rdy_for_muster_out"):
+                break
+            character = next_step(rng, character, index)
+
+def next_step(rng, character, index):
+    """Take the next action the readiness flags allow"""
+    if character.get("rdy_for_survival_check"):
+        return chargen.check_survival(rng, character)
+    if character.get("rdy_for_commission_check"):
+        return chargen.check_commission(rng, character)
+    if character.get("rdy_for_promotion_check"):
+        return chargen.check_promotion(rng, character)
+    if character.get("skill_roll_eligibility", 0) > 0:
+        return chargen.resolve_skill(rng, character, "personal")
+    if character.get("rdy_for_ageing_check"):
+        return chargen.check_ageing(rng, character)
+    return chargen.attempt_reenlistment(rng, character, "reenlist" if index % 3 else "discharge")
+
+def test_upgraded_on_load():
+    """Older files load upgraded through the cache and the manifest, and are not rewritten"""
+    with tempfile.TemporaryDirectory() as characters_dir:
+        character = finished_character(1)
+        path = character_storage.store_character(characters_dir, "0000000001", legacy(character))
+        loaded = character_storage.CharacterCache().get(path)
+        assert loaded["schema_version"] == chargen.SCHEMA_VERSION
+        assert "schema_version" not in character_storage.read_character(path)
+
+        manifest = character_archive.ArchiveManifest(characters_dir)
+        manifest.record(character, path)
+        assert manifest.load("0000000001")["schema_version"] == chargen.SCHEMA_VERSION
+
+class Interrupted(Exception):
+    pass
+
+def test_migration_resumes():
+    """The migrator upgrades files and bundles, and a second run finishes an interrupted one"""
+    with tempfile.TemporaryDirectory() as characters_dir:
+        characters = [dict(finished_character(index), character_id=f"{index + 10:010d}") for index in range(7)]
+        for character in characters[:3]:
+            character_storage.store_character(characters_dir, character["character_id"], legacy(character))
+        character_storage.store_character(characters_dir, characters[3]["character_id"], characters[3], "json")
+        writer = character_storage.BundleWriter(os.path.join(characters_dir, "bundle-000001.bundle"))
+        for character in characters[4:]:
+            stored = character if character is characters[6] else legacy(character)
+            writer.add(character["character_id"], character_storage.encode_character(stored), stored)
+        writer.close()
+        with open(os.path.join(characters_dir, "0000000099.json"), 'w') as f:
+            f.write("not a character")
+        assert character_archive.ArchiveManifest(characters_dir).rebuild(max_workers=1) == 7
+
+        tasks = character_migration.plan_tasks(characters_dir)
+        assert len(tasks) >= 3
+
+        def interrupt(progress):
+            raise Interrupted()
+        try:
+            character_migration.migrate_archive(characters_dir, 1, interrupt, ThreadPoolExecutor)
+            assert False, "migration was not interrupted"
+        except Interrupted:
+            pass
+        assert os.path.exists(os.path.join(characters_dir, character_migration.CHECKPOINT_NAME))
+
+        progress = []
+        stats = character_migration.migrate_archive(characters_dir, 1, progress.append, ThreadPoolExecutor)
+        # The interrupting task and any already running when it stopped count as done
+        assert stats["resumed"] >= 1 and len(progress) == len(tasks) - stats["resumed"]
+        assert stats["tasks_done"] == stats["tasks"] == len(tasks)
+        assert (stats["records"], stats["upgraded"], stats["failed"], stats["bundles_rewritten"]) == (8, 5, 1, 1)
+        assert stats["failures"][0][0].endswith("0000000099.json") and stats["manifest_rebuilt"]
+        assert not os.path.exists(os.path.join(characters_dir, character_migration.CHECKPOINT_NAME))
+
+        manifest = character_archive.ArchiveManifest(characters_dir)
+        for character in characters:
+            row = manifest.get(character["character_id"])
+            stored = character_storage.read_character(row["path"], row["offset"], row["length"])
+            # Upgraded records have the term number in current_term (generated ones kept the first term's)
+            assert stored == dict(character, current_term=stored["current_term"])
+            assert stored["current_term"] in (character["current_term"], character["terms_served"] + 1)
+        stats = character_migration.migrate_archive(characters_dir, 1, None, ThreadPoolExecutor)
+        assert (stats["upgraded"], stats["bundles_rewritten"], stats["resumed"]) == (0, 0, 0)
+
+MALFORMED = [
+    {"career_history": 5},
+    {"name": "Bad", "career": "Navy", "skill_roll_eligibility": "two", "career_history": [{"event_type": "skill_resolution"}]},
+    {"name": "Bad", "career": "Bogus", "career_history": [{"event_type": "survival_check", "success": True}]},
+    {"name": "Bad", "career": "Navy", "characteristics": dict.fromkeys(chargen.UPP_ORDER, "x"), "rank": 0,
+     "career_history": [{"event_type": "survival_check", "success": True}]}
+]
+
+def test_malformed_records_rejected():
+    """Older records too malformed to upgrade are rejected as invalid and left unchanged"""
+    for record in MALFORMED:
+        try:
+            character_schema.check_record(character_upgrades.upgrade(copy.deepcopy(record)))
+            assert False, f"{record} accepted"
+        except character_schema.RecordValidationError:
+            pass
+    # A step that fails leaves the record as it was
+    record = copy.deepcopy(MALFORMED[3])
+    try:
+        character_upgrades.upgrade(record)
+        assert False, "failing step not reported"
+    except character_schema.RecordValidationError as e:
+        assert "cannot be upgraded" in str(e)
+    assert record == MALFORMED[3]
+
+def test_malformed_records_reported_by_loaders():
+    """The cache, the manifest, the migrator and import report malformed older records instead of failing"""
+    with tempfile.TemporaryDirectory() as characters_dir:
+        manifest = character_archive.ArchiveManifest(characters_dir)
+        paths = []
+        for index, record in enumerate(MALFORMED):
+            record = dict(record, character_id=f"{index + 1:010d}")
+            paths.append(character_storage.store_character(characters_dir, record["character_id"], record))
+            manifest.record(record, paths[-1])
+        for path, character_id in zip(paths, ["0000000001", "0000000002", "0000000003", "0000000004"]):
+            for load in (lambda: character_storage.CharacterCache().get(path), lambda: manifest.load(character_id)):
+                try:
+                    load()
+                    assert False, f"{path} loaded"
+                except character_schema.RecordValidationError:
+                    pass
+
+        stats = character_migration.migrate_archive(characters_dir, 1, None, ThreadPoolExecutor)
+        assert (stats["records"], stats["upgraded"], stats["failed"]) == (4, 0, 4)
+
+        lines = [(f"line {index}", json.dumps(record).encode(), None) for index, record in enumerate(MALFORMED)]
+        valid = finished_character(2)
+        lines.insert(1, ("line valid", json.dumps(legacy(valid)).encode(), None))
+        prepared, errors = character_import.prepare_chunk(lines, [f"{index:010d}" for index in range(5)])
+        assert len(prepared) == 1 and len(errors) == 4
+
+def check_malformed_over_http(client):
+    body = json.dumps(legacy(finished_character(3))) + "\n" + json.dumps(MALFORMED[0]) + "\n"
+    response = client.post('/api/import?ids=new', data=body)
+    assert response.status_code == 200, response.get_json()
+    assert (response.get_json()["imported"], response.get_json()["rejected"]) == (1, 1)
+
+    path = character_storage.store_character("characters", "0000000077", dict(MALFORMED[0], name="Bad"))
+    services = app_module.app_services(client.application)
+    services.archive_manifest.record(dict(MALFORMED[0], name="Bad", character_id="0000000077"), path)
+    assert client.get('/api/archive/0000000077').status_code == 422
+
+    # A current character that cannot be upgraded is ignored rather than failing every request
+    services.state_store.set("current_character", dict(MALFORMED[0]))
+    assert client.get('/api/current_character').status_code == 400
+    assert client.post('/api/create_character').status_code == 200
+
+def test_malformed_records_over_http():
+    """/api/import rejects only the bad line, and a bad archived record is a 422"""
+    with_test_app(check_malformed_over_http)
+
+def main():
+    """Run all schema upgrade and migration tests"""
+    print("CLASSIC TRAVELLER SCHEMA UPGRADE AND MIGRATION TESTING")
+    tests = [
+        test_upgrade_steps,
+        test_readiness_derived_like_the_rules,
+        test_upgraded_on_load,
+        test_migration_resumes,
+        test_malformed_records_rejected,
+        test_malformed_records_reported_by_loaders,
+        test_malformed_records_over_http
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"{test.__name__:45} ✅ PASSED")
+        except AssertionError as e:
+            print(f"{test.__name__:45} ❌ FAILED: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Character Schema Testing for Classic Traveller Character Generator
+
+This module checks that generated characters (finished and mid-career) match the
+declared record schema, that malformed records are reported with precise field
+paths, that the career is a known service with all six characteristics, that
+undeclared fields and event types are allowed, and that malformed files are
+refused when loaded, both by the character cache and over HTTP.
+
+Usage: python test_character_schema.py
+"""
+
+import copy
+import json
+import os
+import tempfile
+
+import character_generation_rules as chargen
+import character_schema
+import character_storage
+from test_concurrency import with_test_app
+
+def test_generated_records_valid():
+    """Finished characters and every term of an autoplayed career are valid, before and after JSON"""
+    for index in range(100):
+        character = chargen.generate_complete_character(chargen.derive_seed(46, index))
+        assert character_schema.validate(character) == []
+        assert character_schema.validate(json.loads(json.dumps(character))) == []
+
+        character = chargen.create_named_character(chargen.derive_seed(47, index), f"{index:010d}")
+        rng = chargen.get_random_generator(character)
+        while not character.get("mustering_out_benefits"):
+            assert character_schema.validate(character) == [], character_schema.validate(character)
+            character = chargen.autoplay_term(rng, character, None)
+        chargen.save_random_state(character, rng)
+        assert character_schema.validate(character) == []
+
+def test_errors_have_paths():
+    """Every problem is reported with its path; bools are not ints"""
+    character = json.loads(json.dumps(chargen.generate_complete_character(chargen.derive_seed(46, 1))))
+    character["age"] = "22"
+    del character["skills"]
+    character["characteristics"]["strength"] = True
+    character["career_history"][1]["roll"] = None
+    character["career_history"][2] = "survived"
+    character["phase_history"][0]["term"] = 1.0
+    character["mustering_out_benefits"]["items"] = ["Gun", 3]
+    assert character_schema.validate(character) == [
+        ("age", "must be int, not str"),
+        ("characteristics.strength", "must be int, not bool"),
+        ("skills", "is required"),
+        ("career_history[1].roll", "must be int, not NoneType"),
+        ("career_history[2]", "must be an object, not str"),
+        ("phase_history[0].term", "must be int, not float"),
+        ("mustering_out_benefits.items[1]", "must be str, not int")
+    ]
+    try:
+        character_schema.check_record(character)
+        assert False, "invalid record accepted"
+    except character_schema.RecordValidationError as e:
+        assert str(e) == "Invalid character record: age must be int, not str (and 6 more)"
+        assert len(e.errors) == 7
+    assert character_schema.validate(["not", "a", "record"]) == [("", "must be an object, not list")]
+
+def test_career_fields_checked():
+    """The career is a known service, and a character with one has all six characteristics"""
+    character = chargen.generate_complete_character(chargen.derive_seed(46, 4))
+    services = ", ".join(chargen.get_available_services())
+    assert character_schema.validate(dict(character, career="Bogus", service_choice="Pirates")) == [
+        ("career", f"must be one of {services}"),
+        ("service_choice", f"must be one of {services}")
+    ]
+    characteristics = {name: value for name, value in character["characteristics"].items()
+                       if name not in ("intelligence", "social")}
+    assert character_schema.validate(dict(character, characteristics=characteristics)) == [
+        ("characteristics", "must include intelligence, social once the character has a career")]
+    # Before enlisting, characteristics are generated one at a time
+    assert character_schema.validate(dict(character, career=None, characteristics=characteristics)) == []
+
+def test_undeclared_fields_and_events_allowed():
+    """New fields and event types do not make older code reject a record"""
+    character = chargen.generate_complete_character(chargen.derive_seed(46, 2))
+    character["nickname"] = "Ace"
+    character["career_history"].append({"event_type": "psionics_test", "roll": "12"})
+    assert character_schema.validate(character) == []
+    character["career_history"].append({"roll": 12})
+    assert character_schema.validate(character) == [
+        (f"career_history[{len(character['career_history']) - 1}].event_type", "must be str, not NoneType")]
+
+def test_cache_refuses_malformed_file():
+    """A malformed file raises on load with its paths and is never cached"""
+    with tempfile.TemporaryDirectory() as characters_dir:
+        character = chargen.generate_complete_character(chargen.derive_seed(46, 3))
+        character["rank"] = "Captain"
+        path = os.path.join(characters_dir, "0000000001.json.gz")
+        character_storage.save_character(path, character)
+        cache = character_storage.CharacterCache()
+        try:
+            cache.get(path)
+            assert False, "malformed file loaded"
+        except character_schema.RecordValidationError as e:
+            assert e.errors == [("rank", "must be int, not str")]
+        assert cache.stats()["entries"] == 0
+
+def check_archive_detail_reports_paths(client):
+    character = client.post('/api/autoplay', json={"scope": "career"}).get_json()["character"]
+    character_id = character["character_id"]
+    assert client.get(f'/api/archive/{character_id}').status_code == 200
+
+    path = character_storage.resolve_character_path('characters', character_id)
+    record = copy.deepcopy(character_storage.read_character(path))
+    record["career_history"][0]["target"] = "seven"
+    character_storage.save_character(path, record)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+
+    response = client.get(f'/api/archive/{character_id}')
+    assert response.status_code == 422
+    assert response.get_json()["errors"] == [{"path": "career_history[0].target", "message": "must be int, not str"}]
+
+def test_archive_detail_reports_paths():
+    """Fetching a malformed archived character returns 422 with the failing field paths"""
+    with_test_app(check_archive_detail_reports_paths)
+
+def main():
+    """Run all character schema tests"""
+    print("CLASSIC TRAVELLER CHARACTER SCHEMA TESTING")
+    tests = [
+        test_generated_records_valid,
+        test_errors_have_paths,
+        test_career_fields_checked,
+        test_undeclared_fields_and_events_allowed,
+        test_cache_refuses_malformed_file,
+        test_archive_detail_reports_paths
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"{test.__name__:45} ✅ PASSED")
+        except AssertionError as e:
+            print(f"{test.__name__:45} ❌ FAILED: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Character Storage Testing for Classic Traveller Character Generator
+
+This module checks the compressed and binary single-character formats and packed bundles:
+round trips, random access through the bundle index, the memory-mapped header
+reader, the compress and pack converters, the sharded directory layout and its
+migration, the read-through character cache, and that the archive manifest finds
+characters wherever they are stored (a later single file wins over a bundled copy).
+
+Usage: python test_character_storage.py
+"""
+
+import json
+import os
+import tempfile
+
+import character_archive
+import character_binary
+import character_generation_rules as chargen
+import character_storage
+
+def write_json_characters(characters_dir, count):
+    """Write finished characters in the original pretty-printed JSON format"""
+    os.makedirs(characters_dir, exist_ok=True)
+    characters = []
+    for index in range(count):
+        character = chargen.generate_complete_character(chargen.derive_seed(40, index))
+        character["character_id"] = f"{index:010d}"
+        with open(os.path.join(characters_dir, f"{character['character_id']}.json"), 'w') as f:
+            json.dump(character, f, indent=2)
+        characters.append(json.loads(json.dumps(character)))
+    return characters
+
+def test_formats_round_trip():
+    """Both single-file formats read back identically; saving removes the other format's copy and is atomic"""
+    with tempfile.TemporaryDirectory() as characters_dir:
+        character = write_json_characters(characters_dir, 1)[0]
+        json_path = os.path.join(characters_dir, "0000000000.json")
+        assert character_storage.read_character(json_path) == character
+
+        gzip_path = character_storage.strip_extension(json_path) + ".json.gz"
+        character_storage.save_character(gzip_path, character)
+        assert not os.path.exists(json_path)
+        assert character_storage.read_character(gzip_path) == character
+        assert os.path.getsize(gzip_path) * 3 < len(json.dumps(character, indent=2))
+
+        # A save that fails before the rename leaves the old file whole and no temporary file
+        original_replace = os.replace
+        def failing_replace(source, destination):
+            raise OSError("disk full")
+        os.replace = failing_replace
+        try:
+            character_storage.save_character(gzip_path, dict(character, age=99))
+            assert False, "failed save reported success"
+        except OSError:
+            pass
+        finally:
+            os.replace = original_replace
+        assert character_storage.read_character(gzip_path) == character
+        assert os.listdir(characters_dir) == ["0000000000.json.gz"]
+
+def test_binary_format():
+    """Binary characters decode exactly (generator state tuples included) and reject corrupt data"""
+    character = chargen.generate_complete_character(chargen.derive_seed(45, 0))
+    data = character_binary.encode(character)
+    assert character_binary.decode(data) == character
+    assert isinstance(character_binary.decode(data)["random_state"], tuple)
+    assert character_binary.read_events(data) == character["career_history"]
+    assert len(data) * 2 < len(json.dumps(character, separators=(',', ':')))
+    odd = {"career_history": None, "values": [-2 ** 70, 2 ** 70, 1.5, "\u00e9", (), {}, list(range(40))]}
+    assert character_binary.decode(character_binary.encode(odd)) == odd
+    nested = {"career_history": [], "value": [[[[[[[[[[{"depth": 10}]]]]]]]]]]}
+    assert character_binary.decode(character_binary.encode(nested)) == nested
+    too_many_strings = data[:5] + (10 ** 6).to_bytes(4, "little") + data[9:]
+    # Lists nested far deeper than any record, which must not exhaust the recursion limit
+    too_deep = character_binary.HEADER.pack(character_binary.MAGIC, character_binary.VERSION, 0, 0, 0) + \
+        bytes([character_binary.TAG_LIST, 1]) * 100000 + bytes([character_binary.TAG_NONE])
+    for corrupt in (data[:-3], data + b"\x00", b"TRVC" + data[4:5] + b"\xff" * 20, too_many_strings, too_deep):
+        try:
+            character_binary.decode(corrupt)
+            assert False, "corrupt data decoded"
+        except ValueError:
+            pass
+
+    with tempfile.TemporaryDirectory() as characters_dir:
+        character["character_id"] = "0000000001"
+        path = character_storage.store_character(characters_dir, "0000000001", character, "binary")
+        assert path.endswith(".trvc") and character_storage.read_character(path) == character
+        assert character_storage.CharacterCache(1 << 20).get(path) == character
+        manifest = character_archive.ArchiveManifest(characters_dir)
+        assert manifest.rebuild(max_workers=1) == 1
+        assert manifest.load("0000000001")["name"] == character["name"]
+
+def test_bundle_random_access():
+    """Each character in a bundle is read back from its indexed offset and length"""
+    with tempfile.TemporaryDirectory() as characters_dir:
+        characters = write_json_characters(characters_dir, 5)
+        path = os.path.join(characters_dir, "test.bundle")
+        writer = character_storage.BundleWriter(path)
+        for character in characters:
+            writer.add(character["character_id"], character_storage.encode_character(character), character)
+        writer.close()
+        index = character_storage.read_bundle_index(path)
+        for character in reversed(characters):
+            offset, length = index[character["character_id"]]
+            assert character_storage.read_character(path, offset, length) == character
+
+def test_mmap_reader_headers():
+    """Headers match the records without decoding them; records decode on request"""
+    with tempfile.TemporaryDirectory() as characters_dir:
+        characters = write_json_characters(characters_dir, 8)
+        character_storage.pack_files(characters_dir, bundle_size=100)
+        path = character_storage.list_archive(characters_dir)[0][0]
+        with character_storage.BundleReader(path) as reader:
+            assert len(reader) == 8 and reader.ids() == [c["character_id"] for c in characters]
+            for position, (header, character) in enumerate(zip(reader.headers(), characters)):
+                header = character_storage.BundleHeader(*header)
+                assert header.upp.decode() == character["upp"]
+                assert character_storage.CAREER_CODES[header.career] == character["career"]
+                assert (header.rank, header.terms, header.age) == (character.get("rank") or 0, character["terms_served"], character["age"])
+                assert header.cash == character["mustering_out_benefits"]["cash"]
+                assert reader.header(position) == header
+            assert reader.character(5)["name"] == characters[5]["name"]
+            assert reader.get(characters[2]["character_id"])["upp"] == characters[2]["upp"]
+            assert reader.get("missing") is None
+        assert len(list(character_storage.scan_headers(characters_dir))) == 8
+
+def test_converters_and_manifest():
+    """compress and pack shrink the archive; the rebuilt manifest loads every character"""
+    with tempfile.TemporaryDirectory() as characters_dir:
+        characters = write_json_characters(characters_dir, 12)
+        json_bytes = character_storage.archive_stats(characters_dir)["bytes"]
+
+        assert character_storage.compress_files(characters_dir)["converted"] == 12
+        stats = character_storage.pack_files(characters_dir, bundle_size=5)
+        assert stats["packed"] == 12 and stats["bundles"] == 3
+        archive = character_storage.archive_stats(characters_dir)
+        assert archive["files"] == 0 and archive["bundled_characters"] == 12
+        assert archive["bytes"] * 10 < json_bytes, f"{archive['bytes']} vs {json_bytes} bytes"
+
+        manifest = character_archive.ArchiveManifest(characters_dir)
+        assert manifest.rebuild(max_workers=2) == 12
+        loaded = manifest.load("0000000003")
+        assert "random_state" not in loaded
+        assert loaded == {k: v for k, v in characters[3].items() if k != "random_state"}
+
+        # A character saved again after bundling lives in its own file, which wins
+        characters[3]["name"] = "Saved Later"
+        character_storage.save_character(os.path.join(characters_dir, "0000000003.json.gz"), characters[3])
+        manifest.rebuild(max_workers=1)
+        assert manifest.load("0000000003")["name"] == "Saved Later"
+        assert manifest.get("0000000004")["path"].endswith(".bundle")
+
+def test_sharded_layout_and_migration():
+    """Flat files migrate into two-level shards; the resolver and manifest find both layouts"""
+    with tempfile.TemporaryDirectory() as characters_dir:
+        characters = write_json_characters(characters_dir, 20)
+        with open(os.path.join(characters_dir, "0000000002_dice_rolls.csv"), 'w') as f:
+            f.write("Roll_Number\n")
+        flat_path = os.path.join(characters_dir, "0000000001.json")
+        assert character_storage.resolve_character_path(characters_dir, "0000000001") == flat_path
+
+        stats = character_storage.migrate_to_shards(characters_dir, max_workers=4)
+        assert stats == {"moved": 21, "skipped": 0}
+        assert not os.path.exists(flat_path)
+        shard = character_storage.shard_path(characters_dir, "0000000002")
+        assert os.path.relpath(shard, characters_dir).count(os.sep) == 1
+        assert os.path.exists(os.path.join(shard, "0000000002_dice_rolls.csv"))
+        sharded_path = character_storage.resolve_character_path(characters_dir, "0000000001")
+        assert sharded_path == os.path.join(character_storage.shard_path(characters_dir, "0000000001"), "0000000001.json")
+        assert character_storage.read_character(sharded_path) == characters[1]
+
+        # Saving replaces copies in the other layout and format
+        character_storage.store_character(characters_dir, "0000000005", characters[5], "json", "flat")
+        path = character_storage.store_character(characters_dir, "0000000005", characters[5])
+        assert [p for p in character_storage.candidate_paths(characters_dir, "0000000005") if os.path.exists(p)] == [path]
+
+        assert len(character_storage.list_archive(characters_dir)[1]) == 20
+        assert character_archive.ArchiveManifest(characters_dir).rebuild(max_workers=1) == 20
+
+def test_character_cache():
+    """Repeat loads are hits; a rewritten file is re-read; eviction keeps the cache under its byte bound"""
+    with tempfile.TemporaryDirectory() as characters_dir:
+        character = write_json_characters(characters_dir, 1)[0]
+        paths = []
+        for index in range(4):
+            # Same-sized records, so the byte bound holds exactly two
+            copy = dict(character, character_id=f"{index:010d}")
+            paths.append(os.path.join(characters_dir, f"copy{index}.json"))
+            character_storage.save_character(paths[-1], copy)
+        cache = character_storage.CharacterCache(max_bytes=os.path.getsize(paths[0]) * 2.5)
+
+        assert cache.get(paths[0])["character_id"] == "0000000000"
+        assert cache.get(paths[0]) is cache.get(paths[0])
+        assert (cache.hits, cache.misses) == (2, 1)
+
+        character_storage.save_character(paths[0], dict(character, character_id="0000000000", name="Rewritten"))
+        stat = os.stat(paths[0])
+        os.utime(paths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+        assert cache.get(paths[0])["name"] == "Rewritten"
+        assert cache.invalidations == 1
+
+        for path in paths[1:]:
+            cache.get(path)
+        stats = cache.stats()
+        assert stats["entries"] == 2 and stats["evictions"] == 2
+        assert stats["bytes"] <= stats["max_bytes"]
+        cache.get(paths[3])
+        assert cache.hits == 3
+
+def test_active_characters_not_bundled():
+    """Characters still in play keep their own files"""
+    with tempfile.TemporaryDirectory() as characters_dir:
+        character = chargen.create_named_character(3, "0000000007")
+        character_storage.save_character(os.path.join(characters_dir, "0000000007.json.gz"), character)
+        assert character_storage.pack_files(characters_dir)["packed"] == 0
+        assert character_storage.archive_stats(characters_dir)["files"] == 1
+
+def main():
+    """Run all character storage tests"""
+    print("CLASSIC TRAVELLER CHARACTER STORAGE TESTING")
+    tests = [
+        test_formats_round_trip,
+        test_binary_format,
+        test_bundle_random_access,
+        test_mmap_reader_headers,
+        test_converters_and_manifest,
+        test_sharded_layout_and_migration,
+        test_character_cache,
+        test_active_characters_not_bundled
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"{test.__name__:45} ✅ PASSED")
+        except AssertionError as e:
+            print(f"{test.__name__:45} ❌ FAILED: {e}")
+
+if __name__ == "__main__":
+    main()
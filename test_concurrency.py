@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Concurrency Testing for Classic Traveller Character Generator
+
+This module drives the Flask app from several threads at once and checks that
+per-character locks keep concurrent actions from overwriting each other, that
+every save bumps the character version (exposed as an ETag), and that a stale
+If-Match version or a save raced by another worker process gets 409 Conflict.
+It also checks that retried requests with an Idempotency-Key are replayed
+instead of rolling the dice again, by any worker, and that a retry arriving
+while the first request is still running does not run it a second time, and
+that two apps created in one process keep separate services.
+
+Usage: python test_concurrency.py
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+import app as app_module
+import character_generation_rules as chargen
+import idempotency
+import state_backend
+from production_config import DevelopmentConfig
+
+class AppTestConfig(DevelopmentConfig):
+    RATELIMIT_ENABLED = False
+    RATELIMIT_STORAGE_URL = "memory://"
+    STATE_STORAGE_URL = "memory://"
+    LOG_LEVEL = "WARNING"
+
+def with_test_app(test):
+    """Run a test against a fresh app in a temporary working directory"""
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        try:
+            AppTestConfig.DATA_DIR = os.path.join(work_dir, "data")
+            test(app_module.create_app(AppTestConfig()).test_client())
+        finally:
+            os.chdir(original_dir)
+
+def check_concurrent_characteristics(client):
+    client.post('/api/create_character')
+    statuses = []
+    def roll(name):
+        statuses.append(client.post('/api/generate_characteristic', json={"characteristic": name}).status_code)
+    original_get_random_generator = chargen.get_random_generator
+    def slow_get_random_generator(character_record):
+        # Widen the load -> save window so unserialized requests would overlap
+        time.sleep(0.02)
+        return original_get_random_generator(character_record)
+    threads = [threading.Thread(target=roll, args=(name,)) for name in chargen.UPP_ORDER]
+    try:
+        chargen.get_random_generator = slow_get_random_generator
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        chargen.get_random_generator = original_get_random_generator
+    character = client.get('/api/current_character').get_json()["character"]
+    # Locks are a fixed set of stripes, not one kept per character ever seen
+    assert len(app_module.character_locks) == app_module.CHARACTER_LOCK_STRIPES
+    assert statuses == [200] * 6, statuses
+    assert "_" not in character["upp"], f"Lost update: {character['upp']}"
+    assert character["version"] == 7
+
+def check_if_match(client):
+    response = client.post('/api/create_character')
+    etag = response.headers["ETag"]
+    assert etag == '"1"'
+    stale = client.post('/api/generate_characteristic', json={"characteristic": "strength"},
+                        headers={"If-Match": '"0"'})
+    assert stale.status_code == 409
+    assert stale.get_json()["current_version"] == 1
+    fresh = client.post('/api/generate_characteristic', json={"characteristic": "strength"},
+                        headers={"If-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["ETag"] == '"2"'
+
+def check_lost_race_is_conflict(client):
+    client.post('/api/create_character')
+    state_store = app_module.app_services(client.application).state_store
+    original_get_random_generator = chargen.get_random_generator
+    def interfering_get_random_generator(character_record):
+        # Another worker process saves the character while this request is running
+        other, version = state_store.get_with_version("current_character")
+        state_store.set("current_character", other, expected_version=version)
+        return original_get_random_generator(character_record)
+    try:
+        chargen.get_random_generator = interfering_get_random_generator
+        response = client.post('/api/generate_characteristic', json={"characteristic": "strength"})
+    finally:
+        chargen.get_random_generator = original_get_random_generator
+    assert response.status_code == 409, response.status_code
+    assert client.get('/api/current_character').get_json()["character"]["upp"] == "______"
+
+def check_idempotent_retries(client):
+    created = client.post('/api/create_character', headers={"Idempotency-Key": "create-1"})
+    retried = client.post('/api/create_character', headers={"Idempotency-Key": "create-1"})
+    assert retried.status_code == 200 and retried.get_json() == created.get_json()
+    assert retried.headers["Idempotent-Replayed"] == "true"
+
+    headers = {"Idempotency-Key": "strength-1"}
+    first = client.post('/api/generate_characteristic', json={"characteristic": "strength"}, headers=headers)
+    version = client.get('/api/current_character').get_json()["character"]["version"]
+    for _ in range(3):
+        retry = client.post('/api/generate_characteristic', json={"characteristic": "strength"}, headers=headers)
+        assert retry.get_json() == first.get_json()
+    assert client.get('/api/current_character').get_json()["character"]["version"] == version
+
+    reused = client.post('/api/generate_characteristic', json={"characteristic": "dexterity"}, headers=headers)
+    assert reused.status_code == 422
+
+def test_idempotent_retries_are_replayed():
+    """Retries with the same Idempotency-Key replay the first response and change nothing"""
+    with_test_app(check_idempotent_retries)
+
+def test_idempotency_store_shared_by_workers():
+    """A key is claimed once across workers; its response is replayed until it expires"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        url = "sqlite:///" + os.path.join(data_dir, "state.db")
+        first, second = (idempotency.IdempotencyStore(state_backend.create_state_store(url), ttl_seconds=0.2)
+                         for _ in range(2))
+        key = ("Alex", "retry-1")
+        assert first.claim(key, "POST /api/jobs a") is None
+        assert second.claim(key, "POST /api/jobs a") == {"fingerprint": "POST /api/jobs a", "pending": True}
+        entry = {"fingerprint": "POST /api/jobs a", "status": 202, "mimetype": "application/json", "body": "e30="}
+        first.complete(key, entry)
+        assert second.claim(key, "POST /api/jobs a") == entry
+
+        other = ("Alex", "retry-2")
+        assert second.claim(other, "POST /api/jobs b") is None
+        second.release(other)
+        assert first.claim(other, "POST /api/jobs b") is None
+
+        time.sleep(0.3)
+        assert second.claim(key, "POST /api/jobs a") is None
+
+def check_concurrent_retry_runs_once(client):
+    entered, release, submitted = threading.Event(), threading.Event(), []
+    job_manager = app_module.app_services(client.application).job_manager
+    original_submit = job_manager.submit
+    def slow_submit(spec, default_seed=None):
+        submitted.append(spec)
+        entered.set()
+        release.wait(5)
+        return {"job_id": "job-1", "status": "queued"}
+    headers = {"Idempotency-Key": "job-1"}
+    responses = []
+    job_manager.submit = slow_submit
+    try:
+        first = threading.Thread(target=lambda: responses.append(
+            client.post('/api/jobs', json={"count": 5}, headers=headers)))
+        first.start()
+        assert entered.wait(5)
+        retry = client.post('/api/jobs', json={"count": 5}, headers=headers)
+        assert retry.status_code == 409 and "still running" in retry.get_json()["error"]
+        release.set()
+        first.join()
+        replayed = client.post('/api/jobs', json={"count": 5}, headers=headers)
+    finally:
+        job_manager.submit = original_submit
+    assert responses[0].status_code == 202 and replayed.status_code == 202
+    assert replayed.headers["Idempotent-Replayed"] == "true" and replayed.get_json() == responses[0].get_json()
+    assert len(submitted) == 1
+
+def test_concurrent_retry_runs_once():
+    """A retry arriving while the first request runs gets 409, not a second job"""
+    with_test_app(check_concurrent_retry_runs_once)
+
+def test_concurrent_actions_do_not_lose_updates():
+    """Six threads rolling different characteristics all land in the saved record"""
+    with_test_app(check_concurrent_characteristics)
+
+def test_if_match_conflict():
+    """A stale If-Match version is refused with 409; the current ETag is accepted"""
+    with_test_app(check_if_match)
+
+def test_lost_race_is_conflict():
+    """A save that loses a race against another process returns 409 and writes nothing"""
+    with_test_app(check_lost_race_is_conflict)
+
+def check_apps_keep_separate_services(client):
+    client.post('/api/create_character')
+    other = app_module.create_app(AppTestConfig()).test_client()
+    assert app_module.app_services(other.application) is not app_module.app_services(client.application)
+    # The second app has its own (memory) state store: no current character there
+    assert other.get('/api/current_character').status_code == 400
+    assert client.get('/api/current_character').status_code == 200
+
+def test_apps_keep_separate_services():
+    """A second create_app() in the same process does not take over the first app's services"""
+    with_test_app(check_apps_keep_separate_services)
+
+def main():
+    """Run all concurrency tests"""
+    print("CLASSIC TRAVELLER CONCURRENCY TESTING")
+    tests = [
+        test_concurrent_actions_do_not_lose_updates,
+        test_if_match_conflict,
+        test_lost_race_is_conflict,
+        test_idempotent_retries_are_replayed,
+        test_idempotency_store_shared_by_workers,
+        test_concurrent_retry_runs_once,
+        test_apps_keep_separate_services
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"{test.__name__:45} ✅ PASSED")
+        except AssertionError as e:
+            print(f"{test.__name__:45} ❌ FAILED: {e}")
+
+if __name__ == "__main__":
+    main()
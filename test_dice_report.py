@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Dice Roll Report Testing for Classic Traveller Character Generator
+
+This module checks that a character's dice roll report has one row per roll with
+terms counted from enlistment, that streaming it gives the same CSV as writing
+it, that an archive export writes every matching character's rolls in ID order
+for any chunking and worker count and reports unreadable characters, and that
+the report and the archive export stream over HTTP.
+
+Usage: python test_dice_report.py
+"""
+
+import csv
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import character_archive
+import character_generation_rules as chargen
+import character_storage
+import dice_report
+import skill_index
+from test_archive import save_characters
+from test_concurrency import with_test_app
+
+def parse(text):
+    return list(csv.reader(io.StringIO(text)))
+
+def test_character_report():
+    """One row per roll, terms counted from enlistment; streamed and written reports are the same CSV"""
+    character = chargen.generate_complete_character(chargen.derive_seed(49, 0))
+    text = "".join(dice_report.iter_report(character))
+    rows = parse(text)
+    assert tuple(rows[0]) == dice_report.REPORT_FIELDS
+    assert rows[1][:2] == ["SUMMARY", character["name"]] and rows[1][6] == f"UPP: {character['upp']}"
+
+    rolled = [event for event in character["career_history"] if event.get("roll") is not None]
+    assert [row[4] for row in rows[2:]] == [event["event_type"] for event in rolled]
+    assert [int(row[0]) for row in rows[2:]] == list(range(1, len(rolled) + 1))
+    assert rows[2][3] == "1" and rows[2][5] == f"Enlistment ({rolled[0]['service']})"
+    assert rows[-1][3] == str(character["terms_served"])
+    assert all(int(row[10]) == int(row[6]) + int(row[8]) for row in rows[2:] if row[8])
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "report.csv")
+        dice_report.write_report(character, path)
+        with open(path, newline='', encoding='utf-8') as f:
+            assert f.read() == text
+
+def test_archive_export():
+    """Every matching character's rolls in ID order, whatever the chunking; unreadable ones are reported"""
+    original_chunk_size = dice_report.CHUNK_SIZE
+    with tempfile.TemporaryDirectory() as characters_dir:
+        manifest = character_archive.ArchiveManifest(characters_dir)
+        characters = save_characters(characters_dir, manifest, 12)
+        writer = character_storage.BundleWriter(os.path.join(characters_dir, "bundle-000001.bundle"))
+        for index in range(12, 16):
+            character = dict(chargen.generate_complete_character(chargen.derive_seed(5, index)),
+                             character_id=f"{index:010d}")
+            writer.add(character["character_id"], character_storage.encode_character(character), character)
+            characters.append(character)
+        writer.close()
+        assert manifest.rebuild(max_workers=1) == 16
+        os.remove(os.path.join(characters_dir, "0000000003.json"))
+
+        expected = []
+        for character in characters:
+            if character["character_id"] != "0000000003":
+                expected += [[character["character_id"]] + [str(value) for value in row]
+                             for row in dice_report.roll_rows(character)]
+        out_path = os.path.join(characters_dir, "rolls.csv")
+        try:
+            for chunk_size, workers in ((dice_report.CHUNK_SIZE, 1), (3, 2)):
+                dice_report.CHUNK_SIZE = chunk_size
+                stats = dice_report.export_archive(manifest, out_path, max_workers=workers,
+                                                   executor_factory=ThreadPoolExecutor)
+                with open(out_path, newline='', encoding='utf-8') as f:
+                    rows = list(csv.reader(f))
+                assert tuple(rows[0]) == dice_report.ARCHIVE_FIELDS and rows[1:] == expected
+                assert (stats["characters"], stats["rolls"], stats["failed"]) == (15, len(expected), 1)
+                assert stats["failures"][0][0] == "0000000003"
+        finally:
+            dice_report.CHUNK_SIZE = original_chunk_size
+
+        navy = {character["character_id"] for character in characters if character["career"] == "Navy"}
+        dice_report.export_archive(manifest, out_path, {"career": "navy"}, max_workers=1,
+                                   executor_factory=ThreadPoolExecutor)
+        with open(out_path, newline='', encoding='utf-8') as f:
+            assert {row[0] for row in list(csv.reader(f))[1:]} == navy - {"0000000003"}
+        skills = skill_index.parse_skill_query("Pilot-1")
+        assert [location[0] for location in manifest.locations({}, skills)] == \
+               [row["id"] for row in manifest.query({}, limit=500, skills=skills)["characters"]]
+
+def check_dice_roll_endpoints(client):
+    assert client.get('/api/dice_roll_report').status_code == 400
+    created = []
+    for _ in range(3):
+        character = client.post('/api/autoplay', json={"scope": "career"}).get_json()["character"]
+        created.append(character)
+        assert client.post('/api/archive_character').status_code == 200
+
+    # Archiving clears the current character, so the report is of a fourth one
+    character = client.post('/api/autoplay', json={"scope": "career"}).get_json()["character"]
+    response = client.get('/api/dice_roll_report')
+    assert response.status_code == 200 and response.mimetype == 'text/csv'
+    assert f'{character["character_id"]}_dice_rolls.csv' in response.headers["Content-Disposition"]
+    assert response.get_data(as_text=True) == "".join(dice_report.iter_report(character))
+    saved = client.post('/api/dice_roll_report').get_json()
+    with open(saved["path"], newline='', encoding='utf-8') as f:
+        assert f.read() == response.get_data(as_text=True)
+
+    rows = parse(client.get('/api/archive/dice_rolls').get_data(as_text=True))
+    # Saved characters are in the archive too, archived by hand or not
+    assert sorted({row[0] for row in rows[1:]}) == [other["character_id"] for other in created + [character]]
+    career = created[0]["career"]
+    rows = parse(client.get(f'/api/archive/dice_rolls?career={career}').get_data(as_text=True))
+    assert all(row[-1] == career for row in rows[1:]) and len(rows) > 1
+    assert client.get('/api/archive/dice_rolls?min_terms=lots').status_code == 400
+    assert client.get('/api/archive/dice_rolls?q=Pilot AND').status_code == 400
+
+def test_dice_roll_endpoints():
+    """The current character's report and the archive's roll log stream as CSV over HTTP"""
+    with_test_app(check_dice_roll_endpoints)
+
+def main():
+    """Run all dice roll report tests"""
+    print("CLASSIC TRAVELLER DICE ROLL REPORT TESTING")
+    tests = [
+        test_character_report,
+        test_archive_export,
+        test_dice_roll_endpoints
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"{test.__name__:45} ✅ PASSED")
+        except AssertionError as e:
+            print(f"{test.__name__:45} ❌ FAILED: {e}")
+
+if __name__ == "__main__":
+    main()
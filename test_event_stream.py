@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Server-Sent Events Testing for Classic Traveller Character Generator
+
+This module checks the SSE endpoints over HTTP: a job's progress stream ends with
+its final status, also for a job run by another worker process, and the current
+character's stream replays history on request and then pushes each newly saved
+career event once, whichever worker saved it.
+
+Usage: python test_event_stream.py
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import app as app_module
+import bulk_generation
+import character_generation_rules as chargen
+from test_concurrency import with_test_app
+
+def parse_sse(text):
+    """(event type, data) for each message in SSE text; keep-alive comments are skipped"""
+    messages = []
+    for block in text.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if "event" in fields:
+            messages.append((fields["event"], json.loads(fields["data"])))
+    return messages
+
+def next_message(stream):
+    """Read the next message from an open SSE response (each chunk is whole messages)"""
+    while True:
+        messages = parse_sse(next(stream).decode("utf-8"))
+        if messages:
+            return messages[0]
+
+def check_job_events(client):
+    assert client.get('/api/jobs/missing/events').status_code == 404
+    job = client.post('/api/jobs', json={"count": 20, "seed": 5}).get_json()["job"]
+    response = client.get(f'/api/jobs/{job["id"]}/events')
+    assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+    messages = parse_sse(response.get_data(as_text=True))
+    assert messages and all(event_type == "progress" for event_type, _ in messages)
+    assert messages[-1][1]["status"] in bulk_generation.GenerationJobManager.FINAL_STATUSES
+    assert [data["completed"] for _, data in messages] == sorted(data["completed"] for _, data in messages)
+
+def check_other_worker_job_events(client):
+    # A job started by another worker process is followed through its status file
+    data_dir = app_module.app_services(client.application).config.DATA_DIR
+    other = bulk_generation.GenerationJobManager(data_dir, max_workers=2, chunk_size=25,
+                                                 executor_factory=lambda: ThreadPoolExecutor(max_workers=2))
+    job = other.submit({"count": 400, "seed": 6})
+    messages = parse_sse(client.get(f'/api/jobs/{job["id"]}/events').get_data(as_text=True))
+    assert messages[-1][1]["status"] == "completed" and messages[-1][1]["completed"] == 400
+
+def test_job_events_endpoint():
+    """A job's progress streams until it reaches a final status, in any worker; unknown jobs are 404"""
+    with_test_app(check_job_events)
+    with_test_app(check_other_worker_job_events)
+
+def play_character_events(client):
+    assert client.get('/api/character_events').status_code == 400
+    client.post('/api/create_character')
+    policy = {"reenlist_until_term": 9}
+    client.post('/api/autoplay', json={"scope": "term", "policy": policy})
+    history = client.get('/api/current_character').get_json()["character"]["career_history"]
+
+    response = client.get('/api/character_events?since=2', buffered=False)
+    assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+    stream = iter(response.response)
+    replayed = [next_message(stream) for _ in range(len(history) - 2)]
+    response.close()
+    assert [data["index"] for _, data in replayed] == list(range(2, len(history)))
+    assert [data["event"] for _, data in replayed] == history[2:]
+
+    # Another worker saves a term, then this one plays one: each event is pushed once, in order
+    response = client.get('/api/character_events', buffered=False)
+    stream = iter(response.response)
+    state_store = app_module.app_services(client.application).state_store
+    character = state_store.get("current_character")
+    rng = chargen.get_random_generator(character)
+    character = chargen.autoplay_term(rng, character, policy)
+    chargen.save_random_state(character, rng)
+    state_store.set("current_character", character)
+    saved_elsewhere = character["career_history"][len(history):]
+    assert saved_elsewhere, "the other worker's term added no events"
+    elsewhere = [next_message(stream) for _ in saved_elsewhere]
+    assert [data["event"] for _, data in elsewhere] == saved_elsewhere
+
+    played = client.post('/api/autoplay', json={"scope": "term", "policy": policy}).get_json()
+    assert played["events"], "the term added no events"
+    received = [next_message(stream) for _ in played["events"]]
+    response.close()
+    assert [data["index"] for _, data in elsewhere + received] == \
+        list(range(len(history), len(history) + len(saved_elsewhere) + len(played["events"])))
+    assert [data["event"] for _, data in received] == played["events"]
+
+def check_character_events(client):
+    # Every roll a 12: terms always survive and reenlist, so the career keeps going
+    original_roll_2d6 = chargen.roll_2d6
+    chargen.roll_2d6 = lambda random_generator: 12
+    try:
+        play_character_events(client)
+    finally:
+        chargen.roll_2d6 = original_roll_2d6
+
+def test_character_events_endpoint():
+    """History replays from ?since=; new events are pushed once, whichever worker saved them"""
+    with_test_app(check_character_events)
+
+def main():
+    """Run all Server-Sent Events tests"""
+    print("CLASSIC TRAVELLER SERVER-SENT EVENTS TESTING")
+    tests = [
+        test_job_events_endpoint,
+        test_character_events_endpoint
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"{test.__name__:45} ✅ PASSED")
+        except AssertionError as e:
+            print(f"{test.__name__:45} ❌ FAILED: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+History Serializer Testing for Classic Traveller Character Generator
+
+This module checks that the incremental serializer produces the same JSON as a
+full encode while re-encoding only appended history entries, that it falls back
+to a full encode when a history shrinks or changes (rolled-back batches), and that
+API responses and saved files carry the spliced history intact.
+
+Usage: python test_history_serializer.py
+"""
+
+import json
+
+import character_generation_rules as chargen
+import history_serializer
+from test_concurrency import with_test_app
+
+def test_matches_full_encode_and_reuses_prefix():
+    """Appending events re-encodes only the new ones and decodes to the same record"""
+    serializer = history_serializer.HistorySerializer()
+    # Round-trip once so tuples (random_state) compare as the lists JSON gives back
+    character = json.loads(json.dumps(chargen.generate_complete_character(chargen.derive_seed(44, 1))))
+    events = character["career_history"]
+    character["career_history"] = events[:3]
+    assert json.loads(serializer.dumps("a", character)) == character
+    assert serializer.encoded_entries == 3 + len(character["phase_history"])
+
+    before = serializer.stats()
+    character["career_history"] = events
+    assert json.loads(serializer.dumps("a", character)) == character
+    after = serializer.stats()
+    assert after["encoded_entries"] - before["encoded_entries"] == len(events) - 3
+    assert after["reused_entries"] - before["reused_entries"] == 3 + len(character["phase_history"])
+
+def test_changed_history_is_fully_encoded():
+    """A shorter, rewritten or different history is never spliced onto a stale prefix"""
+    serializer = history_serializer.HistorySerializer()
+    character = {"name": "Rolled Back", "career_history": [{"event": 1}, {"event": 2}]}
+    serializer.dumps("b", character)
+    character["career_history"] = [{"event": 1}]
+    assert json.loads(serializer.dumps("b", character)) == character
+    character["career_history"] = [{"event": 9}, {"event": 10}, {"event": 11}]
+    assert json.loads(serializer.dumps("b", character)) == character
+    assert json.loads(serializer.dumps("b", {"career_history": []})) == {"career_history": []}
+
+    # Another character under the same key whose last cached entry happens to match
+    serializer.dumps("c", {"career_history": [{"event": 1}, {"event": "same"}]})
+    other = {"career_history": [{"event": 2}, {"event": "same"}, {"event": 3}]}
+    assert json.loads(serializer.dumps("c", other)) == other
+    # An entry changed in place
+    other["career_history"][0]["event"] = 4
+    assert json.loads(serializer.dumps("c", other)) == other
+
+def test_bounded_cache():
+    """Only the most recently encoded characters keep their prefixes"""
+    serializer = history_serializer.HistorySerializer(max_characters=2)
+    for key in "abc":
+        serializer.dumps(key, {"career_history": [1], "phase_history": [2]})
+    assert serializer.stats()["cached_histories"] == 4
+
+def check_responses_and_saves(client):
+    for _ in range(10):
+        response = client.post('/api/autoplay', json={"scope": "term"}).get_json()
+        assert response["success"], response
+        if response["career_complete"]:
+            break
+    character = response["character"]
+    current = client.get('/api/current_character').get_json()["character"]
+    assert character["career_history"] == current["career_history"]
+    assert character["phase_history"] == current["phase_history"]
+    saved = client.get(f'/api/archive/{character["character_id"]}').get_json()["character"]
+    assert saved["career_history"] == current["career_history"]
+    stats = client.get('/api/metrics').get_json()["history_serializer"]
+    assert stats["reused_entries"] > stats["encoded_entries"], stats
+
+def test_responses_and_saves_splice_history():
+    """Responses, the shared state and the archive file all carry the full history"""
+    with_test_app(check_responses_and_saves)
+
+def main():
+    """Run all history serializer tests"""
+    print("CLASSIC TRAVELLER HISTORY SERIALIZER TESTING")
+    tests = [
+        test_matches_full_encode_and_reuses_prefix,
+        test_changed_history_is_fully_encoded,
+        test_bounded_cache,
+        test_responses_and_saves_splice_history
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"{test.__name__:45} ✅ PASSED")
+        except AssertionError as e:
+            print(f"{test.__name__:45} ❌ FAILED: {e}")
+
+if __name__ == "__main__":
+    main()
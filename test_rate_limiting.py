@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Rate Limiting Testing for Classic Traveller Character Generator
+
+This module checks that token buckets refill at their rate, that cheap and expensive
+route groups have separate budgets, that requests the shared bucket denies leave
+the client's budget alone, that budgets can be overridden per deployment, and that
+the SQLite backend shares buckets between independent limiter instances (as
+separate worker processes would).
+
+Usage: python test_rate_limiting.py
+"""
+
+import os
+import tempfile
+
+import rate_limiting
+
+def test_bucket_empties_and_refills():
+    """A bucket allows its capacity in a burst, then refills at its rate"""
+    backend = rate_limiting.MemoryBackend()
+    results = [backend.consume("client", 3, 1.0, now=100.0)[0] for _ in range(4)]
+    assert results == [True, True, True, False]
+
+    allowed, _, retry_after = backend.consume("client", 3, 1.0, now=100.0)
+    assert not allowed and 0 < retry_after <= 1.0
+    assert backend.consume("client", 3, 1.0, now=101.0)[0]
+    assert not backend.consume("client", 3, 1.0, now=101.0)[0]
+
+def test_separate_budgets():
+    """Exhausting the expensive budget leaves cheap requests and other clients alone"""
+    limiter = rate_limiting.RateLimiter(rate_limiting.MemoryBackend())
+    assert limiter.group_for("POST", "/api/bulk_generate") == "expensive"
+    assert limiter.group_for("POST", "/api/calculate_probability") == "cheap"
+    assert limiter.group_for("GET", "/api/jobs/<job_id>") == "cheap"
+    assert limiter.group_for("POST", "/api/survival") == "standard"
+
+    capacity = rate_limiting.DEFAULT_LIMITS["expensive"]["per_client"][0]
+    for _ in range(capacity):
+        assert limiter.check("10.0.0.1", "expensive", now=50.0).allowed
+    blocked = limiter.check("10.0.0.1", "expensive", now=50.0)
+    assert not blocked.allowed and blocked.retry_after > 0
+    assert limiter.check("10.0.0.1", "cheap", now=50.0).allowed
+    assert limiter.check("10.0.0.2", "expensive", now=50.0).allowed
+
+def test_global_route_budget():
+    """The shared per-group bucket caps all clients together"""
+    limits = {"expensive": {"per_client": (5, 1.0), "global": (4, 1.0)}}
+    limiter = rate_limiting.RateLimiter(rate_limiting.MemoryBackend(), limits=limits)
+    allowed = [limiter.check(f"client-{index}", "expensive", now=0.0).allowed for index in range(6)]
+    assert allowed == [True, True, True, True, False, False]
+
+    # Requests the shared bucket turns away do not spend the client's own tokens
+    for _ in range(10):
+        assert not limiter.check("client-0", "expensive", now=0.0).allowed
+    assert limiter.check("client-0", "expensive", now=1.0).allowed
+    assert limiter.backend.consume("client:expensive:client-0", 5, 1.0, cost=0, now=1.0)[1] == 4
+
+def test_limits_configured_per_deployment():
+    """RATELIMIT_LIMITS overrides individual budgets; malformed or unknown entries raise ValueError"""
+    limits = rate_limiting.parse_limits("expensive.global=100/5, cheap.per_client=10/2")
+    assert limits["expensive"]["global"] == (100, 5) and limits["cheap"]["per_client"] == (10, 2)
+    assert limits["expensive"]["per_client"] == rate_limiting.DEFAULT_LIMITS["expensive"]["per_client"]
+    assert rate_limiting.parse_limits("") == rate_limiting.DEFAULT_LIMITS
+    for spec in ("expensive.global=100", "expensive=1/1", "costly.global=1/1", "cheap.per_client=0/1"):
+        try:
+            rate_limiting.parse_limits(spec)
+        except ValueError:
+            continue
+        raise AssertionError(f"{spec} was accepted")
+
+def test_sqlite_backend_is_shared():
+    """Two limiters on the same SQLite file draw from the same buckets"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        url = "sqlite:///" + os.path.join(data_dir, "ratelimit.db")
+        first = rate_limiting.RateLimiter(rate_limiting.create_backend(url))
+        second = rate_limiting.RateLimiter(rate_limiting.create_backend(url))
+        capacity = rate_limiting.DEFAULT_LIMITS["expensive"]["per_client"][0]
+        for index in range(capacity):
+            limiter = first if index % 2 == 0 else second
+            assert limiter.check("10.0.0.1", "expensive", now=10.0).allowed
+        assert not first.check("10.0.0.1", "expensive", now=10.0).allowed
+        assert not second.check("10.0.0.1", "expensive", now=10.0).allowed
+
+def test_unknown_storage_url_rejected():
+    """Unsupported storage URLs raise ValueError"""
+    try:
+        rate_limiting.create_backend("mongodb://localhost")
+    except ValueError:
+        return
+    raise AssertionError("mongodb:// was accepted")
+
+def main():
+    """Run all rate limiting tests"""
+    print("CLASSIC TRAVELLER RATE LIMITING TESTING")
+    tests = [
+        test_bucket_empties_and_refills,
+        test_separate_budgets,
+        test_global_route_budget,
+        test_limits_configured_per_deployment,
+        test_sqlite_backend_is_shared,
+        test_unknown_storage_url_rejected
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"{test.__name__:45} ✅ PASSED")
+        except AssertionError as e:
+            print(f"{test.__name__:45} ❌ FAILED: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Columnar Roll Export Testing for Classic Traveller Character Generator
+
+This module checks that column files are valid .npy files (header, alignment,
+little-endian data) that read back unchanged, and that an archive export writes
+every matching character's roll events in ID order across row groups, with the
+same terms as the dice roll report, reports characters it cannot export, and is
+written whole or not at all.
+
+Usage: python test_roll_columns.py
+"""
+
+import ast
+import json
+import os
+import tempfile
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+import character_archive
+import character_storage
+import dice_report
+import roll_columns
+from test_archive import save_characters
+
+def test_column_files():
+    """Columns are one-dimensional .npy files with 64-byte aligned data that read back unchanged"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name, typecode, dtype in roll_columns.COLUMNS:
+            values = array(typecode, [0, 1, 100] if typecode in "bB" else [-32768, 0, 7, 32767])
+            path = os.path.join(work_dir, name + ".npy")
+            roll_columns.write_column(path, values, dtype)
+            with open(path, 'rb') as f:
+                data = f.read()
+            header_length = int.from_bytes(data[8:10], "little")
+            header = ast.literal_eval(data[10:10 + header_length].decode("latin1"))
+            assert data[:8] == b"\x93NUMPY\x01\x00" and (10 + header_length) % 64 == 0
+            assert header == {"descr": dtype, "fortran_order": False, "shape": (len(values),)}
+            assert len(data) == 10 + header_length + len(values) * values.itemsize
+            assert roll_columns.read_column(path) == values
+
+        path = os.path.join(work_dir, "roll.npy")
+        assert roll_columns.read_column(path)[:2].tolist() == [-32768, 0]
+        with open(path, 'r+b') as f:
+            f.write(b"\x93NUMPX")
+        try:
+            roll_columns.read_column(path)
+            assert False, "bad magic accepted"
+        except ValueError:
+            pass
+
+def expected_columns(characters):
+    columns = {name: [] for name in roll_columns.COLUMN_NAMES}
+    for character in characters:
+        for term, event in dice_report.iter_rolls(character):
+            columns["character_id"].append(int(character["character_id"]))
+            columns["term"].append(term)
+            columns["event_type"].append(roll_columns.EVENT_TYPES.index(event["event_type"]))
+            columns["roll"].append(event["roll"])
+            columns["modifier"].append(event.get("modifier") or 0)
+            columns["target"].append(roll_columns.NO_TARGET if event.get("target") is None else event["target"])
+            columns["success"].append(1 if event.get("success") else 0)
+    return columns
+
+def test_archive_export():
+    """Every matching character's rolls in ID order across row groups; unexportable characters are reported"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        characters_dir = os.path.join(work_dir, "characters")
+        manifest = character_archive.ArchiveManifest(characters_dir)
+        characters = save_characters(characters_dir, manifest, 11)
+        os.remove(os.path.join(characters_dir, "0000000004.json"))
+        named = dict(characters[0], character_id="Zara_Hyperdrive")
+        path = character_storage.store_character(characters_dir, "Zara_Hyperdrive", named)
+        manifest.record(named, path)
+        exported = [character for character in characters if character["character_id"] != "0000000004"]
+
+        out_dir = os.path.join(work_dir, "rolls")
+        stats = roll_columns.export_archive(manifest, out_dir, max_workers=2, row_group_size=4,
+                                            executor_factory=ThreadPoolExecutor)
+        assert (stats["characters"], stats["failed"], stats["row_groups"]) == (10, 2, 3)
+        assert sorted(failure[0] for failure in stats["failures"]) == ["0000000004", "Zara_Hyperdrive"]
+
+        metadata = roll_columns.read_metadata(out_dir)
+        assert [group["characters"] for group in metadata["row_groups"]] == [4, 3, 3]
+        assert metadata["rows"] == stats["rows"] == sum(group["rows"] for group in metadata["row_groups"])
+        assert [column["name"] for column in metadata["columns"]] == list(roll_columns.COLUMN_NAMES)
+        columns = {name: [] for name in roll_columns.COLUMN_NAMES}
+        for group in roll_columns.iter_row_groups(out_dir):
+            for name, values in group.items():
+                columns[name] += values.tolist()
+        assert columns == expected_columns(exported)
+        assert set(os.listdir(work_dir)) == {"characters", "rolls"}
+
+        try:
+            roll_columns.export_archive(manifest, out_dir, executor_factory=ThreadPoolExecutor)
+            assert False, "existing export overwritten"
+        except ValueError:
+            pass
+
+        navy_dir = os.path.join(work_dir, "navy")
+        roll_columns.export_archive(manifest, navy_dir, {"career": "Navy"}, max_workers=1,
+                                    executor_factory=ThreadPoolExecutor)
+        ids = [value for group in roll_columns.iter_row_groups(navy_dir, ["character_id"])
+               for value in group["character_id"]]
+        navy = [character for character in exported if character["career"] == "Navy"]
+        assert ids == expected_columns(navy)["character_id"]
+        with open(os.path.join(navy_dir, roll_columns.METADATA_NAME)) as f:
+            assert json.load(f)["event_types"][-1] == "other"
+
+def main():
+    """Run all columnar roll export tests"""
+    print("CLASSIC TRAVELLER COLUMNAR ROLL EXPORT TESTING")
+    tests = [
+        test_column_files,
+        test_archive_export
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"{test.__name__:45} ✅ PASSED")
+        except AssertionError as e:
+            print(f"{test.__name__:45} ❌ FAILED: {e}")
+
+if __name__ == "__main__":
+    main()
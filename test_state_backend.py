@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Shared State Testing for Classic Traveller Character Generator
+
+This module checks that the shared state stores version their values (and drop
+those that expire), that one worker's writes are seen by another worker's
+cached reads, that a character read back from JSON keeps its random generator
+state, and that the batched ID allocator never issues the same character ID
+twice.
+Two SQLite stores opened on the same file stand in for two worker processes.
+
+Usage: python test_state_backend.py
+"""
+
+import os
+import tempfile
+import threading
+
+import character_generation_rules as chargen
+import character_ids
+import state_backend
+
+def test_memory_store_versions_and_copies():
+    """Every set bumps the version, and reads are independent copies"""
+    store = state_backend.MemoryStateStore()
+    assert store.get("current_character") is None
+    assert store.set("current_character", {"name": "Alex"}) == 1
+    assert store.set("current_character", {"name": "Sam"}) == 2
+    character = store.get("current_character")
+    character["name"] = "changed"
+    assert store.get("current_character") == {"name": "Sam"}
+    assert store.set_default("global_seed", 77) == 77
+    assert store.set_default("global_seed", 5) == 77
+
+    # An expired value is gone, as though it had never been set
+    store.set("idempotency:a", {"status": 200}, expires_in=0)
+    assert store.get_with_version("idempotency:a") == (None, 0)
+    assert store.set("idempotency:a", {"status": 201}, expected_version=0, expires_in=60) == 1
+    assert store.get("idempotency:a") == {"status": 201}
+
+def test_sqlite_workers_see_each_others_writes():
+    """A write through one store invalidates the other store's cached copy"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        url = "sqlite:///" + os.path.join(data_dir, "state.db")
+        first = state_backend.create_state_store(url)
+        second = state_backend.create_state_store(url)
+
+        first.set("current_character", {"name": "Alex", "terms_served": 0})
+        assert second.get("current_character")["terms_served"] == 0
+        first.set("current_character", {"name": "Alex", "terms_served": 1})
+        assert second.get("current_character")["terms_served"] == 1
+        assert second.get_version("current_character") == 2
+        try:
+            second.set("current_character", {"name": "Alex"}, expected_version=1)
+        except state_backend.VersionConflict:
+            pass
+        else:
+            raise AssertionError("Stale expected_version was accepted")
+
+        second.set("current_character", None)
+        assert first.get("current_character") is None
+        assert first.set_default("global_seed", 42) == 42
+        assert second.set_default("global_seed", 7) == 42
+
+def test_random_state_survives_json():
+    """A character read back from the store continues its own dice sequence"""
+    character = chargen.create_named_character(1234)
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = state_backend.create_state_store("sqlite:///" + os.path.join(data_dir, "state.db"))
+        store.set("current_character", character)
+        restored = store.get("current_character")
+    assert isinstance(restored["random_state"], list)
+    expected = chargen.get_random_generator(character).random()
+    assert chargen.get_random_generator(restored).random() == expected
+
+def test_id_allocator_unique_across_workers():
+    """Two allocators (workers) on one store, each used by several threads, never collide"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        url = "sqlite:///" + os.path.join(data_dir, "state.db")
+        allocators = [character_ids.CharacterIdAllocator(state_backend.create_state_store(url), batch_size=50)
+                      for _ in range(2)]
+        issued = []
+        def allocate_many(allocator):
+            ids = [allocator.allocate(77)[0] for _ in range(500)]
+            issued.extend(ids)
+        threads = [threading.Thread(target=allocate_many, args=(allocator,))
+                   for allocator in allocators for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(issued) == 3000
+        assert len(set(issued)) == 3000, "Duplicate character IDs issued"
+        # The persisted counter only moves once per batch
+        counter = state_backend.create_state_store(url).get(character_ids.COUNTER_KEY)
+        assert (counter - 1) % 50 == 0 and counter > 3000
+
+def test_id_allocator_seeds_are_reproducible():
+    """The same master seed and counter always give the same seed"""
+    first = character_ids.CharacterIdAllocator(state_backend.MemoryStateStore())
+    second = character_ids.CharacterIdAllocator(state_backend.MemoryStateStore())
+    identities = [first.allocate(77) for _ in range(5)]
+    assert identities == [second.allocate(77) for _ in range(5)]
+    assert identities[0] == ("0000000001", chargen.derive_seed(77, 1))
+    assert all(character_ids.is_character_id(character_id) for character_id, _ in identities)
+
+def main():
+    """Run all shared state tests"""
+    print("CLASSIC TRAVELLER SHARED STATE TESTING")
+    tests = [
+        test_memory_store_versions_and_copies,
+        test_sqlite_workers_see_each_others_writes,
+        test_random_state_survives_json,
+        test_id_allocator_unique_across_workers,
+        test_id_allocator_seeds_are_reproducible
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"{test.__name__:45} ✅ PASSED")
+        except AssertionError as e:
+            print(f"{test.__name__:45} ❌ FAILED: {e}")
+
+if __name__ == "__main__":
+    main()